@@ -0,0 +1,54 @@
+"""Data and analytics layer for the FloatChat dashboard.
+
+The package does not depend on Streamlit, so the same store, summaries and
+query engine can be used from batch jobs, an HTTP service or worker
+processes::
+
+    from floatchat import open_service
+    service = open_service("/data/argo-store")  # or open_service() for sample data
+    print(service.answer("What's the average salinity?").text)
+
+Names below are imported from their submodules on first access, so
+``import floatchat`` itself is cheap.
+"""
+import importlib
+
+_EXPORTS = {
+    "Answer": "chatbot",
+    "ArgoStore": "store",
+    "Change": "service",
+    "ClimatologyCube": "climatology",
+    "DataService": "service",
+    "DerivedVariables": "derived",
+    "FloatSummary": "summary",
+    "MapLayers": "maps",
+    "ProfileCatalog": "catalog",
+    "ProfileData": "profiles",
+    "ProfileIndex": "index",
+    "QueryEngine": "chatbot",
+    "SchemaError": "schema",
+    "Snapshot": "service",
+    "StoreProfiles": "catalog",
+    "TrendEngine": "trends",
+    "conform": "schema",
+    "export_data": "export",
+    "generate_sample_data": "synthetic",
+    "generate_synthetic_data": "synthetic",
+    "memory_footprint": "schema",
+    "open_service": "service",
+    "parse_intent": "chatbot",
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{_EXPORTS[name]}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
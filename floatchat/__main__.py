@@ -0,0 +1,30 @@
+"""Answer FloatChat questions from the command line, without the dashboard.
+
+Usage::
+
+    python -m floatchat "What's the average salinity?" [--store STORE]
+    python -m floatchat --store STORE < questions.txt
+"""
+import argparse
+import os
+import sys
+
+from .service import open_service
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Answer FloatChat questions headlessly")
+    parser.add_argument("questions", nargs="*", help="questions to answer (default: one per line on stdin)")
+    parser.add_argument("--store", default=os.environ.get("FLOATCHAT_STORE"),
+                        help="store directory (default: $FLOATCHAT_STORE, else sample data)")
+    args = parser.parse_args(argv)
+
+    service = open_service(args.store)
+    questions = args.questions or (line.strip() for line in sys.stdin)
+    for question in questions:
+        if question:
+            print(f"> {question}\n{service.answer(question).text.strip()}\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,378 @@
+"""HTTP/JSON API over the query engine, float summaries and profile slices.
+
+A small ASGI application (Starlette, served by uvicorn) backed by the same
+``DataService`` as the dashboard::
+
+    python -m floatchat.api --store STORE --port 8000
+
+Endpoints (all ``GET`` unless noted):
+
+* ``/health``: status and dataset version
+* ``/v1/ask?q=...``: answer one question; ``POST /v1/ask`` with
+  ``{"questions": [...]}`` answers a batch
+* ``/v1/stats``: dataset-wide statistics
+* ``/v1/floats`` and ``/v1/floats/{float_id}``: float summaries
+* ``/v1/profiles``: measurements filtered by ``float_id``, ``lat_min``/``lat_max``,
+  ``lon_min``/``lon_max``, ``start``/``end``, ``depth_min``/``depth_max`` and
+  capped at ``limit`` rows
+* ``/v1/map?zoom=...``: binned profile positions or simplified float tracks
+  for a viewport (``lat_min``/``lat_max``/``lon_min``/``lon_max``), with
+  ``kind=hex`` or ``grid`` bins
+
+Tabular endpoints return Arrow IPC streams instead of JSON with
+``?format=arrow`` or ``Accept: application/vnd.apache.arrow.stream``.
+
+Responses are deterministic for a dataset version, so ``GET`` bodies are kept
+in an LRU cache keyed by version and URL (bounded by total body size) and
+carry an ``ETag`` derived from the same key; a matching ``If-None-Match`` gets
+``304 Not Modified``. The store
+is checked for a new version at most every ``refresh_interval`` seconds, on a
+worker thread, since picking up a new version can rebuild the snapshot.
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response
+from starlette.routing import Route
+
+from .export import plain_frame
+from .service import open_service
+
+ARROW_MIME = "application/vnd.apache.arrow.stream"
+MAX_BATCH = 1000
+MAX_ROWS = 1_000_000
+PROFILE_CHUNK = 1 << 16  # levels turned into a frame at a time by /v1/profiles
+
+try:
+    import orjson
+
+    def _dumps(payload):
+        return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY, default=str)
+except ImportError:
+    def _dumps(payload):
+        return json.dumps(payload, default=str).encode()
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _records(frame):
+    """JSON-ready records (NaN -> null, timestamps -> ISO strings)."""
+    return json.loads(plain_frame(frame).to_json(orient="records", date_format="iso"))
+
+
+def _arrow(frame):
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(plain_frame(frame), preserve_index=False)
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+
+def _number(params, name, cast=float):
+    value = params.get(name)
+    if value is None or value == "":
+        return None
+    try:
+        return cast(value)
+    except ValueError:
+        raise HTTPError(400, f"Invalid value for {name}: {value!r}") from None
+
+
+def _answer_payload(question, answer):
+    return {"question": question, "text": answer.text.strip(), "panels": list(answer.panels), "focus": dict(answer.focus)}
+
+
+def _box(params):
+    """``(lat range, lon range)`` from ``lat_min``/``lat_max``/``lon_min``/``lon_max``; ``None`` when unset."""
+    lat = (_number(params, "lat_min"), _number(params, "lat_max"))
+    lon = (_number(params, "lon_min"), _number(params, "lon_max"))
+    lat = None if lat == (None, None) else (-90.0 if lat[0] is None else lat[0], 90.0 if lat[1] is None else lat[1])
+    lon = None if lon == (None, None) else (-180.0 if lon[0] is None else lon[0], 180.0 if lon[1] is None else lon[1])
+    return lat, lon
+
+
+def _profile_rows(data, ids, limit, depth_min=None, depth_max=None):
+    """The first ``limit`` rows of profiles ``ids`` within the depth window, and whether more rows match.
+
+    Frames are built for just enough profiles to fill the limit (plus one
+    row, to tell whether the result is truncated), so an unfiltered request
+    does not materialize the whole selection.
+    """
+    ends = np.cumsum(data.profiles["levels"].to_numpy()[ids])
+    frames, rows, start = [], 0, 0
+    while start < len(ids) and rows <= limit:
+        wanted = max(limit + 1 - rows, PROFILE_CHUNK if depth_min is not None or depth_max is not None else 1)
+        base = ends[start - 1] if start else 0
+        stop = min(max(int(np.searchsorted(ends, base + wanted)) + 1, start + 1), len(ids))
+        frame = data.take(ids[start:stop]).frame()
+        if depth_min is not None or depth_max is not None:
+            pressure = frame["pressure"].to_numpy()
+            keep = np.ones(len(frame), dtype=bool)
+            if depth_min is not None:
+                keep &= pressure >= depth_min
+            if depth_max is not None:
+                keep &= pressure <= depth_max
+            frame = frame[keep]
+        frames.append(frame)
+        rows += len(frame)
+        start = stop
+    frame = pd.concat(frames, ignore_index=True) if frames else data.take(ids[:0]).frame()
+    return frame.iloc[:limit], rows > limit
+
+
+def _plain(value):
+    """JSON-safe form of a stats value: NaN -> null, timestamps -> ISO 8601, NumPy scalars -> Python."""
+    if isinstance(value, dict):
+        return {key: _plain(item) for key, item in value.items()}
+    if value is None or value is pd.NaT:
+        return None
+    if isinstance(value, (pd.Timestamp, np.datetime64)):
+        return pd.Timestamp(value).isoformat()
+    if isinstance(value, (float, np.floating)):
+        return None if np.isnan(value) else float(value)
+    if isinstance(value, np.integer):
+        return int(value)
+    return value
+
+
+def _stats_payload(stats):
+    if stats is None:
+        return None
+    return _plain({
+        "measurements": stats.measurements,
+        "floats": stats.floats,
+        "profiles": stats.profiles,
+        "time_min": stats.time_min,
+        "time_max": stats.time_max,
+        "mean": stats.mean,
+        "std": stats.std,
+        "min": stats.min,
+        "max": stats.max,
+        "argmin": stats.argmin,
+        "argmax": stats.argmax,
+    })
+
+
+class FloatChatAPI:
+    """Request handlers plus the response cache and snapshot refresh."""
+
+    def __init__(self, service, cache_bytes=256 << 20, refresh_interval=2.0):
+        self.service = service
+        self.refresh_interval = refresh_interval
+        self._snapshot = None
+        self._checked = 0.0
+        self._cache = OrderedDict()  # (version, path, query, format) -> (body, media type, etag, headers)
+        self._cache_bytes = cache_bytes
+        self._cached_bytes = 0
+        self._lock = threading.Lock()
+
+    def _due(self):
+        return self._snapshot is None or time.monotonic() - self._checked >= self.refresh_interval
+
+    def snapshot(self):
+        if self._due():
+            self._snapshot = self.service.snapshot()
+            self._checked = time.monotonic()
+        return self._snapshot
+
+    # -----------------------------
+    # RESPONSE PLUMBING
+    # -----------------------------
+    def _cached(self, key):
+        with self._lock:
+            hit = self._cache.get(key)
+            if hit is not None:
+                self._cache.move_to_end(key)
+            return hit
+
+    def _store(self, key, entry):
+        size = len(entry[0])
+        if size > self._cache_bytes // 4:  # one huge body must not flush the whole cache
+            return
+        with self._lock:
+            if key in self._cache:
+                return
+            self._cache[key] = entry
+            self._cached_bytes += size
+            while self._cached_bytes > self._cache_bytes:
+                _, (body, *_) = self._cache.popitem(last=False)
+                self._cached_bytes -= len(body)
+
+    @staticmethod
+    def _format(request):
+        fmt = request.query_params.get("format")
+        if fmt is None:
+            fmt = "arrow" if ARROW_MIME in request.headers.get("accept", "") else "json"
+        if fmt not in ("json", "arrow"):
+            raise HTTPError(400, f"Unknown format: {fmt!r}")
+        return fmt
+
+    def endpoint(self, handler, tabular=False):
+        """Wrap ``handler(request, snapshot, fmt) -> (payload or frame, headers)`` with caching and ETags."""
+        async def run(request):
+            try:
+                snapshot = await run_in_threadpool(self.snapshot) if self._due() else self._snapshot
+                fmt = self._format(request) if tabular else "json"
+                if request.method == "GET":
+                    key = (snapshot.version, str(request.url.path), str(request.url.query), fmt)
+                    entry = self._cached(key)
+                    if entry is None:
+                        entry = await run_in_threadpool(self._render, handler, request, snapshot, fmt, key)
+                        self._store(key, entry)
+                    body, media_type, etag, headers = entry
+                    if etag in request.headers.get("if-none-match", ""):
+                        return Response(status_code=304, headers={"ETag": etag})
+                    return Response(body, media_type=media_type, headers={"ETag": etag, "Cache-Control": "no-cache", **headers})
+                payload = await request.json()
+                if not isinstance(payload, dict):
+                    raise HTTPError(400, "Expected a JSON object")
+                body, media_type, _, headers = await run_in_threadpool(self._render, handler, payload, snapshot, fmt, None)
+                return Response(body, media_type=media_type, headers=headers)
+            except HTTPError as exc:
+                return Response(_dumps({"error": str(exc)}), status_code=exc.status, media_type="application/json")
+            except (ValueError, TypeError) as exc:
+                return Response(_dumps({"error": f"Bad request: {exc}"}), status_code=400, media_type="application/json")
+        return run
+
+    @staticmethod
+    def _render(handler, request, snapshot, fmt, key):
+        result, headers = handler(request, snapshot, fmt)
+        if isinstance(result, pd.DataFrame):
+            if fmt == "arrow":
+                body, media_type = _arrow(result), ARROW_MIME
+            else:
+                body, media_type = _dumps({"version": snapshot.version, "rows": len(result), **headers, "data": _records(result)}), "application/json"
+        else:
+            body, media_type = _dumps({"version": snapshot.version, **result}), "application/json"
+        etag = f'"{hashlib.sha1(repr(key).encode()).hexdigest()[:20]}"' if key else None
+        return body, media_type, etag, {f"X-FloatChat-{k.title()}": str(v) for k, v in headers.items()}
+
+    # -----------------------------
+    # HANDLERS
+    # -----------------------------
+    @staticmethod
+    def health(request, snapshot, fmt):
+        return {"status": "ok", "measurements": len(snapshot.data)}, {}
+
+    def ask(self, request, snapshot, fmt):
+        if isinstance(request, dict):  # POST body
+            questions = request.get("questions")
+            if not isinstance(questions, list) or not all(isinstance(q, str) for q in questions):
+                raise HTTPError(400, 'Expected {"questions": [string, ...]}')
+            if len(questions) > MAX_BATCH:
+                raise HTTPError(413, f"At most {MAX_BATCH} questions per batch")
+            answers = [snapshot.engine.answer(q) for q in questions]
+            return {"answers": [_answer_payload(q, a) for q, a in zip(questions, answers)]}, {}
+        question = request.query_params.get("q", "").strip()
+        if not question:
+            raise HTTPError(400, "Missing question parameter q")
+        return _answer_payload(question, snapshot.engine.answer(question)), {}
+
+    @staticmethod
+    def stats(request, snapshot, fmt):
+        return {"stats": _stats_payload(snapshot.stats)}, {}
+
+    @staticmethod
+    def floats(request, snapshot, fmt):
+        return snapshot.float_summary, {}
+
+    @staticmethod
+    def float_detail(request, snapshot, fmt):
+        float_id = _number(request.path_params, "float_id", int)
+        summary = snapshot.float_summary
+        row = summary[summary["float_id"] == float_id]
+        if row.empty:
+            raise HTTPError(404, f"Unknown float: {float_id}")
+        return row, {}
+
+    @staticmethod
+    def profiles(request, snapshot, fmt):
+        params = request.query_params
+        query = {}
+        lat, lon = _box(params)
+        if lat is not None:
+            query["lat"] = lat
+        if lon is not None:
+            query["lon"] = lon
+        for name in ("start", "end"):
+            if params.get(name):
+                query[name] = pd.Timestamp(params[name])
+        float_id = _number(params, "float_id", int)
+        if float_id is not None:
+            query["float_ids"] = [float_id]
+        limit = _number(params, "limit", int)
+        if limit is not None and limit <= 0:
+            raise HTTPError(400, "limit must be a positive integer")
+        limit = min(100_000 if limit is None else limit, MAX_ROWS)
+
+        ids = np.asarray(snapshot.index.query(**query), dtype=np.int64)
+        frame, truncated = _profile_rows(snapshot.data, ids, limit, _number(params, "depth_min"), _number(params, "depth_max"))
+        return frame, {"profiles": len(ids), "truncated": truncated}
+
+    @staticmethod
+    def map_layer(request, snapshot, fmt):
+        params = request.query_params
+        zoom = _number(params, "zoom", int)
+        if zoom is None or not 0 <= zoom <= 22:
+            raise HTTPError(400, "zoom must be an integer from 0 to 22")
+        kind = params.get("kind", "hex")
+        if kind not in ("hex", "grid"):
+            raise HTTPError(400, f"Unknown bin kind: {kind!r}")
+        lat, lon = _box(params)
+        viewport = None
+        if lat is not None or lon is not None:
+            viewport = (*(lat or (-90.0, 90.0)), *(lon or (-180.0, 180.0)))
+        layer, frame = snapshot.maps.layer(zoom, viewport, kind)
+        return frame, {"layer": layer}
+
+
+def create_app(service, cache_bytes=256 << 20, refresh_interval=2.0):
+    """ASGI application serving ``service``."""
+    api = FloatChatAPI(service, cache_bytes=cache_bytes, refresh_interval=refresh_interval)
+    app = Starlette(routes=[
+        Route("/health", api.endpoint(api.health)),
+        Route("/v1/ask", api.endpoint(api.ask), methods=["GET", "POST"]),
+        Route("/v1/stats", api.endpoint(api.stats)),
+        Route("/v1/floats", api.endpoint(api.floats, tabular=True)),
+        Route("/v1/floats/{float_id}", api.endpoint(api.float_detail, tabular=True)),
+        Route("/v1/profiles", api.endpoint(api.profiles, tabular=True)),
+        Route("/v1/map", api.endpoint(api.map_layer, tabular=True)),
+    ])
+    app.state.api = api
+    return app
+
+
+def main(argv=None):
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve the FloatChat HTTP/JSON API")
+    parser.add_argument("--store", default=os.environ.get("FLOATCHAT_STORE"),
+                        help="store directory (default: $FLOATCHAT_STORE, else sample data)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--cache-mb", type=int, default=256, help="total size of cached GET responses")
+    args = parser.parse_args(argv)
+
+    app = create_app(open_service(args.store), cache_bytes=args.cache_mb << 20)
+    app.state.api.snapshot()  # build the dataset before accepting requests
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""Headless benchmarks for data generation, aggregation, chatbot questions and plot data.
+
+Synthetic datasets of roughly 10^4, 10^6 and 10^7 measurements are generated
+with the dashboard's sample generator, and each stage the dashboard runs is
+timed on them: generation, the float summary, building the shared snapshot
+(profile data, index, cube, query engine) and appending a batch to it, opening the same data as an
+on-disk store (first open, which builds the saved aggregates, and reopen,
+which only loads them), every question family the chatbot answers (cold on a
+fresh engine, warm, and from the answer cache), and the frames behind the
+map, profile and histogram figures. Peak traced memory is recorded per stage.
+
+Usage::
+
+    python -m floatchat.benchmark --output bench.json
+    python -m floatchat.benchmark --scales 1e4 1e6 --compare bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from .chatbot import QueryEngine
+from .maps import MapLayers
+from .plotting import level_histogram, profile_envelope
+from .schema import memory_footprint
+from .service import DataService, open_service
+from .store import ArgoStore
+from .summary import FloatSummary
+from .synthetic import generate_synthetic_data
+
+SCALES = (10_000, 1_000_000, 10_000_000)
+REPEATS = 9
+# A stage regresses only if it is slower by this many seconds as well as by the ratio threshold
+MIN_DELTA = 0.005
+MEASUREMENTS_PER_FLOAT = 12 * 100  # mean profiles per float x mean levels per profile
+
+# Question family -> example question ({float_id} is filled in per dataset)
+QUESTION_FAMILIES = {
+    "global extreme": "What's the highest temperature recorded?",
+    "global mean": "What's the average salinity?",
+    "fleet overview": "Give me a fleet overview",
+    "compare": "Compare the most active floats",
+    "float summary": "Tell me about float {float_id}",
+    "float metric": "What's the average temperature of float {float_id}?",
+    "region/time (cube)": "Show me salinity profiles near the equator in March 2013?",
+    "region/time (scan)": "Show me salinity in the tropics in 2013",
+    "region extreme": "Highest salinity in the Arabian Sea in 2013",
+    "depth window": "Average temperature between 100m and 500m in 2013",
+    "derived level": "Highest potential density in the tropics in 2013",
+    "derived profile": "Deepest mixed layer in 2013",
+    "float trend": "Show temperature trends for float {float_id}",
+    "region trend": "Salinity trend in the tropics",
+    "default": "Hello",
+}
+
+
+def _measure(func, repeats, memory, setup=None):
+    """Run ``func`` up to ``repeats`` times; returns ``(result, seconds list, peak bytes)``.
+
+    With ``setup``, each run calls ``func(setup())`` and the setup is not timed.
+    """
+    call = func if setup is None else (lambda: func(setup()))
+    times = []
+    for _ in range(repeats):
+        if setup is not None:
+            state = setup()
+            start = time.perf_counter()
+            result = func(state)
+        else:
+            start = time.perf_counter()
+            result = func()
+        times.append(time.perf_counter() - start)
+        if times[-1] > 2.0:  # slow stages are timed once
+            break
+    peak = None
+    if memory:
+        tracemalloc.start()
+        try:
+            call()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result, times, peak
+
+
+def run_scale(measurements, repeats=REPEATS, memory=True, seed=42, log=print):
+    """Benchmark every stage on one synthetic dataset; returns a list of result records."""
+    num_floats = max(1, round(measurements / MEASUREMENTS_PER_FLOAT))
+    records = []
+
+    def bench(name, func, reps=repeats, setup=None):
+        result, times, peak = _measure(func, reps, memory, setup)
+        records.append({
+            "scale": measurements,
+            "name": name,
+            "rows": rows,
+            "seconds": float(np.median(times)),
+            "min_seconds": float(min(times)),
+            "repeats": len(times),
+            "peak_bytes": peak,
+        })
+        log(f"  {name:<32} {records[-1]['seconds'] * 1000:10.2f} ms"
+            + (f" {peak / 2**20:10.1f} MB" if peak is not None else ""))
+        return result
+
+    log(f"scale {measurements:,}: {num_floats:,} floats")
+    rows = None
+    df = bench("generate_sample_data", lambda: generate_synthetic_data(num_floats=num_floats, seed=seed), 1)
+    rows = records[-1]["rows"] = len(df)
+    footprint = memory_footprint(df).loc["total"]
+    log(f"  row width: {footprint['bytes_per_row']:.1f} B ({footprint['ratio']:.0%} of int64/float64 columns)")
+
+    bench("float_summary", lambda: FloatSummary.from_frame(df).frame())
+    snapshot = bench("snapshot build", lambda: DataService(lambda: df).snapshot(), 1)
+    # Append the last cycle of every float to a snapshot of the rest whose derived variables are built
+    newest = (df["profile_index"] == df.groupby("float_id", observed=True)["profile_index"].transform("max")).to_numpy()
+    base, batch = df[~newest], df[newest]
+
+    def built_service():
+        service = DataService(lambda: base)
+        service.snapshot().derived.profile_values("mixed_layer_depth")
+        return service
+
+    bench("snapshot append", lambda service: service.append(batch), setup=built_service)
+    del base, batch
+    with tempfile.TemporaryDirectory() as tmp:
+        root = os.path.join(tmp, "store")
+        store = bench("store: write", lambda: ArgoStore.create(root, df), 1)
+        bench("store: first open", lambda: open_service(root).snapshot(), 1)
+        stored = bench("store: reopen", lambda: open_service(root).snapshot())
+        bench("store: version check", store.version)
+        region = QUESTION_FAMILIES["region extreme"]
+        bench("store: chat cold: region extreme", lambda: stored.engine.compile(stored.engine.parse(region))(stored.engine.parse(region)))
+        log(f"  store resident: {stored.data.memory_usage() / max(len(stored.data), 1):.1f} B per level")
+    del df
+
+    engine, data = snapshot.engine, snapshot.data
+    log(f"  resident: {data.memory_usage() / max(len(data), 1):.1f} B per level")
+    float_id = int(snapshot.float_summary["float_id"].iloc[0])
+
+    def fresh_engine():
+        """Engine with empty derived-variable and trend caches, as right after a snapshot build."""
+        return QueryEngine(data, snapshot.float_summary, snapshot.stats, snapshot.index, version=snapshot.version,
+                           cube=snapshot.cube)
+
+    # Cold: first answer on a fresh engine (derived variables and trend series are built lazily);
+    # warm: those are built, the answer cache is bypassed; cached: the answer cache hit
+    for family, question in QUESTION_FAMILIES.items():
+        question = question.format(float_id=float_id)
+        intent = engine.parse(question)
+        bench(f"chat cold: {family}", lambda cold: cold.compile(intent)(intent), setup=fresh_engine)
+        engine.compile(intent)(intent)
+        bench(f"chat warm: {family}", lambda: engine.compile(intent)(intent))
+        engine.answer(question)
+        bench(f"chat cached: {family}", lambda: engine.answer(question))
+
+    bench("plot: map bins (zoom 2)", lambda: MapLayers(data.profiles).layer(2))
+    bench("plot: map tracks (zoom 5, region)", lambda: MapLayers(data.profiles).layer(5, (0.0, 25.0, 50.0, 78.0)))
+    bench("plot: profiles (all floats)", lambda: profile_envelope(data, "temperature"))
+    bench("plot: profiles (one float)", lambda: profile_envelope(data, "temperature", float_id))
+    bench("plot: histogram", lambda: level_histogram(data, "salinity", 30, (snapshot.stats.min["salinity"], snapshot.stats.max["salinity"])))
+    return records
+
+
+def compare(results, baseline, threshold=1.25, min_delta=MIN_DELTA):
+    """Compare against a baseline run; returns ``(frame, regressions)``.
+
+    A stage is a timing regression only when both its best and its median time
+    exceed the baseline by ``threshold`` and the best time is also at least
+    ``min_delta`` seconds slower. Stages timed fewer than three times (the
+    slow ones) get the threshold squared, since one run cannot be denoised.
+    """
+    key = ["scale", "name"]
+    current = pd.DataFrame(results["results"]).set_index(key)
+    base = pd.DataFrame(baseline["results"]).set_index(key)
+    columns = ["seconds", "min_seconds", "repeats", "peak_bytes"]
+    joined = current[columns].join(base[columns], rsuffix="_baseline", how="inner")
+    joined["time_ratio"] = joined["min_seconds"] / joined["min_seconds_baseline"]
+    joined["median_ratio"] = joined["seconds"] / joined["seconds_baseline"]
+    joined["memory_ratio"] = joined["peak_bytes"].astype(float) / joined["peak_bytes_baseline"].astype(float)
+    few = joined[["repeats", "repeats_baseline"]].min(axis=1) < 3
+    tolerance = np.where(few, threshold * threshold, threshold)
+    slower = (
+        (joined["time_ratio"] > tolerance) & (joined["median_ratio"] > tolerance)
+        & (joined["min_seconds"] - joined["min_seconds_baseline"] >= min_delta)
+    )
+    regressions = joined[slower | (joined["memory_ratio"] > threshold)]
+    return joined.reset_index(), regressions.reset_index()
+
+
+def _metadata():
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark FloatChat data and chatbot stages at several scales")
+    parser.add_argument("--scales", type=float, nargs="+", default=SCALES, help="measurements per dataset")
+    parser.add_argument("--repeats", type=int, default=REPEATS, help="timed runs per stage (slow stages run once)")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc peak-memory pass")
+    parser.add_argument("--output", default=None, help="write results as JSON to this file")
+    parser.add_argument("--compare", default=None, help="baseline JSON file to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25, help="ratio over baseline reported as a regression")
+    parser.add_argument("--min-delta", type=float, default=MIN_DELTA,
+                        help="seconds a stage must slow down by, on top of the ratio, to count as a regression")
+    args = parser.parse_args(argv)
+
+    records = []
+    for scale in args.scales:
+        records.extend(run_scale(int(scale), repeats=args.repeats, memory=not args.no_memory))
+    results = {"metadata": _metadata(), "results": records}
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            json.dump(results, fh, indent=1)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as fh:
+            baseline = json.load(fh)
+        table, regressions = compare(results, baseline, args.threshold, args.min_delta)
+        print(table[["scale", "name", "min_seconds", "min_seconds_baseline", "time_ratio", "median_ratio", "memory_ratio"]]
+              .round(4).to_string(index=False))
+        if len(regressions):
+            print(f"\n{len(regressions)} regression(s) over {args.threshold:.2f}x:")
+            print(regressions[["scale", "name", "time_ratio", "median_ratio", "memory_ratio"]].round(3).to_string(index=False))
+            return 1
+        print("\nno regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
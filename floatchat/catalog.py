@@ -0,0 +1,198 @@
+"""Profile catalog of a store and the profile data that reads its levels on demand.
+
+A dashboard over a store does not keep the levels in memory. What it keeps is
+one row per profile: float, cycle, direction, position, start time and level
+count, plus the per-profile derived depths. ``ProfileCatalog`` builds that
+table batch by batch as fragments are folded in (the depths of a profile are
+computed once, from the batch that brought it) and, like the climatology cube,
+saves it next to the store as one ``.npz`` file, so a restart loads it instead
+of reading the measurements.
+
+``StoreProfiles`` puts the ``ProfileData`` interface over the catalog: profile
+lookups (float ranges, the index, map layers) use the table, and ``take`` /
+``chunks`` read the levels of the requested profiles from the store, projected
+to the requested columns and pruned to their float_id/year partitions.
+"""
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from .derived import PROFILE_VARIABLES, layer_depths
+from .profiles import CHUNK_LEVELS, LEVEL_COLUMNS, ProfileData, chunk_ranges, float_ranges, insert_rows, insert_slots, profile_keys
+
+CATALOG_FILE = os.path.join("_aggregates", "profiles.npz")
+PROFILE_COLUMNS = {
+    "float_id": np.int64,
+    "profile_index": np.int16,
+    "descending": np.bool_,
+    "latitude": np.float32,
+    "longitude": np.float32,
+    "time": "datetime64[s]",
+    "levels": np.int32,
+}
+# A profile's levels may be timed after its start; reads also open the partition of the
+# year this long after the start, so a profile crossing New Year is read whole
+MAX_PROFILE_SPAN = np.timedelta64(2, "D")
+
+
+def catalog_path(root):
+    """Default catalog location inside a store (skipped by the store's file scan)."""
+    return os.path.join(os.fspath(root), CATALOG_FILE)
+
+
+def _empty_profiles():
+    return pd.DataFrame({col: np.empty(0, dtype=dtype) for col, dtype in PROFILE_COLUMNS.items()})
+
+
+def _keys(profiles):
+    return profile_keys(profiles["float_id"], profiles["profile_index"], profiles["descending"])
+
+
+class ProfileCatalog:
+    """Profile table and per-profile derived depths of a store, updated batch by batch."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.profiles = _empty_profiles()  # sorted by profile key, like ProfileData.profiles
+        self.layers = {name: np.empty(0) for name in PROFILE_VARIABLES}  # aligned with profiles
+        self.files = set()  # store fragments already folded in
+        self.version = 0
+
+    def __len__(self):
+        return len(self.profiles)
+
+    def update(self, data):
+        """Fold the profiles of a batch (``ProfileData`` with all level columns) into the catalog.
+
+        Profiles are assumed to arrive whole, as the ingester and the store
+        fragments deliver them, and batches key-sorted, as ``ProfileData`` is.
+        """
+        if not data.profile_count:
+            return self
+        layers = layer_depths(data)
+        batch = data.profiles[list(PROFILE_COLUMNS)]
+        with self._lock:
+            # The batch's rows go in at their key positions, without sorting the table again
+            slots = insert_slots(self.profiles, batch)
+            # Replaced, not mutated: snapshots keep the table they were built on
+            self.profiles = insert_rows(self.profiles, slots, batch)
+            self.layers = {name: np.insert(self.layers[name], slots, layers[name]) for name in PROFILE_VARIABLES}
+            self.version += 1
+        return self
+
+    def view(self, store):
+        """``StoreProfiles`` over the current table, reading levels through ``store``."""
+        return StoreProfiles(store, self.profiles)
+
+    # -----------------------------
+    # PERSISTENCE
+    # -----------------------------
+    def save(self, path):
+        """Write the catalog atomically to an ``.npz`` file."""
+        path = os.fspath(path)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        profiles, layers = self.profiles, self.layers
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as fh:
+            np.savez(
+                fh, **{col: profiles[col].to_numpy() for col in PROFILE_COLUMNS}, **layers,
+                files=np.array(sorted(self.files), dtype=str), version=self.version,
+            )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        """Load a saved catalog; one saved without every column starts empty."""
+        catalog = cls()
+        with np.load(path) as saved:
+            if not all(name in saved for name in [*PROFILE_COLUMNS, *PROFILE_VARIABLES]):
+                return catalog
+            catalog.profiles = pd.DataFrame({col: saved[col].astype(dtype) for col, dtype in PROFILE_COLUMNS.items()})
+            catalog.layers = {name: saved[name] for name in PROFILE_VARIABLES}
+            catalog.files = set(saved["files"].tolist())
+            catalog.version = int(saved["version"])
+        return catalog
+
+    @classmethod
+    def open(cls, path):
+        """Load ``path`` if it exists, else return an empty catalog."""
+        return cls.load(path) if os.path.exists(path) else cls()
+
+
+class StoreProfiles:
+    """``ProfileData`` interface over a profile table whose levels stay in the store."""
+
+    def __init__(self, store, profiles):
+        self.store = store  # typically pinned to the files the table was built from
+        self.profiles = profiles
+        self.offsets = np.zeros(len(profiles) + 1, dtype=np.int64)
+        np.cumsum(profiles["levels"].to_numpy(), out=self.offsets[1:])
+        self.float_ranges = float_ranges(profiles)
+        self.levels = {}  # nothing resident
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    @property
+    def profile_count(self):
+        return len(self.profiles)
+
+    def memory_usage(self):
+        """Bytes held in memory: the profile table and offsets (the levels are on disk)."""
+        return int(self.profiles.memory_usage(deep=True).sum() + self.offsets.nbytes)
+
+    def float_profiles(self, float_id):
+        """Range of profile ids belonging to ``float_id``."""
+        return self.float_ranges.get(int(float_id), (0, 0))
+
+    def take(self, profile_ids, columns=None):
+        """``ProfileData`` of the given profiles, in that order, with the level ``columns`` read from the store.
+
+        Only the partitions of the profiles' floats and years are opened, and
+        only the key and requested columns are read.
+        """
+        columns = list(LEVEL_COLUMNS if columns is None else columns)
+        profile_ids = np.asarray(profile_ids, dtype=np.int64)
+        profiles = self.profiles.iloc[profile_ids].reset_index(drop=True)
+        if not len(profiles):
+            return ProfileData(profiles, np.zeros(1, dtype=np.int64), {col: np.empty(0, dtype=np.float32) for col in columns},
+                               np.empty(0, dtype=np.int32))
+        start = profiles["time"].to_numpy()
+        years = np.unique(np.r_[start, start + MAX_PROFILE_SPAN].astype("datetime64[Y]").astype(np.int64) + 1970)
+        rows = self.store.read(
+            columns=["float_id", "profile_index", "descending", "time", *columns],
+            float_ids=np.unique(profiles["float_id"].to_numpy()), years=years,
+        )
+
+        # Rows of each requested profile, grouped in request order (level order within a profile is kept)
+        keys = _keys(profiles)
+        sorter = np.argsort(keys, kind="stable")
+        row_keys = profile_keys(np.asarray(rows["float_id"], dtype=np.int64), rows["profile_index"], rows["descending"])
+        found = np.minimum(np.searchsorted(keys, row_keys, sorter=sorter), len(keys) - 1)
+        match = keys[sorter[found]] == row_keys
+        slot = sorter[found[match]]
+        order = np.flatnonzero(match)[np.argsort(slot, kind="stable")]
+        counts = np.bincount(slot, minlength=len(profiles))
+        profiles["levels"] = counts.astype(np.int32)
+        offsets = np.zeros(len(profiles) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        row_time = rows["time"].to_numpy()[order]
+        time_offset = (row_time - np.repeat(start, counts)).astype(np.int64).astype(np.int32)
+        levels = {col: rows[col].to_numpy()[order] for col in columns}
+        return ProfileData(profiles, offsets, levels, time_offset)
+
+    def chunks(self, columns=None, float_id=None, chunk_levels=CHUNK_LEVELS):
+        """Yield ``take`` pieces of about ``chunk_levels`` levels covering every profile (or one float's).
+
+        Pieces hold whole floats, so each partition is read once.
+        """
+        if float_id is not None:
+            first, stop = self.float_profiles(float_id)
+            if stop > first:
+                yield self.take(np.arange(first, stop), columns)
+            return
+        starts = [first for first, _ in self.float_ranges.values()]
+        for first, stop in chunk_ranges(self.offsets, chunk_levels, boundaries=starts):
+            yield self.take(np.arange(first, stop), columns)
@@ -0,0 +1,474 @@
+"""Intent-based query engine behind the FloatChat assistant.
+
+A question is parsed once into an ``Intent`` (metric, aggregation and float /
+region / time / depth filters). The intent is compiled into a plan that runs
+against precomputed data: ``GlobalStats`` for dataset-wide values,
+``float_summary`` for per-float values, and ``ProfileIndex`` plus the levels
+of just the matching profiles (``take``, which reads them from the store when
+the data is on disk) for filtered questions. Region/time questions whose
+window falls on the cells of a ``ClimatologyCube`` are answered from the cube
+instead of the levels. Derived level variables (density, potential
+temperature and density) are computed over the selected levels, per-profile
+ones (mixed-layer and thermocline depth) read from the snapshot's
+``DerivedVariables``, and trend questions from its ``TrendEngine`` monthly
+series. Answers are cached by
+normalized intent, so rephrasings of the same question are cache hits.
+"""
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from .derived import LEVEL_VARIABLES, PROFILE_VARIABLES, DerivedVariables
+from .trends import TREND_COLUMNS, TrendEngine
+
+METRIC_WORDS = {
+    "temperature": "temperature", "temp": "temperature", "salinity": "salinity", "salt": "salinity",
+    "psu": "salinity", "depth": "pressure", "pressure": "pressure", "density": "density",
+    "theta": "potential_temperature", "sigma": "potential_density", "mld": "mixed_layer_depth",
+    "thermocline": "thermocline_depth",
+}
+# Adjectives that imply a metric; an explicit metric noun ("deepest thermocline") overrides them
+IMPLIED_METRIC_WORDS = {
+    "warm": "temperature", "warmest": "temperature", "hot": "temperature", "hottest": "temperature",
+    "cold": "temperature", "coldest": "temperature", "saltiest": "salinity",
+    "deep": "pressure", "deepest": "pressure", "dense": "density", "densest": "density",
+}
+# Multi-word metrics, matched before single words
+METRIC_PHRASES = {
+    "potential temperature": "potential_temperature", "potential density": "potential_density",
+    "mixed layer": "mixed_layer_depth",
+}
+AGGREGATION_WORDS = {
+    "highest": "max", "max": "max", "maximum": "max", "warmest": "max", "hottest": "max",
+    "deepest": "max", "saltiest": "max", "densest": "max",
+    "lowest": "min", "min": "min", "minimum": "min", "coldest": "min", "coolest": "min", "shallowest": "min",
+    "average": "mean", "mean": "mean", "avg": "mean",
+    "overview": "overview", "summary": "overview", "fleet": "overview",
+    "compare": "compare", "comparison": "compare",
+    "trend": "trend", "trends": "trend", "anomaly": "trend", "anomalies": "trend",
+}
+MONTHS = {
+    name: number for number, names in enumerate([
+        ("january", "jan"), ("february", "feb"), ("march", "mar"), ("april", "apr"), ("may",),
+        ("june", "jun"), ("july", "jul"), ("august", "aug"), ("september", "sep", "sept"),
+        ("october", "oct"), ("november", "nov"), ("december", "dec"),
+    ], start=1) for name in names
+}
+# phrase -> (label, lat range, lon range)
+REGIONS = {
+    "equator": ("Near Equator", (-5.0, 5.0), None),
+    "equatorial": ("Near Equator", (-5.0, 5.0), None),
+    "tropics": ("in the Tropics", (-23.44, 23.44), None),
+    "northern hemisphere": ("in the Northern Hemisphere", (0.0, 90.0), None),
+    "southern hemisphere": ("in the Southern Hemisphere", (-90.0, 0.0), None),
+    "arabian sea": ("in the Arabian Sea", (0.0, 25.0), (50.0, 78.0)),
+    "bay of bengal": ("in the Bay of Bengal", (5.0, 23.0), (80.0, 95.0)),
+    "indian ocean": ("in the Indian Ocean", (-60.0, 30.0), (20.0, 120.0)),
+}
+UNITS = {"temperature": "°C", "salinity": "PSU", "pressure": "m", "density": "kg/m³",
+         "potential_temperature": "°C", "potential_density": "kg/m³", "mixed_layer_depth": "m", "thermocline_depth": "m"}
+DECIMALS = {"temperature": 2, "salinity": 3, "pressure": 0, "density": 3,
+            "potential_temperature": 2, "potential_density": 3, "mixed_layer_depth": 0, "thermocline_depth": 0}
+EMOJI = {"temperature": "🌡️", "salinity": "💧", "pressure": "🏊‍♂️", "density": "⚖️",
+         "potential_temperature": "🌡️", "potential_density": "⚖️", "mixed_layer_depth": "🌊", "thermocline_depth": "🌊"}
+PANELS = {"temperature": "temp_profiles", "salinity": "salinity",
+          **{metric: "derived" for metric in LEVEL_VARIABLES + PROFILE_VARIABLES}}
+
+DEPTH_UNITS = {"m", "meters", "metres", "dbar"}
+
+_TOKEN = re.compile(r"[a-z]+|\d+")
+_DEPTH_BETWEEN = re.compile(r"between (\d+) ?(?:m|meters|metres|dbar)? and (\d+) ?(?:m|meters|metres|dbar)")
+_DEPTH_BELOW = re.compile(r"(?:below|deeper than|under) (\d+) ?(?:m|meters|metres|dbar)\b")
+_DEPTH_ABOVE = re.compile(r"(?:above|shallower than|upper) (\d+) ?(?:m|meters|metres|dbar)\b")
+
+
+@dataclass(frozen=True)
+class Intent:
+    """Structured form of a question; hashable so it can key the answer cache."""
+    metric: str = None
+    aggregation: str = None
+    float_id: int = None
+    region: str = None
+    year: int = None
+    month: int = None
+    depth: tuple = None
+
+    @property
+    def filtered(self):
+        return self.region is not None or self.year is not None or self.depth is not None
+
+
+@dataclass(frozen=True)
+class Answer:
+    text: str
+    panels: tuple = ()  # visualization panels the UI should open
+    focus: tuple = ()  # (name, value) pairs the panels should show, e.g. (("float_id", 2902123),)
+
+
+def _normalize(text):
+    return " ".join(_TOKEN.findall(text.lower()))
+
+
+def _metric_noun(tokens):
+    """First explicit metric noun; "depth" right after a number or unit ("at 1000 m depth") is a filter."""
+    for i, token in enumerate(tokens):
+        if token not in METRIC_WORDS:
+            continue
+        if METRIC_WORDS[token] == "pressure" and i and (tokens[i - 1].isdigit() or tokens[i - 1] in DEPTH_UNITS):
+            continue
+        return METRIC_WORDS[token]
+    return None
+
+
+def parse_intent(text, float_ids=frozenset()):
+    """Parse a question into an ``Intent``.
+
+    ``float_ids`` should be a set or dict: numeric tokens are looked up in it
+    directly, so the cost does not depend on the size of the fleet.
+    """
+    normalized = _normalize(text)
+    tokens = normalized.split()
+
+    metric = next((m for phrase, m in METRIC_PHRASES.items() if phrase in normalized), None)
+    if metric is None:
+        metric = _metric_noun(tokens)
+    if metric is None:
+        metric = next((IMPLIED_METRIC_WORDS[t] for t in tokens if t in IMPLIED_METRIC_WORDS), None)
+    aggregation = next((AGGREGATION_WORDS[t] for t in tokens if t in AGGREGATION_WORDS), None)
+
+    float_id = next((int(t) for t in tokens if t.isdigit() and int(t) in float_ids), None)
+
+    region = next((phrase for phrase in REGIONS if phrase in normalized), None)
+
+    depth = None
+    if match := _DEPTH_BETWEEN.search(normalized):
+        depth = tuple(sorted((float(match.group(1)), float(match.group(2)))))
+    elif match := _DEPTH_BELOW.search(normalized):
+        depth = (float(match.group(1)), None)
+    elif match := _DEPTH_ABOVE.search(normalized):
+        depth = (None, float(match.group(1)))
+
+    # Numbers inside the depth phrase ("between 1995 and 2000 m") are not years
+    year_tokens = (normalized[:match.start()] + " " + normalized[match.end():] if match else normalized).split()
+    year = month = None
+    for i, token in enumerate(year_tokens):
+        next_token = year_tokens[i + 1] if i + 1 < len(year_tokens) else ""
+        if token.isdigit() and len(token) == 4 and 1990 <= int(token) <= 2100 and next_token not in DEPTH_UNITS:
+            year = int(token)
+            if i > 0 and year_tokens[i - 1] in MONTHS:
+                month = MONTHS[year_tokens[i - 1]]
+            break
+
+    return Intent(metric, aggregation, float_id, region, year, month, depth)
+
+
+def _date(record):
+    time = record.get("time")
+    return time.strftime('%Y-%m-%d') if pd.notna(time) else 'unknown date'
+
+
+class QueryEngine:
+    """Compiles intents into plans over precomputed data and caches the answers."""
+
+    def __init__(self, data, float_summary, stats, index, version=None, note=None, cache_size=1024, cube=None, derived=None,
+                 trends=None):
+        self.data = data
+        self.float_summary = float_summary
+        self.stats = stats
+        self.index = index
+        self.version = version
+        self.cube = cube
+        self.derived = derived if derived is not None else DerivedVariables(data)
+        self.trends = trends if trends is not None else TrendEngine(data, trend_regions(), cube=cube)
+        self.note = note  # extra line appended to filtered answers, e.g. a sample-data disclaimer
+        # float_id -> row of float_summary; doubles as the token lookup set
+        self._float_rows = {int(fid): row for row, fid in enumerate(float_summary["float_id"])}
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+
+    def parse(self, text):
+        return parse_intent(text, self._float_rows)
+
+    def answer(self, text):
+        """Answer a question, from cache when an equivalent question was already asked."""
+        intent = self.parse(text)
+        with self._lock:
+            if intent in self._cache:
+                self._cache.move_to_end(intent)
+                return self._cache[intent]
+        result = self.compile(intent)(intent)
+        with self._lock:
+            self._cache[intent] = result
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    def compile(self, intent):
+        """Pick the plan for an intent."""
+        if intent.aggregation == "trend":
+            return self._trend
+        if intent.metric in PROFILE_VARIABLES:
+            return self._profile_metric
+        if intent.metric in LEVEL_VARIABLES:
+            return self._filtered
+        if intent.filtered:
+            return self._from_cube if self._cube_eligible(intent) else self._filtered
+        if intent.float_id is not None:
+            return self._filtered if intent.aggregation in ("max", "min", "mean") and intent.metric else self._float
+        if intent.aggregation == "compare":
+            return self._compare
+        if intent.aggregation == "overview":
+            return self._overview
+        if intent.metric and intent.aggregation in ("max", "min", "mean"):
+            return self._global
+        if intent.metric == "pressure":
+            return self._global
+        return self._default
+
+    # -----------------------------
+    # PLANS
+    # -----------------------------
+    def _global(self, intent):
+        stats, metric = self.stats, intent.metric
+        aggregation = intent.aggregation or "max"
+        if aggregation == "mean":
+            if metric == "temperature":
+                return Answer(f"📊 The average temperature across all measurements is **{stats.mean['temperature']:.2f}°C. The temperature ranges from {stats.min['temperature']:.1f}°C to {stats.max['temperature']:.1f}°C.")
+            if metric == "salinity":
+                return Answer(f"💧 The average salinity across all measurements is {stats.mean['salinity']:.3f} PSU, ranging from {stats.min['salinity']:.3f} to {stats.max['salinity']:.3f} PSU.")
+            return Answer(f"{EMOJI[metric]} The average {_label(metric)} across all measurements is {stats.mean[metric]:.0f}m, ranging from {stats.min[metric]:.0f}m to {stats.max[metric]:.0f}m.")
+
+        record = (stats.argmax if aggregation == "max" else stats.argmin)[metric]
+        if metric == "temperature" and aggregation == "max":
+            return Answer(f" The highest temperature recorded is {record['temperature']:.2f}°C by Float {record['float_id']} at {record['pressure']:.0f}m depth on {_date(record)}.")
+        if metric == "temperature":
+            return Answer(f"🧊 The lowest temperature recorded is **{record['temperature']:.2f}°C** by Float {record['float_id']} at {record['pressure']:.0f}m depth on {_date(record)}.")
+        if metric == "pressure" and aggregation == "max":
+            return Answer(f"🏊‍♂️ The deepest measurement was taken at {record['pressure']:.0f}m by Float {record['float_id']} with a temperature of {record['temperature']:.1f}°C and salinity of {record['salinity']:.2f} PSU.")
+        if metric == "pressure":
+            return Answer(f"🏊‍♂️ The shallowest measurement was taken at {record['pressure']:.0f}m by Float {record['float_id']} with a temperature of {record['temperature']:.1f}°C and salinity of {record['salinity']:.2f} PSU.")
+        word = "highest" if aggregation == "max" else "lowest"
+        return Answer(f"💧 The {word} salinity recorded is {record['salinity']:.3f} PSU by Float {record['float_id']} at {record['pressure']:.0f}m depth.")
+
+    def _float(self, intent):
+        float_id = intent.float_id
+        float_data = self.float_summary.iloc[self._float_rows[float_id]]
+        return Answer(f"""
+📊 **Float {float_id} Summary:**
+• **Location:** {float_data['lat_mean']:.2f}°N, {float_data['lon_mean']:.2f}°E
+• **Total Profiles:** {float_data['total_profiles']:.0f}
+• **Average Temperature:** {float_data['temp_mean']:.2f}°C
+• **Average Salinity:** {float_data['sal_mean']:.3f} PSU
+• **Maximum Depth:** {float_data['pressure_max']:.0f}m
+• **Active Period:** {float_data['deployment_days']:.0f} days
+• **Temperature Range:** {float_data['temp_min']:.1f}°C to {float_data['temp_max']:.1f}°C
+            """)
+
+    def _overview(self, intent):
+        float_summary, stats = self.float_summary, self.stats
+        most_active = float_summary.loc[float_summary['total_profiles'].idxmax()]
+        return Answer(f"""
+🚢 **Fleet Overview:**
+• **Total Active Floats:** {len(float_summary)}
+• **Total Profiles Collected:** {stats.profiles:,}
+• **Most Active Float:** {most_active['float_id']} ({most_active['total_profiles']:.0f} profiles)
+• **Global Temperature Range:** {stats.min['temperature']:.1f}°C to {stats.max['temperature']:.1f}°C
+• **Maximum Depth Reached:** {stats.max['pressure']:.0f}m
+• **Average Deployment Duration:** {float_summary['deployment_days'].mean():.0f} days
+        """)
+
+    def _compare(self, intent):
+        top_floats = self.float_summary.nlargest(2, 'total_profiles')
+        if len(top_floats) < 2:
+            return self._default(intent)
+        float1, float2 = top_floats.iloc[0], top_floats.iloc[1]
+        return Answer(f"""
+🔄 **Comparison - Top 2 Most Active Floats:**
+
+**Float {float1['float_id']}:**
+• Profiles: {float1['total_profiles']:.0f}
+• Avg Temp: {float1['temp_mean']:.2f}°C
+• Max Depth: {float1['pressure_max']:.0f}m
+
+**Float {float2['float_id']}:**
+• Profiles: {float2['total_profiles']:.0f}
+• Avg Temp: {float2['temp_mean']:.2f}°C
+• Max Depth: {float2['pressure_max']:.0f}m
+        """)
+
+    def _default(self, intent):
+        return Answer(f"""
+🤖 Here's a quick look at the Argo float data:
+• **Total Floats:** {len(self.float_summary)}
+• **Average Temperature:** {self.stats.mean['temperature']:.2f}°C
+• **Average Salinity:** {self.stats.mean['salinity']:.3f} PSU
+Try asking something specific like "Show me salinity profiles near the equator in March 2013?" or select a sample question!
+        """)
+
+    def _window(self, intent):
+        """Index query (region, time range, float) of a filtered intent."""
+        query = {}
+        if intent.region is not None:
+            _, query["lat"], query["lon"] = REGIONS[intent.region]
+        if intent.year is not None:
+            start = pd.Timestamp(year=intent.year, month=intent.month or 1, day=1)
+            query["start"] = start
+            query["end"] = start + pd.DateOffset(months=1) if intent.month else start + pd.DateOffset(years=1)
+        if intent.float_id is not None:
+            query["float_ids"] = [intent.float_id]
+        return query
+
+    def _cube_eligible(self, intent):
+        """Cube cells hold no per-float or per-record data, and distinct profile
+        counts do not add up across pressure bands."""
+        if self.cube is None or intent.float_id is not None or intent.depth is not None or intent.metric in LEVEL_VARIABLES:
+            return False
+        if intent.aggregation in ("max", "min"):
+            return False
+        return self.cube.aligned(**self._window(intent))
+
+    def _from_cube(self, intent):
+        """Region/time statistics from the climatology cube; profiles are counted on the index."""
+        metric = intent.metric or "salinity"
+        query = self._window(intent)
+        cells = self.cube.query(**query)
+        if not cells.count[metric]:
+            return Answer(f"No {_label(metric)} measurements were found {self._describe(intent).lower()}.")
+        profiles = len(self.index.query(**query))
+        return self._summary(intent, metric, profiles, cells.mean[metric], cells.min[metric], cells.max[metric])
+
+    def _filtered(self, intent):
+        """Filters resolve to profiles through the index; only their levels are read and reduced."""
+        metric = intent.metric or "salinity"
+        profile_ids = self.index.query(**self._window(intent))
+        columns = list(dict.fromkeys(["pressure", metric]))
+        selected = self.derived.take(profile_ids, columns)
+        keep = ~np.isnan(selected[metric])
+        if intent.depth is not None:
+            pressure = selected["pressure"]
+            if intent.depth[0] is not None:
+                keep &= pressure >= intent.depth[0]
+            if intent.depth[1] is not None:
+                keep &= pressure <= intent.depth[1]
+        positions = np.flatnonzero(keep)
+        if not len(positions):
+            return Answer(f"No {_label(metric)} measurements were found {self._describe(intent).lower()}.")
+        values = selected[metric][positions].astype(np.float64)
+        # Profiles with a kept level: kept-level counts per CSR segment (every profile has levels)
+        profiles = int(np.count_nonzero(np.add.reduceat(keep, selected.offsets[:-1])))
+
+        extreme = None
+        if intent.aggregation in ("max", "min"):
+            best = int(np.argmax(values) if intent.aggregation == "max" else np.argmin(values))
+            pick = positions[best]
+            owner = profile_ids[np.searchsorted(selected.offsets, pick, side="right") - 1]
+            extreme = (values[best], self._record(owner, {col: selected[col][pick] for col in columns}))
+        return self._summary(intent, metric, profiles, values.mean(), values.min(), values.max(), extreme)
+
+    def _profile_metric(self, intent):
+        """Per-profile variables (mixed-layer and thermocline depth) reduced over the selected profiles."""
+        metric = intent.metric
+        profile_ids = self.index.query(**self._window(intent))
+        values = self.derived.profile_values(metric)[profile_ids]
+        valid = ~np.isnan(values)
+        values, profile_ids = values[valid], profile_ids[valid]
+        if not len(values):
+            return Answer(f"No profiles with a resolved {_label(metric)} were found {self._describe(intent).lower()}.")
+        extreme = None
+        if intent.aggregation in ("max", "min"):
+            pick = int(np.argmax(values) if intent.aggregation == "max" else np.argmin(values))
+            extreme = (values[pick], self._record(profile_ids[pick]))
+        return self._summary(intent, metric, len(values), values.mean(), values.min(), values.max(), extreme)
+
+    def _trend(self, intent):
+        """Linear trend and largest anomaly of a monthly depth-band series."""
+        metric = intent.metric if intent.metric in TREND_COLUMNS else "temperature"
+        series, trend = self.trends.trend(metric, intent.float_id, intent.region, intent.depth, intent.year)
+        focus = (("metric", metric), ("float_id", intent.float_id), ("region", intent.region), ("depth", intent.depth))
+        described = self._describe(intent)
+        if trend is None:
+            return Answer(f"Not enough monthly {_label(metric)} data for a trend {described or 'across the fleet'} "
+                          f"({len(series)} month{'s' if len(series) != 1 else ''}; at least 3 are needed).")
+        unit, decimals = UNITS[metric], DECIMALS[metric] + 1
+        bands = self.trends.bands_for(intent.depth)
+        edges = self.trends.bands
+        lines = [
+            f"📈 **{_label(metric).title()} Trend {described or 'Across the Fleet'}:**",
+            f"• Period: {trend.start:%b %Y} to {trend.end:%b %Y} ({trend.months} monthly means)",
+            f"• Linear Trend: {trend.slope:+.{decimals}f} {unit}/year (± {trend.stderr:.{decimals}f})",
+            f"• Change over Period: {trend.change:+.{decimals}f} {unit}",
+            f"• Largest Anomaly: {trend.largest_anomaly:+.{decimals}f} {unit} in {trend.largest_anomaly_month:%B %Y}",
+            f"• Depth: {edges[bands[0]]:.0f}-{edges[bands[-1] + 1]:.0f}m" if intent.depth else "• Depth: all depths",
+        ]
+        if self.note:
+            lines.append(f"• {self.note}")
+        lines.append("Showing the trend chart below.")
+        return Answer("\n" + "\n".join(lines) + "\n            ", ("trends",), focus)
+
+    def _summary(self, intent, metric, profiles, mean, low, high, extreme=None):
+        title = f"{_label(metric).title()}{'' if metric in PROFILE_VARIABLES else ' Profiles'} {self._describe(intent)}".rstrip()
+        unit, decimals = UNITS[metric], DECIMALS[metric]
+        lines = [
+            f"{EMOJI[metric]} **{title}:**",
+            f"• Number of Profiles: {profiles}",
+            f"• Average {_label(metric).title()}: {mean:.{decimals}f} {unit}",
+            f"• Range: {low:.{decimals}f} to {high:.{decimals}f} {unit}",
+        ]
+        if extreme is not None:
+            value, record = extreme
+            if metric in PROFILE_VARIABLES:
+                word = "Deepest" if intent.aggregation == "max" else "Shallowest"
+                lines.append(f"• {word}: {value:.{decimals}f} {unit} by Float {record['float_id']} on {_date(record)}")
+            else:
+                word = "Highest" if intent.aggregation == "max" else "Lowest"
+                lines.append(
+                    f"• {word}: {value:.{decimals}f} {unit} by Float {record['float_id']} "
+                    f"at {record['pressure']:.0f}m depth on {_date(record)}"
+                )
+        if self.note:
+            lines.append(f"• {self.note}")
+        panel = PANELS.get(metric)
+        if panel:
+            lines.append(f"Showing {_label(metric)} analysis visualization below for reference.")
+        return Answer("\n" + "\n".join(lines) + "\n            ", (panel,) if panel else ())
+
+    def _describe(self, intent):
+        parts = []
+        if intent.float_id is not None:
+            parts.append(f"for Float {intent.float_id}")
+        if intent.region is not None:
+            parts.append(REGIONS[intent.region][0])
+        if intent.depth is not None:
+            low, high = intent.depth
+            if low is not None and high is not None:
+                parts.append(f"between {low:.0f}-{high:.0f}m")
+            elif low is not None:
+                parts.append(f"below {low:.0f}m")
+            else:
+                parts.append(f"above {high:.0f}m")
+        if intent.year is not None:
+            when = f"{pd.Timestamp(year=2000, month=intent.month, day=1):%B} {intent.year}" if intent.month else str(intent.year)
+            parts.append(f"in {when}")
+        return " ".join(parts)
+
+    def _record(self, profile_id, levels=None):
+        """Record of a profile, plus the values of one of its levels if given."""
+        profile = self.index.profiles.iloc[int(profile_id)]
+        record = dict(levels or {})
+        record.update(float_id=int(profile["float_id"]), profile_index=int(profile["profile_index"]),
+                      time=pd.Timestamp(profile["time"]))
+        return record
+
+
+def trend_regions():
+    """Region phrase -> (lat range, lon range) for the trend engine."""
+    return {phrase: (lat, lon) for phrase, (_, lat, lon) in REGIONS.items()}
+
+
+def _label(metric):
+    return "depth" if metric == "pressure" else metric.replace("_", " ")
@@ -0,0 +1,348 @@
+"""Gridded climatology cube: lat x lon x pressure band x month aggregates.
+
+Every measurement is binned by its profile's position and start month and by
+its pressure band, and each non-empty cell keeps ``count``, ``sum``, ``sumsq``,
+``min`` and ``max`` per level column. Cells are stored sparsely as a sorted
+array of packed keys (month-major, so a time window is one ``searchsorted``
+range), persisted as a single ``.npz`` file next to the store, and merged with
+new batches as profiles arrive.
+
+Statistics for a region/time/depth window are reduced from the matching cells,
+so their cost depends on the number of cells rather than on the number of
+measurements, and so are the monthly per-band series of a region behind the
+trend charts (``monthly``). Windows are snapped outward to cell edges;
+``aligned`` tells whether a window falls exactly on them.
+
+Usage::
+
+    python -m floatchat.climatology STORE
+"""
+import argparse
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from .profiles import LEVEL_COLUMNS, ProfileData
+
+# Pressure band edges (dbar); deeper levels fall into the last band
+PRESSURE_BANDS = (0, 10, 20, 50, 100, 200, 300, 500, 700, 1000, 1500, 2000, 6000)
+EPOCH_YEAR = 1950
+CUBE_FILE = os.path.join("_climatology", "cube.npz")
+
+
+def cube_path(root):
+    """Default cube location inside a store (skipped by the store's file scan)."""
+    return os.path.join(os.fspath(root), CUBE_FILE)
+
+
+def _month_index(times):
+    months = np.asarray(times, dtype="datetime64[M]").astype(np.int64)
+    return months - (EPOCH_YEAR - 1970) * 12
+
+
+def _reduce(keys, count, total, sumsq, lo, hi):
+    """Merge rows with equal keys; returns the sorted unique keys and their aggregates."""
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else np.empty(0, dtype=np.int64)
+    if not len(starts):
+        return keys, count, total, sumsq, lo, hi
+    return (
+        keys[starts],
+        np.add.reduceat(count[order], starts),
+        np.add.reduceat(total[order], starts),
+        np.add.reduceat(sumsq[order], starts),
+        np.fmin.reduceat(lo[order], starts),
+        np.fmax.reduceat(hi[order], starts),
+    )
+
+
+def _merge(cells, batch):
+    """Fold ``batch`` (sorted unique keys and aggregates, as ``_reduce`` returns) into ``cells``.
+
+    Cells already present are combined in place of a new sort: the batch's
+    other keys are inserted at their ``searchsorted`` positions.
+    """
+    keys, new_keys = cells[0], batch[0]
+    at = np.searchsorted(keys, new_keys)
+    hit = keys[np.minimum(at, len(keys) - 1)] == new_keys if len(keys) else np.zeros(len(new_keys), dtype=bool)
+    miss = ~hit
+    merged = [np.insert(old, at[miss], new[miss], axis=0) for old, new in zip(cells, batch)]
+    # Positions of the hit cells once the missing ones are inserted before them
+    rows = at[hit] + np.searchsorted(at[miss], at[hit], side="right")
+    for i, combine in enumerate((np.add, np.add, np.add, np.fmin, np.fmax), start=1):
+        merged[i][rows] = combine(merged[i][rows], batch[i][hit])
+    return tuple(merged)
+
+
+class CellStats:
+    """Count, mean, std, min and max per level column for one window of cells."""
+
+    def __init__(self, count, total, sumsq, lo, hi, columns=LEVEL_COLUMNS):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = total / count
+            std = np.sqrt(np.clip((sumsq - total * mean) / (count - 1), 0, None))
+        self.cells = 0
+        self.count = {col: int(n) for col, n in zip(columns, count)}
+        self.mean = {col: (float(m) if n else np.nan) for col, m, n in zip(columns, mean, count)}
+        self.std = {col: (float(s) if n > 1 else np.nan) for col, s, n in zip(columns, std, count)}
+        self.min = {col: float(v) for col, v in zip(columns, lo)}
+        self.max = {col: float(v) for col, v in zip(columns, hi)}
+
+
+class ClimatologyCube:
+    """Sparse gridded aggregates that can be updated, saved and queried by window."""
+
+    def __init__(self, cell_degrees=1.0, pressure_bands=PRESSURE_BANDS):
+        self.cell_degrees = float(cell_degrees)
+        self.pressure_bands = np.asarray(pressure_bands, dtype=np.float64)
+        self._n_lat = int(np.ceil(180 / self.cell_degrees))
+        self._n_lon = int(np.ceil(360 / self.cell_degrees))
+        self._n_bands = len(self.pressure_bands) - 1
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        width = len(LEVEL_COLUMNS)
+        self.keys = np.empty(0, dtype=np.int64)
+        self.count = np.empty((0, width), dtype=np.int64)
+        self.sum = np.empty((0, width), dtype=np.float64)
+        self.sumsq = np.empty((0, width), dtype=np.float64)
+        self.min = np.empty((0, width), dtype=np.float64)
+        self.max = np.empty((0, width), dtype=np.float64)
+        self.files = set()  # store fragments already folded in
+        self.version = 0
+
+    def __len__(self):
+        return len(self.keys)
+
+    # -----------------------------
+    # CELL KEYS
+    # -----------------------------
+    @property
+    def _month_stride(self):
+        return self._n_bands * self._n_lat * self._n_lon
+
+    def _lat_bin(self, lat):
+        return np.clip(((np.asarray(lat) + 90) // self.cell_degrees).astype(np.int64), 0, self._n_lat - 1)
+
+    def _lon_bin(self, lon):
+        wrapped = (np.asarray(lon) + 180) % 360
+        return np.clip((wrapped // self.cell_degrees).astype(np.int64), 0, self._n_lon - 1)
+
+    def _band(self, pressure):
+        bands = np.searchsorted(self.pressure_bands, pressure, side="right") - 1
+        return np.clip(bands, 0, self._n_bands - 1)
+
+    def _decode(self, keys):
+        """Split packed keys into ``(month, band, lat_bin, lon_bin)``."""
+        rest, lon = np.divmod(keys, self._n_lon)
+        rest, lat = np.divmod(rest, self._n_lat)
+        month, band = np.divmod(rest, self._n_bands)
+        return month, band, lat, lon
+
+    # -----------------------------
+    # BUILDING
+    # -----------------------------
+    def update(self, source):
+        """Fold a batch (``ProfileData`` or measurement frame) into the cube.
+
+        Profiles are assumed to arrive whole, as the ingester and the store
+        fragments deliver them.
+        """
+        data = source if isinstance(source, ProfileData) else ProfileData.from_frame(source)
+        if not len(data):
+            return self
+        profiles = data.profiles
+        levels = profiles["levels"].to_numpy()
+        cell = _month_index(profiles["time"].to_numpy()).clip(0)
+        cell = (cell * self._n_bands) * self._n_lat * self._n_lon \
+            + self._lat_bin(profiles["latitude"].to_numpy()) * self._n_lon \
+            + self._lon_bin(profiles["longitude"].to_numpy())
+        band = self._band(data["pressure"].astype(np.float64))
+        keys = np.repeat(cell, levels) + band * self._n_lat * self._n_lon
+
+        values = np.column_stack([data[col].astype(np.float64) for col in LEVEL_COLUMNS])
+        valid = ~np.isnan(values)
+        filled = np.where(valid, values, 0.0)
+        batch = _reduce(keys, valid.astype(np.int64), filled, filled * filled, values, values)
+
+        with self._lock:
+            merged = _merge((self.keys, self.count, self.sum, self.sumsq, self.min, self.max), batch)
+            self.keys, self.count, self.sum, self.sumsq, self.min, self.max = merged
+            self.version += 1
+        return self
+
+    def sync(self, store, path=None):
+        """Fold in store fragments written since the last sync and save to ``path`` if any were new."""
+        with self._sync_lock:
+            # Relative paths, so a saved cube stays valid when the store is moved
+            new_files = [p for p in store.files() if os.path.relpath(p, store.root) not in self.files]
+            if new_files:
+                self.update(store.read_files(new_files))
+                self.files.update(os.path.relpath(p, store.root) for p in new_files)
+                if path is not None:
+                    self.save(path)
+        return self
+
+    # -----------------------------
+    # PERSISTENCE
+    # -----------------------------
+    def save(self, path):
+        """Write the cube atomically to an ``.npz`` file."""
+        path = os.fspath(path)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as fh:
+            np.savez(
+                fh, keys=self.keys, count=self.count, sum=self.sum, sumsq=self.sumsq,
+                min=self.min, max=self.max, cell_degrees=self.cell_degrees,
+                pressure_bands=self.pressure_bands, columns=np.array(LEVEL_COLUMNS),
+                files=np.array(sorted(self.files), dtype=str), version=self.version,
+            )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        """Load a saved cube; a cube built with other columns starts empty."""
+        with np.load(path) as saved:
+            cube = cls(float(saved["cell_degrees"]), saved["pressure_bands"])
+            if list(saved["columns"]) != LEVEL_COLUMNS:
+                return cube
+            cube.keys, cube.count, cube.sum = saved["keys"], saved["count"], saved["sum"]
+            cube.sumsq, cube.min, cube.max = saved["sumsq"], saved["min"], saved["max"]
+            cube.files = set(saved["files"].tolist())
+            cube.version = int(saved["version"])
+        return cube
+
+    @classmethod
+    def open(cls, path, **kwargs):
+        """Load ``path`` if it exists, else return an empty cube."""
+        return cls.load(path) if os.path.exists(path) else cls(**kwargs)
+
+    # -----------------------------
+    # QUERIES
+    # -----------------------------
+    def _edges(self, value_range, origin, count):
+        lo, hi = value_range
+        first = int(np.floor((lo - origin) / self.cell_degrees))
+        stop = int(np.ceil((hi - origin) / self.cell_degrees))
+        return max(first, 0), min(max(stop, first + 1), count)
+
+    def _band_range(self, depth):
+        low, high = depth
+        first = 0 if low is None else int(self._band(low))
+        stop = self._n_bands if high is None else int(np.searchsorted(self.pressure_bands, high, side="left"))
+        return first, max(stop, first + 1)
+
+    def aligned(self, lat=None, lon=None, start=None, end=None, depth=None):
+        """Whether a window falls exactly on cell, month and band edges."""
+        def on_grid(value, origin):
+            steps = (value - origin) / self.cell_degrees
+            return np.isclose(steps, np.round(steps))
+
+        def on_month(value):
+            return value is None or pd.Timestamp(value) == pd.Timestamp(value).to_period("M").start_time
+
+        def on_band(value):
+            return value is None or bool(np.isin(value, self.pressure_bands))
+
+        return bool(
+            (lat is None or (on_grid(lat[0], -90) and on_grid(lat[1], -90)))
+            and (lon is None or (on_grid(lon[0], -180) and on_grid(lon[1], -180)))
+            and on_month(start) and on_month(end)
+            and (depth is None or (on_band(depth[0]) and on_band(depth[1])))
+        )
+
+    def _rows(self, lat=None, lon=None, start=None, end=None, depth=None, months=None):
+        """Row positions of the cells in a window (see ``query``)."""
+        keys, offset = self.keys, 0
+        if start is not None or end is not None:
+            stride = self._month_stride
+            if start is not None:
+                offset = int(np.searchsorted(keys, _month_index(pd.Timestamp(start).to_datetime64()) * stride))
+            if end is not None:
+                last = _month_index((pd.Timestamp(end) - pd.Timedelta(seconds=1)).to_datetime64())
+                keys = keys[:np.searchsorted(keys, (last + 1) * stride)]
+            keys = keys[offset:]
+        month, band, lat_bin, lon_bin = self._decode(keys)
+
+        keep = np.ones(len(keys), dtype=bool)
+        if lat is not None:
+            first, stop = self._edges(lat, -90, self._n_lat)
+            keep &= (lat_bin >= first) & (lat_bin < stop)
+        if lon is not None and (lon[1] - lon[0]) < 360:
+            if lon[0] <= lon[1]:
+                first, stop = self._edges(lon, -180, self._n_lon)
+                keep &= (lon_bin >= first) & (lon_bin < stop)
+            else:  # window crosses the antimeridian
+                first, _ = self._edges((lon[0], 180.0), -180, self._n_lon)
+                _, stop = self._edges((-180.0, lon[1]), -180, self._n_lon)
+                keep &= (lon_bin >= first) | (lon_bin < stop)
+        if depth is not None:
+            first, stop = self._band_range(depth)
+            keep &= (band >= first) & (band < stop)
+        if months is not None:
+            keep &= np.isin(month % 12 + 1, list(months))
+        return np.flatnonzero(keep) + offset
+
+    def query(self, lat=None, lon=None, start=None, end=None, depth=None, months=None):
+        """Aggregate the cells of a window.
+
+        ``lat``/``lon`` are ``(min, max)`` ranges (``lon`` may wrap the
+        antimeridian), ``start``/``end`` a half-open time range, ``depth`` a
+        ``(min, max)`` pressure range with ``None`` for an open end, and
+        ``months`` an optional collection of months of the year (1-12).
+        """
+        rows = self._rows(lat, lon, start, end, depth, months)
+        width = len(LEVEL_COLUMNS)
+        if not len(rows):
+            empty = np.full(width, np.nan)
+            return CellStats(np.zeros(width, dtype=np.int64), np.zeros(width), np.zeros(width), empty, empty)
+        result = CellStats(
+            self.count[rows].sum(axis=0), self.sum[rows].sum(axis=0), self.sumsq[rows].sum(axis=0),
+            np.fmin.reduce(self.min[rows], axis=0), np.fmax.reduce(self.max[rows], axis=0),
+        )
+        result.cells = len(rows)
+        return result
+
+    def monthly(self, lat=None, lon=None):
+        """Monthly aggregates of a region per pressure band.
+
+        Returns ``(first month, count, sum)``: months counted from
+        ``EPOCH_YEAR``, and float64 arrays of shape (months, bands, columns).
+        """
+        rows = self._rows(lat, lon)
+        width = len(LEVEL_COLUMNS)
+        if not len(rows):
+            empty = np.zeros((0, self._n_bands, width))
+            return 0, empty, empty
+        month, band, _, _ = self._decode(self.keys[rows])
+        first = int(month.min())
+        size = (int(month.max()) - first + 1) * self._n_bands
+        slot = (month - first) * self._n_bands + band
+        count = np.stack([np.bincount(slot, weights=self.count[rows, c], minlength=size) for c in range(width)], axis=1)
+        total = np.stack([np.bincount(slot, weights=self.sum[rows, c], minlength=size) for c in range(width)], axis=1)
+        shape = (-1, self._n_bands, width)
+        return first, count.reshape(shape), total.reshape(shape)
+
+
+def build_cube(store_root, path=None):
+    """Create or update the cube of a store on disk."""
+    from .store import ArgoStore
+
+    path = path or cube_path(store_root)
+    return ClimatologyCube.open(path).sync(ArgoStore(store_root), path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or update the climatology cube of a FloatChat store")
+    parser.add_argument("store", help="store directory")
+    parser.add_argument("--output", default=None, help=f"cube file (default: STORE/{CUBE_FILE})")
+    args = parser.parse_args(argv)
+    cube = build_cube(args.store, args.output)
+    print(f"done: {len(cube):,} cells from {len(cube.files)} files")
+
+
+if __name__ == "__main__":
+    main()
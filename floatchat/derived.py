@@ -0,0 +1,275 @@
+"""Derived oceanographic variables computed from the profile level arrays.
+
+Per level: in-situ density, potential temperature and potential density
+(EOS-80 / UNESCO 1983 formulas, pressure in dbar, referenced to the surface).
+Per profile: mixed-layer depth (first depth where potential density exceeds
+its value at 10 dbar by 0.03 kg/m³, de Boyer Montégut et al. 2004) and
+thermocline depth (depth of the strongest temperature decrease between
+``bin_size`` pressure bins).
+
+Everything is computed with whole-array NumPy expressions over batches of
+levels, never row by row. Level variables are cheap next to reading the
+levels, so ``level_values`` computes them for whatever levels a query or plot
+selected; over resident data ``DerivedVariables`` computes them once over
+every level and keeps them. The per-profile depths need every level of a profile and are kept
+by ``DerivedVariables``, aligned with the profile table of one dataset
+version: computed on first use, or handed over from the store's profile
+catalog, which computes them once per profile as batches arrive.
+"""
+import threading
+
+import numpy as np
+
+from .profiles import LEVEL_COLUMNS, csr_positions, inserted_ids
+
+LEVEL_VARIABLES = ("density", "potential_temperature", "potential_density")
+PROFILE_VARIABLES = ("mixed_layer_depth", "thermocline_depth")
+
+
+# -----------------------------
+# EQUATION OF STATE
+# -----------------------------
+def _surface_density(s, t):
+    """Density at atmospheric pressure (kg/m³)."""
+    rho_w = 999.842594 + t * (6.793952e-2 + t * (-9.095290e-3 + t * (1.001685e-4 + t * (-1.120083e-6 + t * 6.536332e-9))))
+    a = 0.824493 + t * (-4.0899e-3 + t * (7.6438e-5 + t * (-8.2467e-7 + t * 5.3875e-9)))
+    b = -5.72466e-3 + t * (1.0227e-4 - t * 1.6546e-6)
+    return rho_w + s * a + s * np.sqrt(s) * b + 4.8314e-4 * s * s
+
+
+def _secant_bulk_modulus(s, t, p):
+    """Secant bulk modulus (bar) at pressure ``p`` in bar."""
+    s15 = s * np.sqrt(s)
+    k_w = 19652.21 + t * (148.4206 + t * (-2.327105 + t * (1.360477e-2 - t * 5.155288e-5)))
+    a_w = 3.239908 + t * (1.43713e-3 + t * (1.16092e-4 - t * 5.77905e-7))
+    b_w = 8.50935e-5 + t * (-6.12293e-6 + t * 5.2787e-8)
+    k_0 = k_w + s * (54.6746 + t * (-0.603459 + t * (1.09987e-2 - t * 6.1670e-5))) + s15 * (7.944e-2 + t * (1.6483e-2 - t * 5.3009e-4))
+    a = a_w + s * (2.2838e-3 + t * (-1.0981e-5 - t * 1.6078e-6)) + 1.91075e-4 * s15
+    b = b_w + s * (-9.9348e-7 + t * (2.0816e-8 + t * 9.1697e-10))
+    return k_0 + p * (a + p * b)
+
+
+def density(salinity, temperature, pressure):
+    """In-situ seawater density (kg/m³) from practical salinity, °C and dbar."""
+    s, t = np.asarray(salinity, dtype=np.float64), np.asarray(temperature, dtype=np.float64)
+    p = np.asarray(pressure, dtype=np.float64) / 10.0  # dbar -> bar
+    return _surface_density(s, t) / (1.0 - p / _secant_bulk_modulus(s, t, p))
+
+
+def _lapse_rate(s, t, p):
+    """Adiabatic temperature gradient (°C/dbar), Bryden (1973)."""
+    ds = s - 35.0
+    return (((-2.1687e-16 * t + 1.8676e-14) * t - 4.6206e-13) * p
+            + ((2.7759e-12 * t - 1.1351e-10) * ds + ((-5.4481e-14 * t + 8.733e-12) * t - 6.7795e-10) * t + 1.8741e-8)) * p \
+        + (-4.2393e-8 * t + 1.8932e-6) * ds + ((6.6228e-10 * t - 6.836e-8) * t + 8.5258e-6) * t + 3.5803e-5
+
+
+def potential_temperature(salinity, temperature, pressure, reference=0.0):
+    """Potential temperature (°C) at ``reference`` dbar, by one Runge-Kutta step (Fofonoff 1977)."""
+    s, t = np.asarray(salinity, dtype=np.float64), np.asarray(temperature, dtype=np.float64)
+    p = np.asarray(pressure, dtype=np.float64)
+    h = reference - p
+    k = h * _lapse_rate(s, t, p)
+    t = t + 0.5 * k
+    q = k
+    p = p + 0.5 * h
+    k = h * _lapse_rate(s, t, p)
+    t = t + 0.29289322 * (k - q)
+    q = 0.58578644 * k + 0.121320344 * q
+    k = h * _lapse_rate(s, t, p)
+    t = t + 1.707106781 * (k - q)
+    q = 3.414213562 * k - 4.121320344 * q
+    p = p + 0.5 * h
+    k = h * _lapse_rate(s, t, p)
+    return t + (k - 2.0 * q) / 6.0
+
+
+def potential_density(salinity, temperature, pressure):
+    """Density (kg/m³) a parcel would have if moved adiabatically to the surface."""
+    theta = potential_temperature(salinity, temperature, pressure)
+    return density(salinity, theta, 0.0)
+
+
+# -----------------------------
+# PROFILE PRODUCTS
+# -----------------------------
+def _runs(keys):
+    """Start positions of equal-key runs in a sorted key array."""
+    return np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else np.empty(0, dtype=np.int64)
+
+
+def profile_layers(owner, pressure, temperature, sigma, profiles, threshold=0.03,
+                   reference_pressure=10.0, bin_size=20.0):
+    """Mixed-layer and thermocline depth of every profile.
+
+    ``owner`` is the profile id of each level; levels must be grouped by
+    profile and sorted by pressure within it. Returns two float64 arrays of
+    length ``profiles``, NaN where the layer is not resolved.
+    """
+    mld = np.full(profiles, np.nan)
+    thermocline = np.full(profiles, np.nan)
+    valid = ~(np.isnan(pressure) | np.isnan(temperature) | np.isnan(sigma))
+    owner, pressure, temperature, sigma = owner[valid], pressure[valid], temperature[valid], sigma[valid]
+    if not len(owner):
+        return mld, thermocline
+
+    # Mixed layer: first level below the reference whose density exceeds it by the threshold,
+    # interpolated linearly from the level above
+    starts = _runs(owner)
+    ids, seg = owner[starts], np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, len(owner)]))
+    index = np.arange(len(owner))
+    never = len(owner)
+    ref = np.minimum.reduceat(np.where(pressure >= reference_pressure, index, never), starts)
+    has_ref = ref < never
+    ref_sigma = np.where(has_ref, sigma[np.minimum(ref, never - 1)], np.nan)[seg]
+    target = ref_sigma + threshold
+    below = (sigma > target) & (index > np.where(has_ref, ref, never)[seg])
+    first = np.minimum.reduceat(np.where(below, index, never), starts)
+    found = first < never
+    hit = first[found]
+    above = hit - 1
+    frac = (target[hit] - sigma[above]) / (sigma[hit] - sigma[above])
+    mld[ids[found]] = pressure[above] + np.clip(frac, 0.0, 1.0) * (pressure[hit] - pressure[above])
+
+    # Thermocline: steepest temperature decrease between consecutive pressure bins of a profile
+    bins = (pressure // bin_size).astype(np.int64)
+    keys = owner.astype(np.int64) * (int(bins.max()) + 1) + bins
+    bin_starts = _runs(keys)
+    counts = np.diff(np.r_[bin_starts, len(keys)])
+    bin_owner = owner[bin_starts]
+    bin_p = np.add.reduceat(pressure, bin_starts) / counts
+    bin_t = np.add.reduceat(temperature, bin_starts) / counts
+    same = bin_owner[1:] == bin_owner[:-1]
+    gradient = np.where(same, -(bin_t[1:] - bin_t[:-1]) / (bin_p[1:] - bin_p[:-1]), -np.inf)
+    gradient = np.r_[gradient, -np.inf]  # pairs are indexed by their upper bin
+    middle = np.r_[(bin_p[1:] + bin_p[:-1]) / 2, np.nan]
+    owner_starts = _runs(bin_owner)
+    steepest = np.maximum.reduceat(gradient, owner_starts)
+    pair_seg = np.repeat(np.arange(len(owner_starts)), np.diff(np.r_[owner_starts, len(bin_owner)]))
+    pick = np.minimum.reduceat(np.where(gradient == steepest[pair_seg], np.arange(len(gradient)), len(gradient)), owner_starts)
+    resolved = np.isfinite(steepest) & (steepest > 0)
+    thermocline[bin_owner[owner_starts][resolved]] = middle[pick[resolved]]
+    return mld, thermocline
+
+
+def level_values(data, name, chunk_size=1 << 16):
+    """Per-level float32 array of a derived (or raw) variable over the level arrays of ``data``.
+
+    Levels are processed ``chunk_size`` at a time, small enough to stay in cache.
+    """
+    if name in data.levels:
+        return data[name]
+    if name not in LEVEL_VARIABLES:
+        raise KeyError(name)
+    n = len(data)
+    result = np.empty(n, dtype=np.float32)
+    s_all, t_all, p_all = data["salinity"], data["temperature"], data["pressure"]
+    for lo in range(0, n, chunk_size):
+        hi = min(lo + chunk_size, n)
+        s, t, p = s_all[lo:hi].astype(np.float64), t_all[lo:hi].astype(np.float64), p_all[lo:hi].astype(np.float64)
+        if name == "density":
+            result[lo:hi] = density(s, t, p)
+        elif name == "potential_temperature":
+            result[lo:hi] = potential_temperature(s, t, p)
+        else:
+            result[lo:hi] = potential_density(s, t, p)
+    return result
+
+
+def layer_depths(data):
+    """Mixed-layer and thermocline depth of every profile of ``data``, as ``{name: float64 array}``."""
+    owner = np.repeat(np.arange(data.profile_count), data.profiles["levels"].to_numpy())
+    pressure = data["pressure"]
+    sigma = level_values(data, "potential_density")
+    # Levels are kept in arrival order; sort by pressure within each profile only if needed
+    same = owner[1:] == owner[:-1]
+    order = slice(None)
+    if (np.diff(pressure)[same] < 0).any():
+        # Pack (profile, pressure in 1/16 dbar) into one integer key: one argsort instead of a lexsort
+        quantized = np.clip(np.nan_to_num(pressure * 16.0, nan=np.inf), 0, (1 << 20) - 1).astype(np.int64)
+        order = np.argsort((owner.astype(np.int64) << 20) | quantized, kind="stable")
+    mld, thermocline = profile_layers(
+        owner[order], pressure[order].astype(np.float64), data["temperature"][order].astype(np.float64),
+        sigma[order].astype(np.float64), data.profile_count,
+    )
+    return {"mixed_layer_depth": mld, "thermocline_depth": thermocline}
+
+
+# -----------------------------
+# CACHE
+# -----------------------------
+class DerivedVariables:
+    """Per-profile derived variables of one ``ProfileData`` (or ``StoreProfiles``), kept for its lifetime."""
+
+    def __init__(self, data, profile_values=None):
+        self.data = data
+        # name -> array aligned with data.profiles; computed from the levels on first use when not given
+        self._profiles = dict(profile_values or {})
+        self._levels = {}  # level variable -> float32 array over every level, resident data only
+        self._lock = threading.Lock()
+
+    def take(self, profile_ids, columns):
+        """``data.take`` whose ``columns`` may also name level variables.
+
+        Over resident data a level variable is computed once over every level
+        and gathered from; over a store it is computed from the levels read
+        for these profiles.
+        """
+        derived = [col for col in columns if col in LEVEL_VARIABLES]
+        raw = [col for col in columns if col not in LEVEL_VARIABLES]
+        if not derived:
+            return self.data.take(profile_ids, raw)
+        if not self.data.levels:
+            selected = self.data.take(profile_ids, list(dict.fromkeys([*raw, *LEVEL_COLUMNS])))
+            for name in derived:
+                selected.levels[name] = level_values(selected, name)
+            return selected
+        selected = self.data.take(profile_ids, raw)
+        positions = csr_positions(self.data.offsets, profile_ids)
+        for name in derived:
+            if name not in self._levels:
+                with self._lock:
+                    if name not in self._levels:
+                        self._levels[name] = level_values(self.data, name)
+            selected.levels[name] = self._levels[name][positions]
+        return selected
+
+    def insert(self, data, slots, profile_values=None):
+        """Variables of ``data``: this one's profiles plus new ones inserted at ``slots`` (see ``insert_slots``).
+
+        Whatever is already computed is carried over; only the inserted
+        profiles' values are computed and put in at their place.
+        """
+        derived = DerivedVariables(data, profile_values)
+        carry_profiles = profile_values is None and bool(self._profiles)
+        if not (carry_profiles or self._levels):
+            return derived
+        new = data.take(inserted_ids(slots), LEVEL_COLUMNS)
+        if carry_profiles:
+            added = layer_depths(new)
+            derived._profiles = {name: np.insert(values, slots, added[name]) for name, values in self._profiles.items()}
+        if self._levels:
+            level_slots = np.repeat(self.data.offsets[slots], new.profiles["levels"].to_numpy())
+            derived._levels = {name: np.insert(values, level_slots, level_values(new, name))
+                               for name, values in self._levels.items()}
+        return derived
+
+    def profile_values(self, name):
+        """Per-profile array (mixed-layer or thermocline depth), aligned with ``data.profiles``."""
+        if name not in PROFILE_VARIABLES:
+            raise KeyError(name)
+        if name not in self._profiles:
+            with self._lock:
+                if name not in self._profiles:
+                    self._profiles.update(layer_depths(self.data))
+        return self._profiles[name]
+
+    def profile_frame(self):
+        """Profile table with the per-profile variables as extra columns."""
+        frame = self.data.profiles.copy()
+        for name in PROFILE_VARIABLES:
+            frame[name] = self.profile_values(name)
+        return frame
+
+    def memory_usage(self):
+        return sum(a.nbytes for a in [*self._profiles.values(), *self._levels.values()])
@@ -0,0 +1,137 @@
+"""Streaming export of measurements as CSV, NDJSON or Parquet.
+
+The selection is written chunk by chunk into a spooled temporary file (kept in
+memory up to ``max_memory`` bytes, then moved to disk), optionally through a
+gzip or zstd compressor, so memory stays bounded by the chunk size rather than
+by the size of the export.
+"""
+import gzip
+import io
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+
+# format -> (file extension, MIME type)
+EXPORT_FORMATS = {
+    "csv": ("csv", "text/csv"),
+    "ndjson": ("ndjson", "application/x-ndjson"),
+    "parquet": ("parquet", "application/vnd.apache.parquet"),
+}
+COMPRESSIONS = {None: "", "gzip": ".gz", "zstd": ".zst"}
+
+
+def iter_frames(source, float_id=None, chunk_rows=200_000):
+    """Yield the selection as DataFrame chunks of roughly ``chunk_rows`` rows.
+
+    ``source`` is profile data (a ``ProfileData``, whose chunks are built
+    from array slices, or a ``StoreProfiles``, read from the store a few
+    floats at a time) or a plain measurement DataFrame.
+    """
+    if not isinstance(source, pd.DataFrame):
+        for part in source.chunks(float_id=float_id, chunk_levels=chunk_rows):
+            yield part.frame()
+        return
+    if float_id is not None:
+        source = source[source["float_id"] == float_id]
+    for start in range(0, len(source), chunk_rows):
+        yield source.iloc[start:start + chunk_rows]
+
+
+def available_compressions():
+    """Compressions usable in this environment (zstd needs the optional zstandard package)."""
+    try:
+        import zstandard  # noqa: F401
+    except ImportError:
+        return [c for c in COMPRESSIONS if c != "zstd"]
+    return list(COMPRESSIONS)
+
+
+def _empty_frame(source):
+    if not isinstance(source, pd.DataFrame):
+        return source.take(np.empty(0, dtype=np.int64)).frame()
+    return source.iloc[:0]
+
+
+def _compressor(fileobj, compression):
+    if compression is None:
+        return fileobj
+    if compression == "gzip":
+        return gzip.GzipFile(fileobj=fileobj, mode="wb", compresslevel=6)
+    if compression == "zstd":
+        try:
+            import zstandard
+        except ImportError as exc:
+            raise ImportError("zstd export requires zstandard (pip install zstandard)") from exc
+        return zstandard.ZstdCompressor().stream_writer(fileobj, closefd=False)
+    raise ValueError(f"Unknown compression: {compression!r}")
+
+
+def plain_frame(chunk):
+    """Export-friendly chunk: integer float IDs instead of categorical codes."""
+    if "float_id" in chunk and isinstance(chunk["float_id"].dtype, pd.CategoricalDtype):
+        chunk = chunk.assign(float_id=np.asarray(chunk["float_id"], dtype=np.int64))
+    return chunk
+
+
+def export_data(source, fmt="csv", compression=None, float_id=None, chunk_rows=200_000, max_memory=32 << 20):
+    """Write the selection to a spooled temporary file and return it rewound.
+
+    For Parquet, ``compression`` selects the column codec inside the file
+    rather than wrapping the whole file.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {fmt!r}")
+    spool = tempfile.SpooledTemporaryFile(max_size=max_memory)
+    chunks = (plain_frame(chunk) for chunk in iter_frames(source, float_id, chunk_rows))
+
+    if fmt == "parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        writer = None
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(spool, table.schema, compression=compression or "snappy")
+            writer.write_table(table)
+        if writer is None:
+            # An empty selection is still a valid Parquet file with the selection's schema
+            table = pa.Table.from_pandas(plain_frame(_empty_frame(source)), preserve_index=False)
+            writer = pq.ParquetWriter(spool, table.schema, compression=compression or "snappy")
+            writer.write_table(table)
+        writer.close()
+    else:
+        stream = _compressor(spool, compression)
+        text = io.TextIOWrapper(stream, encoding="utf-8", newline="")
+        for i, chunk in enumerate(chunks):
+            if fmt == "csv":
+                chunk.to_csv(text, header=i == 0, index=False)
+            else:
+                chunk.to_json(text, orient="records", lines=True, date_format="iso")
+        text.flush()
+        text.detach()
+        if stream is not spool:
+            stream.close()
+
+    spool.seek(0)
+    return spool
+
+
+def export_bytes(source, fmt="csv", compression=None, float_id=None, chunk_rows=200_000):
+    """The export as bytes, for consumers that buffer the payload anyway (e.g. ``st.download_button``)."""
+    with export_data(source, fmt, compression, float_id, chunk_rows) as spool:
+        return spool.read()
+
+
+def export_filename(stem, fmt, compression=None):
+    extension, _ = EXPORT_FORMATS[fmt]
+    return f"{stem}.{extension}" + ("" if fmt == "parquet" else COMPRESSIONS[compression])
+
+
+def export_mime(fmt, compression=None):
+    if compression == "gzip" and fmt != "parquet":
+        return "application/gzip"
+    if compression == "zstd" and fmt != "parquet":
+        return "application/zstd"
+    return EXPORT_FORMATS[fmt][1]
@@ -0,0 +1,203 @@
+"""Spatio-temporal index over profiles.
+
+``ProfileIndex`` groups measurement rows into profiles once and keeps:
+
+* a CSR layout (``order``/``offsets``) mapping each profile to its row positions,
+* profile start times sorted for ``searchsorted`` date-range lookups,
+* profiles bucketed into a regular lat/lon grid for bounding-box and radius lookups.
+
+Queries touch only the candidate profiles of the matching time range or grid
+cells, so their cost scales with the result rather than with the dataset.
+"""
+import copy
+
+import numpy as np
+import pandas as pd
+
+from .profiles import csr_positions, float_ranges, group_profiles, inserted_ids
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def _as_datetime(value):
+    return None if value is None else np.datetime64(pd.Timestamp(value).to_datetime64(), "s")
+
+
+class ProfileIndex:
+    """Profile table plus time and lat/lon grid indexes over a measurement frame."""
+
+    def __init__(self, profiles, offsets, order=None, cell_degrees=1.0):
+        self.cell_degrees = cell_degrees
+        # CSR: rows of profile p are order[offsets[p]:offsets[p + 1]] (identity order if None)
+        self.profiles = profiles
+        self.offsets = offsets
+        self.order = order
+        self._lat = profiles["latitude"].to_numpy()
+        self._lon = profiles["longitude"].to_numpy()
+        self._time = profiles["time"].to_numpy()
+        self.float_ranges = float_ranges(profiles)
+
+        # Time index
+        self._time_order = np.argsort(self._time, kind="stable")
+        self._time_sorted = self._time[self._time_order]
+
+        # Grid index: cell = lat_row * n_cols + lon_col, profiles sorted by cell
+        self._n_rows = int(np.ceil(180 / cell_degrees))
+        self._n_cols = int(np.ceil(360 / cell_degrees))
+        cells = self._cell_row(self._lat) * self._n_cols + self._cell_col(self._lon)
+        self._cell_order = np.argsort(cells, kind="stable")
+        self._cells_sorted = cells[self._cell_order]
+
+    @classmethod
+    def from_frame(cls, df, cell_degrees=1.0):
+        """Index the rows of a measurement frame."""
+        profiles, order, offsets = group_profiles(df)
+        return cls(profiles, offsets, order, cell_degrees=cell_degrees)
+
+    @classmethod
+    def from_profiles(cls, data, cell_degrees=1.0):
+        """Index a ``ProfileData``; row positions then address its level arrays."""
+        return cls(data.profiles, data.offsets, cell_degrees=cell_degrees)
+
+    def insert(self, profiles, offsets, slots):
+        """Index of ``profiles``: this index's table with new rows inserted at ``slots`` (see ``insert_slots``).
+
+        The time and grid orders are merged with the new profiles' instead of
+        being sorted again; existing profiles only have their ids shifted.
+        """
+        slots = np.asarray(slots, dtype=np.int64)
+        index = copy.copy(self)  # same grid
+        index.profiles, index.offsets, index.order = profiles, offsets, None
+        index._lat = profiles["latitude"].to_numpy()
+        index._lon = profiles["longitude"].to_numpy()
+        index._time = profiles["time"].to_numpy()
+        index.float_ranges = float_ranges(profiles)
+
+        new_ids = inserted_ids(slots)
+        moved = np.arange(len(self.profiles)) + np.searchsorted(slots, np.arange(len(self.profiles)), side="right")
+        new_cells = index._cell_row(index._lat[new_ids]) * index._n_cols + index._cell_col(index._lon[new_ids])
+        index._time_sorted, index._time_order = _merge_sorted(
+            self._time_sorted, moved[self._time_order], index._time[new_ids], new_ids)
+        index._cells_sorted, index._cell_order = _merge_sorted(
+            self._cells_sorted, moved[self._cell_order], new_cells, new_ids)
+        return index
+
+    def __len__(self):
+        return len(self.profiles)
+
+    def _cell_row(self, lat):
+        return np.clip(((np.asarray(lat) + 90) // self.cell_degrees).astype(np.int64), 0, self._n_rows - 1)
+
+    def _cell_col(self, lon):
+        wrapped = (np.asarray(lon) + 180) % 360
+        return np.clip((wrapped // self.cell_degrees).astype(np.int64), 0, self._n_cols - 1)
+
+    # -----------------------------
+    # CANDIDATE LOOKUPS
+    # -----------------------------
+    def _time_candidates(self, start, end):
+        lo = 0 if start is None else np.searchsorted(self._time_sorted, start, side="left")
+        hi = len(self._time_sorted) if end is None else np.searchsorted(self._time_sorted, end, side="left")
+        return self._time_order[lo:hi]
+
+    def _box_candidates(self, lat, lon):
+        lat_min, lat_max = lat if lat is not None else (-90.0, 90.0)
+        rows = np.arange(self._cell_row(lat_min), self._cell_row(lat_max) + 1)
+        if lon is None:
+            col_ranges = [(0, self._n_cols - 1)]
+        else:
+            lo, hi = int(self._cell_col(lon[0])), int(self._cell_col(lon[1]))
+            if (lon[1] - lon[0]) >= 360:
+                col_ranges = [(0, self._n_cols - 1)]
+            elif lo <= hi:
+                col_ranges = [(lo, hi)]
+            else:  # box crosses the antimeridian
+                col_ranges = [(lo, self._n_cols - 1), (0, hi)]
+        starts, ends = [], []
+        for col_lo, col_hi in col_ranges:
+            starts.append(np.searchsorted(self._cells_sorted, rows * self._n_cols + col_lo, side="left"))
+            ends.append(np.searchsorted(self._cells_sorted, rows * self._n_cols + col_hi, side="right"))
+        starts, ends = np.concatenate(starts), np.concatenate(ends)
+        if not len(starts):
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([self._cell_order[s:e] for s, e in zip(starts, ends)])
+
+    # -----------------------------
+    # QUERY API
+    # -----------------------------
+    def query(self, lat=None, lon=None, start=None, end=None, center=None, radius_km=None, float_ids=None):
+        """Return sorted ids of profiles matching every given filter.
+
+        ``lat``/``lon`` are inclusive ``(min, max)`` ranges (``lon`` may wrap the
+        antimeridian, e.g. ``(170, -170)``), ``start``/``end`` a half-open time
+        range on profile start time, and ``center``/``radius_km`` a great-circle
+        radius around ``(lat, lon)``.
+        """
+        start, end = _as_datetime(start), _as_datetime(end)
+        if center is not None and radius_km is not None:
+            dlat = np.degrees(radius_km / EARTH_RADIUS_KM)
+            lat = (max(center[0] - dlat, -90.0), min(center[0] + dlat, 90.0))
+            cos_lat = max(np.cos(np.radians(max(abs(lat[0]), abs(lat[1])))), 1e-6)
+            dlon = np.degrees(radius_km / (EARTH_RADIUS_KM * cos_lat))
+            lon = None if dlon >= 180 else (_wrap(center[1] - dlon), _wrap(center[1] + dlon))
+
+        spatial = lat is not None or lon is not None
+        if spatial:
+            ids = self._box_candidates(lat, lon)
+            if start is not None:
+                ids = ids[self._time[ids] >= start]
+            if end is not None:
+                ids = ids[self._time[ids] < end]
+        elif start is not None or end is not None:
+            ids = self._time_candidates(start, end)
+        elif float_ids is not None:
+            # Profiles are sorted by float, so each float is one contiguous id range
+            ranges = [self.float_ranges.get(int(fid), (0, 0)) for fid in float_ids]
+            ids = np.concatenate([np.arange(a, b) for a, b in ranges] or [np.empty(0, dtype=np.int64)])
+            return np.sort(ids)
+        else:
+            ids = np.arange(len(self.profiles))
+
+        if spatial and len(ids):
+            plat, plon = self._lat[ids], self._lon[ids]
+            keep = np.ones(len(ids), dtype=bool)
+            if lat is not None:
+                keep &= (plat >= lat[0]) & (plat <= lat[1])
+            if lon is not None:
+                keep &= (plon >= lon[0]) & (plon <= lon[1]) if lon[0] <= lon[1] else (plon >= lon[0]) | (plon <= lon[1])
+            if center is not None and radius_km is not None:
+                keep &= haversine_km(center[0], center[1], plat, plon) <= radius_km
+            ids = ids[keep]
+        if float_ids is not None and len(ids):
+            keep = np.zeros(len(ids), dtype=bool)
+            for fid in float_ids:
+                first, stop = self.float_ranges.get(int(fid), (0, 0))
+                keep |= (ids >= first) & (ids < stop)
+            ids = ids[keep]
+        return np.sort(ids)
+
+    def rows(self, profile_ids):
+        """Row positions (into the indexed frame) of the given profiles."""
+        positions = csr_positions(self.offsets, profile_ids)
+        return positions if self.order is None else np.sort(self.order[positions])
+
+    def select(self, df, **query):
+        """Rows of the indexed ``df`` belonging to the profiles matched by ``query``."""
+        return df.iloc[self.rows(self.query(**query))]
+
+
+def _merge_sorted(sorted_keys, order, keys, ids):
+    """Sorted keys and their ids with ``keys``/``ids`` merged in (after equal keys, like a stable sort)."""
+    new_order = np.argsort(keys, kind="stable")
+    at = np.searchsorted(sorted_keys, keys[new_order], side="right")
+    return np.insert(sorted_keys, at, keys[new_order]), np.insert(order, at, ids[new_order])
+
+
+def _wrap(lon):
+    return (lon + 180) % 360 - 180
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
@@ -0,0 +1,207 @@
+"""Batch ingestion of Argo GDAC profile NetCDF files into an ArgoStore.
+
+Files are decoded in a process pool and streamed back as they finish, with a
+bounded number of files in flight and a bounded row buffer before each write.
+The files of a batch are recorded in the store manifest line that commits the
+batch, so an interrupted run resumes where it stopped without writing any row
+twice. Values whose Argo QC flag is 4 (bad data) are dropped while decoding.
+
+Usage:
+    python -m floatchat.ingest /data/argo/dac /data/argo-store --workers 8
+"""
+import argparse
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+
+from .schema import cast, validate
+from .store import ARGO_COLUMNS, ArgoStore
+
+PROGRESS_FILE = "_ingested.txt"  # progress log of stores ingested before the manifest recorded sources
+ARGO_EPOCH = np.datetime64("1950-01-01T00:00:00", "s")
+BAD_QC = b"4"  # Argo QC flag: bad data
+
+
+def _netcdf4():
+    try:
+        import netCDF4
+    except ImportError as exc:
+        raise ImportError("NetCDF ingestion requires netCDF4 (pip install netCDF4)") from exc
+    return netCDF4
+
+
+def find_profile_files(root, suffix=".nc"):
+    """Yield profile files below ``root`` in a stable (sorted) order."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name.endswith(suffix):
+                yield os.path.join(dirpath, name)
+
+
+def _values(nc, name):
+    """Float array of a variable with missing values as NaN and values flagged bad (QC 4) as NaN."""
+    values = np.ma.filled(np.ma.asarray(nc.variables[name][:], dtype=np.float64), np.nan)
+    qc_name = f"{name}_QC"
+    if qc_name in nc.variables:
+        flags = np.ma.filled(nc.variables[qc_name][:], b" ")
+        values[np.asarray(flags).astype(bytes).reshape(values.shape) == BAD_QC] = np.nan
+    return values
+
+
+def _measurement(nc, name):
+    """Return a (N_PROF, N_LEVELS) float array, preferring adjusted values where present.
+
+    Where an adjusted value exists its own QC flag decides, so an adjusted
+    value flagged bad does not fall back to the raw one.
+    """
+    raw = _values(nc, name)
+    adjusted_name = f"{name}_ADJUSTED"
+    if adjusted_name in nc.variables:
+        present = ~np.ma.getmaskarray(np.ma.asarray(nc.variables[adjusted_name][:]))
+        raw = np.where(present, _values(nc, adjusted_name), raw)
+    return raw
+
+
+def read_profile_file(path):
+    """Decode one Argo profile NetCDF file into the app's measurement schema."""
+    netCDF4 = _netcdf4()
+    with netCDF4.Dataset(path) as nc:
+        nc.set_auto_mask(True)
+        platform = netCDF4.chartostring(nc.variables["PLATFORM_NUMBER"][:])
+        float_id = np.array([int(str(p).strip() or 0) for p in np.atleast_1d(platform)], dtype=np.int64)
+        cycle = np.ma.filled(nc.variables["CYCLE_NUMBER"][:], 0).astype(np.int32)
+        # Descending profiles ("D" files) share the cycle number of the ascending one
+        descending = np.zeros(len(cycle), dtype=bool)
+        if "DIRECTION" in nc.variables:
+            descending = np.atleast_1d(np.ma.filled(nc.variables["DIRECTION"][:], b"A")).astype(bytes) == b"D"
+        lat = np.ma.filled(np.ma.asarray(nc.variables["LATITUDE"][:], dtype=np.float64), np.nan)
+        lon = np.ma.filled(np.ma.asarray(nc.variables["LONGITUDE"][:], dtype=np.float64), np.nan)
+        juld = _values(nc, "JULD")
+        if "POSITION_QC" in nc.variables:
+            bad = np.asarray(np.ma.filled(nc.variables["POSITION_QC"][:], b" ")).astype(bytes).reshape(lat.shape) == BAD_QC
+            lat[bad] = np.nan
+        pressure = _measurement(nc, "PRES")
+        temperature = _measurement(nc, "TEMP")
+        salinity = _measurement(nc, "PSAL") if "PSAL" in nc.variables else np.full_like(pressure, np.nan)
+
+    # Flatten the (profile, level) grid and keep levels with a pressure and a valid position/time
+    n_prof, n_levels = pressure.shape
+    prof = np.repeat(np.arange(n_prof), n_levels)
+    keep = ~np.isnan(pressure.ravel()) & ~np.isnan(juld[prof]) & ~np.isnan(lat[prof]) & (float_id[prof] > 0)
+    prof = prof[keep]
+    seconds = np.round(juld[prof] * 86400).astype(np.int64)
+    return cast(pd.DataFrame({
+        "float_id": float_id[prof],
+        "profile_index": cycle[prof],
+        "descending": descending[prof],
+        "latitude": lat[prof],
+        "longitude": lon[prof],
+        "time": ARGO_EPOCH + seconds.astype("timedelta64[s]"),
+        "pressure": pressure.ravel()[keep].astype(np.float32),
+        "temperature": temperature.ravel()[keep].astype(np.float32),
+        "salinity": salinity.ravel()[keep].astype(np.float32),
+    }, columns=ARGO_COLUMNS))
+
+
+def _read_safely(path):
+    try:
+        return path, read_profile_file(path), None
+    except Exception as exc:  # a corrupt file must not abort the whole run
+        return path, None, f"{type(exc).__name__}: {exc}"
+
+
+def iter_profile_frames(paths, workers=None, max_pending=None):
+    """Decode ``paths`` across a process pool, yielding ``(path, frame, error)`` as files finish.
+
+    At most ``max_pending`` files are in flight at once, so memory stays bounded
+    regardless of how many paths are supplied.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or workers * 4
+    paths = iter(paths)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+        for path in paths:
+            pending.add(pool.submit(_read_safely, path))
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        for future in pending:
+            yield future.result()
+
+
+def load_progress(store):
+    """Source files already in ``store``: those committed with a batch, plus any legacy progress log."""
+    done = store.sources()
+    path = os.path.join(store.root, PROGRESS_FILE)
+    if os.path.exists(path):
+        with open(path) as fh:
+            done.update(line.rstrip("\n") for line in fh if line.strip())
+    return done
+
+
+def ingest_directory(source, store, workers=None, batch_rows=1_000_000, log=print):
+    """Ingest every profile file below ``source`` that is not yet recorded in ``store``.
+
+    Returns a dict with the number of files ingested, skipped and failed, the rows written and
+    the values outside the valid ranges (written as missing, or dropped with their row for
+    impossible positions).
+    """
+    if not isinstance(store, ArgoStore):
+        store = ArgoStore(store)
+    os.makedirs(store.root, exist_ok=True)
+    done = load_progress(store)
+    todo = (path for path in find_profile_files(source) if path not in done)
+    stats = {"files": 0, "skipped": len(done), "failed": 0, "rows": 0, "invalid": 0}
+
+    buffer, buffered_paths, buffered_rows = [], [], 0
+
+    def flush():
+        nonlocal buffer, buffered_paths, buffered_rows
+        batch = pd.concat(buffer, ignore_index=True).sort_values(["float_id", "time", "pressure"])
+        invalid = {col: count for col, count in validate(batch).items() if count}
+        if invalid:
+            stats["invalid"] += sum(invalid.values())
+            if log:
+                log("out of range: " + ", ".join(f"{col} {count:,}" for col, count in invalid.items()))
+        # The paths are committed in the same manifest line as their rows
+        stats["rows"] += store.append(batch, sources=buffered_paths)
+        stats["files"] += len(buffered_paths)
+        buffer, buffered_paths, buffered_rows = [], [], 0
+        if log:
+            log(f"ingested {stats['files']} files, {stats['rows']:,} rows")
+
+    for path, frame, error in iter_profile_frames(todo, workers=workers):
+        if error:
+            stats["failed"] += 1
+            if log:
+                log(f"skipping {path}: {error}")
+            continue
+        buffer.append(frame)
+        buffered_paths.append(path)
+        buffered_rows += len(frame)
+        if buffered_rows >= batch_rows:
+            flush()
+    if buffered_paths:
+        flush()
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingest Argo profile NetCDF files into a FloatChat store")
+    parser.add_argument("source", help="directory tree of Argo profile .nc files")
+    parser.add_argument("store", help="destination store directory")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--batch-rows", type=int, default=1_000_000, help="rows buffered per store write")
+    args = parser.parse_args(argv)
+    stats = ingest_directory(args.source, args.store, workers=args.workers, batch_rows=args.batch_rows)
+    print(f"done: {stats['files']} files, {stats['rows']:,} rows, "
+          f"{stats['skipped']} already ingested, {stats['failed']} failed, {stats['invalid']:,} values out of range")
+
+
+if __name__ == "__main__":
+    main()
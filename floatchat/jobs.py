@@ -0,0 +1,111 @@
+"""Background execution of chatbot questions.
+
+Questions run on an executor shared by the whole server process, so a slow
+answer no longer blocks the rerun that asked it. Each session keeps its own
+``ChatJobs`` (in its session state) with handles on the questions it has in
+flight: asking a new question cancels the stale ones, and a per-session limit
+stops one session from filling the shared pool.
+
+A thread pool is used rather than processes: the query engine reads the
+shared snapshot in place, and its NumPy reductions release the GIL. A job
+that has already started cannot be interrupted, so cancelling it only
+discards its result, but it still counts against the session's limit until
+it finishes.
+"""
+import itertools
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+
+_job_ids = itertools.count(1)
+
+
+def make_executor(workers=None):
+    """Executor shared by all sessions."""
+    return ThreadPoolExecutor(max_workers=workers or min(8, os.cpu_count() or 1), thread_name_prefix="floatchat-chat")
+
+
+@dataclass
+class Job:
+    question: str
+    future: Future
+    id: int = field(default_factory=lambda: next(_job_ids))
+    cancelled: bool = False
+    elapsed: float = None  # seconds spent computing the answer
+
+    def cancel(self):
+        """Cancel the job unless it has already finished; returns whether it was cancelled."""
+        if self.future.done():
+            return False
+        self.cancelled = True
+        self.future.cancel()
+        return True
+
+
+class ChatJobs:
+    """One session's handles on questions running in a shared executor."""
+
+    def __init__(self, executor, limit=2):
+        self.executor = executor
+        self.limit = limit  # jobs of this session that may occupy the pool at once
+        self.jobs = {}  # job id -> Job, until its result has been collected
+
+    @property
+    def pending(self):
+        return [job for job in self.jobs.values() if not job.cancelled and not job.future.done()]
+
+    def running(self):
+        return [job for job in self.jobs.values() if not job.future.done()]
+
+    def busy(self):
+        """Jobs occupying a worker that cancelling cannot free: started ones, and cancelled ones still running."""
+        return [job for job in self.running() if job.cancelled or job.future.running()]
+
+    def submit(self, question, func, *args):
+        """Start ``func(*args)`` and cancel the stale questions.
+
+        Returns ``(job, cancelled)``. When the session is at its limit nothing
+        is cancelled and ``job`` is ``None``, so the earlier questions keep
+        their answers.
+        """
+        if len(self.busy()) >= self.limit:
+            return None, []
+        cancelled = self.cancel()
+        job = Job(question, None)
+        job.future = self.executor.submit(self._run, job, func, *args)
+        self.jobs[job.id] = job
+        return job, cancelled
+
+    @staticmethod
+    def _run(job, func, *args):
+        start = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            job.elapsed = time.perf_counter() - start
+
+    def cancel(self):
+        """Cancel every pending job; returns the ones actually cancelled (not already finished)."""
+        return [job for job in self.pending if job.cancel()]
+
+    def wait(self, timeout):
+        """Block for up to ``timeout`` seconds until a pending job finishes."""
+        pending = [job.future for job in self.pending]
+        if pending:
+            wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+
+    def finished(self):
+        """Collect finished jobs as ``(job, result, error)``; cancelled jobs are reported once they stop."""
+        done = []
+        for job_id, job in list(self.jobs.items()):
+            if not job.future.done():
+                continue
+            del self.jobs[job_id]
+            if job.cancelled or job.future.cancelled():
+                done.append((job, None, None))
+            elif job.future.exception() is not None:
+                done.append((job, None, job.future.exception()))
+            else:
+                done.append((job, job.future.result(), None))
+        return done
@@ -0,0 +1,226 @@
+"""Server-side map layers: binned profile positions and simplified float tracks.
+
+The map never receives one marker per profile. Below ``TRACK_ZOOM`` profile
+positions are aggregated into hexagonal (or square) bins whose size follows
+the zoom level; from ``TRACK_ZOOM`` on, each float's positions in the viewport
+become a track simplified with Douglas–Peucker to about a pixel at that zoom.
+Both are computed with array operations over the profile table: hex bins by
+rounding axial coordinates, and Douglas–Peucker for all tracks at once, one
+split per segment per iteration.
+
+``MapLayers`` caches results per zoom level and viewport; viewports are
+snapped outward to the bin grid so that small pans hit the cache, and an
+append keeps the entries of viewports it added nothing to.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+TRACK_ZOOM = 4  # zoom level from which float tracks replace bins
+SQRT3 = np.sqrt(3.0)
+
+
+def cell_degrees(zoom):
+    """Bin width in degrees at a map zoom level (45° at zoom 0, halving per level)."""
+    return 360.0 / 2 ** (int(zoom) + 3)
+
+
+def pixel_degrees(zoom):
+    """Degrees of longitude covered by one 256-pixel-tile pixel at ``zoom``."""
+    return 360.0 / (256 * 2 ** int(zoom))
+
+
+def in_viewport(lat, lon, viewport):
+    """Mask of positions inside ``(lat_min, lat_max, lon_min, lon_max)``; ``lon_min > lon_max`` wraps the antimeridian."""
+    if viewport is None:
+        return np.ones(len(lat), dtype=bool)
+    lat_min, lat_max, lon_min, lon_max = viewport
+    mask = (lat >= lat_min) & (lat <= lat_max)
+    if lon_min <= lon_max:
+        return mask & (lon >= lon_min) & (lon <= lon_max)
+    return mask & ((lon >= lon_min) | (lon <= lon_max))
+
+
+# -----------------------------
+# BINS
+# -----------------------------
+def _hex_cells(lat, lon, cell):
+    """Axial ``(q, r)`` of the pointy-top hexagon (``cell`` degrees wide) holding each position, and its center."""
+    size = cell / SQRT3
+    q = (SQRT3 / 3 * lon - lat / 3) / size
+    r = (2 / 3 * lat) / size
+    # Cube rounding: round all three coordinates and fix the one with the largest error
+    x, z = q, r
+    y = -x - z
+    rx, ry, rz = np.round(x), np.round(y), np.round(z)
+    dx, dy, dz = np.abs(rx - x), np.abs(ry - y), np.abs(rz - z)
+    fix_x = (dx > dy) & (dx > dz)
+    fix_z = ~fix_x & (dz >= dy)
+    rx = np.where(fix_x, -ry - rz, rx)
+    rz = np.where(fix_z, -rx - ry, rz)
+    q, r = rx.astype(np.int64), rz.astype(np.int64)
+    return q, r, size * 1.5 * r, size * SQRT3 * (q + r / 2)
+
+
+def _square_cells(lat, lon, cell):
+    i = np.floor((lat + 90.0) / cell).astype(np.int64)
+    j = np.floor((lon + 180.0) / cell).astype(np.int64)
+    return i, j, (i + 0.5) * cell - 90.0, (j + 0.5) * cell - 180.0
+
+
+def grid_bins(profiles, cell, viewport=None, kind="hex"):
+    """Profile and float counts per bin, as a frame of bin centers ``latitude``/``longitude``, ``profiles``, ``floats``."""
+    lat = profiles["latitude"].to_numpy(dtype=np.float64)
+    lon = profiles["longitude"].to_numpy(dtype=np.float64)
+    float_ids = profiles["float_id"].to_numpy(dtype=np.int64)
+    keep = in_viewport(lat, lon, viewport) & ~(np.isnan(lat) | np.isnan(lon))
+    lat, lon, float_ids = lat[keep], lon[keep], float_ids[keep]
+    columns = ["latitude", "longitude", "profiles", "floats"]
+    if not len(lat):
+        return pd.DataFrame(columns=columns)
+
+    a, b, center_lat, center_lon = (_hex_cells if kind == "hex" else _square_cells)(lat, lon, cell)
+    keys = ((a + (1 << 20)) << 21) | (b + (1 << 20))
+    cells, first, inverse, counts = np.unique(keys, return_index=True, return_inverse=True, return_counts=True)
+    # Distinct floats per bin: distinct (bin, float) pairs counted per bin
+    pairs = np.sort(inverse.astype(np.int64) * (float_ids.max() + 1) + float_ids)
+    pairs = pairs[np.r_[True, pairs[1:] != pairs[:-1]]]
+    floats = np.bincount(pairs // (float_ids.max() + 1), minlength=len(cells))
+    return pd.DataFrame({
+        "latitude": np.clip(center_lat[first], -90.0, 90.0),
+        "longitude": center_lon[first],
+        "profiles": counts,
+        "floats": floats,
+    }, columns=columns)
+
+
+# -----------------------------
+# TRACKS
+# -----------------------------
+def simplify_tracks(x, y, track, tolerance):
+    """Douglas–Peucker keep-mask for many polylines at once.
+
+    Points must be grouped by ``track`` (in drawing order). Each iteration
+    finds, for every segment between two kept points, the point farthest from
+    it and keeps it if it is farther than ``tolerance``.
+    """
+    n = len(x)
+    keep = np.zeros(n, dtype=bool)
+    if not n:
+        return keep
+    boundaries = np.flatnonzero(np.r_[True, track[1:] != track[:-1]])
+    keep[boundaries] = True
+    keep[np.r_[boundaries[1:] - 1, n - 1]] = True
+    index = np.arange(n)
+    while True:
+        kept = np.flatnonzero(keep)
+        free = index[~keep]
+        if not len(free):
+            break
+        seg = np.searchsorted(kept, free) - 1  # kept point before each free point
+        a, b = kept[seg], kept[seg + 1]
+        dx, dy = x[b] - x[a], y[b] - y[a]
+        px, py = x[free] - x[a], y[free] - y[a]
+        length = np.hypot(dx, dy)
+        distance = np.where(length > 0, np.abs(dx * py - dy * px) / np.where(length > 0, length, 1.0), np.hypot(px, py))
+        starts = np.flatnonzero(np.r_[True, seg[1:] != seg[:-1]])
+        farthest = np.maximum.reduceat(distance, starts)
+        split = farthest > tolerance
+        if not split.any():
+            break
+        run = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, len(free)]))
+        first_max = np.minimum.reduceat(np.where(distance == farthest[run], np.arange(len(free)), len(free)), starts)
+        keep[free[first_max[split]]] = True
+    return keep
+
+
+def float_tracks(profiles, tolerance, viewport=None):
+    """Simplified track of every float with profiles in the viewport.
+
+    Returns a frame of ``float_id``, ``time``, ``latitude``, ``longitude`` in
+    drawing order, plus ``points`` (the unsimplified count per float).
+    """
+    lat = profiles["latitude"].to_numpy(dtype=np.float64)
+    lon = profiles["longitude"].to_numpy(dtype=np.float64)
+    keep = in_viewport(lat, lon, viewport) & ~(np.isnan(lat) | np.isnan(lon))
+    float_ids = profiles["float_id"].to_numpy(dtype=np.int64)[keep]
+    times = profiles["time"].to_numpy()[keep]
+    order = np.lexsort((times, float_ids))
+    float_ids, times = float_ids[order], times[order]
+    lat, lon = lat[keep][order], lon[keep][order]
+    mask = simplify_tracks(lon, lat, float_ids, tolerance)
+    ids, points = np.unique(float_ids, return_counts=True)
+    return pd.DataFrame({
+        "float_id": float_ids[mask],
+        "time": times[mask],
+        "latitude": lat[mask],
+        "longitude": lon[mask],
+        "points": points[np.searchsorted(ids, float_ids[mask])],
+    })
+
+
+# -----------------------------
+# CACHE
+# -----------------------------
+class MapLayers:
+    """Map layers of one profile table, cached per zoom level and snapped viewport."""
+
+    def __init__(self, profiles, cache_size=256, track_zoom=TRACK_ZOOM, max_track_points=50_000):
+        self.profiles = profiles
+        self.track_zoom = track_zoom
+        self.max_track_points = max_track_points  # denser viewports fall back to bins
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+
+    def extend(self, profiles, added):
+        """Layers of ``profiles``, this table plus the rows ``added``.
+
+        Cached layers of viewports that none of the added positions fall in
+        are unchanged and carried over.
+        """
+        layers = MapLayers(profiles, self._cache_size, self.track_zoom, self.max_track_points)
+        lat = added["latitude"].to_numpy(dtype=np.float64)
+        lon = added["longitude"].to_numpy(dtype=np.float64)
+        with self._lock:
+            for key, result in self._cache.items():
+                viewport = key[1]
+                if viewport is not None and not in_viewport(lat, lon, viewport).any():
+                    layers._cache[key] = result
+        return layers
+
+    @staticmethod
+    def snap(viewport, cell):
+        """Round a viewport outward to multiples of ``cell`` degrees."""
+        if viewport is None:
+            return None
+        lat_min, lat_max, lon_min, lon_max = viewport
+        return (
+            float(max(np.floor(lat_min / cell) * cell, -90.0)), float(min(np.ceil(lat_max / cell) * cell, 90.0)),
+            float(max(np.floor(lon_min / cell) * cell, -180.0)), float(min(np.ceil(lon_max / cell) * cell, 180.0)),
+        )
+
+    def layer(self, zoom, viewport=None, kind="hex"):
+        """``("bins", frame)`` below the track zoom (or when tracks would be too dense), else ``("tracks", frame)``."""
+        zoom = int(zoom)
+        cell = cell_degrees(zoom)
+        viewport = self.snap(viewport, cell)
+        key = (zoom, viewport, kind)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        result = None
+        if zoom >= self.track_zoom:
+            tracks = float_tracks(self.profiles, pixel_degrees(zoom), viewport)
+            if len(tracks) <= self.max_track_points:
+                result = ("tracks", tracks)
+        if result is None:
+            result = ("bins", grid_bins(self.profiles, cell, viewport, kind))
+        with self._lock:
+            self._cache[key] = result
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return result
@@ -0,0 +1,155 @@
+"""Server-side plot data: depth-binned profile envelopes and pre-binned histograms.
+
+Instead of sending raw (or randomly sampled) measurements to the browser, the
+profile plots receive the min, mean and max of each pressure bin per float (or
+per profile when one float is selected), and histograms receive bin counts.
+Both are deterministic, so the plots no longer change between reruns, and the
+payload size depends on the number of bins rather than on the dataset. Both
+stream through the levels a chunk at a time, so they work the same on
+resident profile data and on a store whose levels stay on disk.
+"""
+import numpy as np
+import pandas as pd
+
+from .derived import LEVEL_VARIABLES, level_values
+from .profiles import CHUNK_LEVELS, LEVEL_COLUMNS
+
+ENVELOPE_STATS = ("min", "mean", "max")
+MAX_BINS = 1 << 20  # pressure bins per group in a packed (group, bin) key
+
+
+def _segments(keys):
+    """Sort ``keys`` and return ``(order, unique_keys, starts, counts)`` of equal-key runs."""
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+    starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]]) if len(keys) else np.empty(0, dtype=np.int64)
+    counts = np.diff(np.r_[starts, len(keys)])
+    return order, sorted_keys[starts], starts, counts
+
+
+def _merge_bins(parts):
+    """Combine per-chunk ``(keys, count, sum, min, max)`` bins into one sorted set."""
+    if len(parts) == 1:
+        return parts[0]
+    keys, count, total, lo, hi = (np.concatenate(arrays) for arrays in zip(*parts))
+    order, keys, starts, _ = _segments(keys)
+    return (keys, np.add.reduceat(count[order], starts), np.add.reduceat(total[order], starts),
+            np.minimum.reduceat(lo[order], starts), np.maximum.reduceat(hi[order], starts))
+
+
+def profile_envelope(data, metric, float_id=None, bin_size=25.0, max_groups=20, max_raw=5000,
+                     chunk_levels=CHUNK_LEVELS):
+    """Min/mean/max of ``metric`` per pressure bin.
+
+    With ``float_id`` the groups are that float's profiles (labelled by profile
+    time); otherwise they are floats, collapsed into one "All Floats" group
+    when there are more than ``max_groups``. Selections of at most ``max_raw``
+    levels are returned as-is (stat ``"value"``), since binning would not make
+    them smaller. ``metric`` may be a derived level variable. Levels are read
+    ``chunk_levels`` at a time and only the bins are kept between chunks.
+    Returns a long frame with columns
+    ``[group column, "pressure", metric, "stat", "count"]``.
+    """
+    profiles = data.profiles
+    columns = list(LEVEL_COLUMNS) if metric in LEVEL_VARIABLES else list(dict.fromkeys(["pressure", metric]))
+    if float_id is not None:
+        first, stop = data.float_profiles(float_id)
+        group_column, labels = "time", profiles["time"].to_numpy()[first:stop]
+        uniques = None
+    else:
+        first, stop = 0, data.profile_count
+        uniques = np.unique(profiles["float_id"].to_numpy())
+        group_column = "float_id"
+        labels = np.array(["All Floats"]) if len(uniques) > max_groups else uniques.astype(str)
+    empty_columns = [group_column, "pressure", metric, "stat", "count"]
+    raw = int(data.offsets[stop] - data.offsets[first]) <= max_raw
+    if raw:
+        chunks = [data.take(np.arange(first, stop), columns)]
+    else:
+        chunks = data.chunks(columns, float_id=float_id, chunk_levels=chunk_levels)
+
+    parts, seen = [], 0
+    for chunk in chunks:
+        levels = chunk.profiles["levels"].to_numpy()
+        if uniques is None:
+            group = np.repeat(np.arange(seen, seen + chunk.profile_count), levels)
+            seen += chunk.profile_count
+        elif len(uniques) > max_groups:
+            group = np.zeros(len(chunk), dtype=np.int64)
+        else:
+            group = np.repeat(np.searchsorted(uniques, chunk.profiles["float_id"].to_numpy()), levels)
+        pressure = chunk["pressure"]
+        values = level_values(chunk, metric).astype(np.float64)
+        valid = ~np.isnan(pressure) & ~np.isnan(values)
+        pressure, values, group = pressure[valid], values[valid], group[valid]
+        if raw:
+            if not len(values):
+                return pd.DataFrame(columns=empty_columns)
+            return pd.DataFrame({
+                group_column: labels[group],
+                "pressure": pressure,
+                metric: values,
+                "stat": "value",
+                "count": 1,
+            })
+        if not len(values):
+            continue
+        bins = (pressure // bin_size).astype(np.int64)
+        order, keys, starts, counts = _segments(group.astype(np.int64) * MAX_BINS + bins)
+        ordered = values[order]
+        parts.append((keys, counts, np.add.reduceat(ordered, starts),
+                      np.minimum.reduceat(ordered, starts), np.maximum.reduceat(ordered, starts)))
+    if not parts:
+        return pd.DataFrame(columns=empty_columns)
+
+    keys, counts, total, lo, hi = _merge_bins(parts)
+    result = {"min": lo, "mean": total / counts, "max": hi}
+    key_group, key_bin = keys // MAX_BINS, keys % MAX_BINS
+    n = len(keys)
+    return pd.DataFrame({
+        group_column: np.tile(labels[key_group], len(ENVELOPE_STATS)),
+        "pressure": np.tile((key_bin + 0.5) * bin_size, len(ENVELOPE_STATS)),
+        metric: np.concatenate([result[stat] for stat in ENVELOPE_STATS]),
+        "stat": np.repeat(ENVELOPE_STATS, n),
+        "count": np.tile(counts, len(ENVELOPE_STATS)),
+    })
+
+
+def histogram_bins(values, nbins=30, value_range=None):
+    """Pre-binned histogram as a frame of bin edges, centers and counts."""
+    values = np.asarray(values)
+    values = values[~np.isnan(values)]
+    if value_range is None and len(values):
+        value_range = (float(values.min()), float(values.max()))
+    counts, edges = np.histogram(values, bins=nbins, range=value_range)
+    return _histogram_frame(counts, edges)
+
+
+def level_histogram(data, metric, nbins=30, value_range=None, chunk_levels=CHUNK_LEVELS):
+    """``histogram_bins`` of a level variable over every profile, counted ``chunk_levels`` levels at a time.
+
+    ``value_range`` (e.g. the dataset's min and max from ``GlobalStats``)
+    saves a first pass over the levels to find it.
+    """
+    columns = list(LEVEL_COLUMNS) if metric in LEVEL_VARIABLES else [metric]
+    if value_range is None:
+        low, high = np.inf, -np.inf
+        for chunk in data.chunks(columns, chunk_levels=chunk_levels):
+            values = level_values(chunk, metric)
+            if len(values) and not np.isnan(values).all():
+                low, high = min(low, float(np.nanmin(values))), max(high, float(np.nanmax(values)))
+        value_range = (low, high) if low <= high else None
+    counts, edges = np.histogram(np.empty(0), bins=nbins, range=value_range)
+    for chunk in data.chunks(columns, chunk_levels=chunk_levels):
+        values = level_values(chunk, metric)
+        counts += np.histogram(values[~np.isnan(values)], bins=edges)[0]
+    return _histogram_frame(counts, edges)
+
+
+def _histogram_frame(counts, edges):
+    return pd.DataFrame({
+        "left": edges[:-1],
+        "right": edges[1:],
+        "center": (edges[:-1] + edges[1:]) / 2,
+        "count": counts,
+    })
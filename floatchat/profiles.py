@@ -0,0 +1,292 @@
+"""Profile-oriented compact data model.
+
+Argo distributes profiles as ragged arrays: per-profile metadata plus the
+levels of every profile stored back to back. ``ProfileData`` follows the same
+layout: one ``profiles`` row per profile (float_id, profile_index, direction,
+position, time) and contiguous float32 ``pressure``/``temperature``/``salinity`` arrays,
+where profile ``p`` owns levels ``offsets[p]:offsets[p + 1]``. Profiles are
+ordered by float, so a float's levels are a single slice too. ``append``
+keeps that order by inserting new profiles and their level segments at their
+place (``insert_slots``) rather than sorting everything again.
+
+Compared with one DataFrame row per level, the per-profile columns are stored
+once instead of 50-150 times, and counting or slicing profiles needs no groupby.
+
+Consumers reach the levels through ``take`` (the levels of some profiles) and
+``chunks`` (all of them, a bounded piece at a time), which ``StoreProfiles``
+(see ``catalog``) implements by reading the store instead of slicing arrays.
+"""
+import numpy as np
+import pandas as pd
+
+from .schema import cast
+
+LEVEL_COLUMNS = ["pressure", "temperature", "salinity"]
+CHUNK_LEVELS = 1 << 20  # levels per piece when streaming through every profile
+
+
+def profile_keys(float_ids, profile_index, descending):
+    """Packed int64 profile keys, ordered like ``(float_id, profile_index, descending)``.
+
+    A profile is identified by its float, cycle and direction: the ascending
+    and descending profiles of one cycle are separate profiles.
+    """
+    return (
+        (np.asarray(float_ids, dtype=np.int64) << 32)
+        | (np.asarray(profile_index, dtype=np.int64) << 1)
+        | np.asarray(descending, dtype=np.int64)
+    )
+
+
+def split_keys(keys):
+    """``(float_id, profile_index, descending)`` arrays of packed profile keys."""
+    return keys >> 32, ((keys & 0xFFFFFFFF) >> 1).astype(np.int16), (keys & 1).astype(bool)
+
+
+def group_profiles(df):
+    """Group measurement rows into profiles.
+
+    Returns ``(profiles, order, offsets)``: the per-profile table sorted by
+    float_id, profile_index and direction, and a CSR mapping where the rows of
+    profile ``p`` are ``order[offsets[p]:offsets[p + 1]]`` (in their original order).
+    """
+    keys = profile_keys(df["float_id"], df["profile_index"], df["descending"])
+    keys, inverse = np.unique(keys, return_inverse=True)
+    order = np.argsort(inverse, kind="stable")
+    offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(inverse, minlength=len(keys)), out=offsets[1:])
+    first_rows = order[offsets[:-1]]
+    times = np.asarray(df["time"], dtype="datetime64[s]")[order]
+    float_ids, profile_index, descending = split_keys(keys)
+    profiles = cast(pd.DataFrame({
+        "profile_index": profile_index,
+        "descending": descending,
+        "latitude": np.asarray(df["latitude"])[first_rows],
+        "longitude": np.asarray(df["longitude"])[first_rows],
+        "time": np.minimum.reduceat(times, offsets[:-1]) if len(keys) else times[:0],
+        "levels": np.diff(offsets).astype(np.int32),
+    }))
+    # float_id stays plain int64 (not categorical) for key arithmetic and concatenation
+    profiles.insert(0, "float_id", float_ids)
+    return profiles, order, offsets
+
+
+def float_ranges(profiles):
+    """Map float_id -> ``(first, stop)`` profile id range of a float-sorted profile table."""
+    float_ids = profiles["float_id"].to_numpy()
+    starts = np.flatnonzero(np.r_[True, float_ids[1:] != float_ids[:-1]]) if len(float_ids) else np.empty(0, dtype=np.int64)
+    stops = np.r_[starts[1:], len(float_ids)]
+    return dict(zip(float_ids[starts].tolist(), zip(starts.tolist(), stops.tolist())))
+
+
+def _table_keys(profiles):
+    return profile_keys(profiles["float_id"], profiles["profile_index"], profiles["descending"])
+
+
+def insert_slots(profiles, other):
+    """Rows of the key-sorted ``profiles`` before which the rows of the key-sorted ``other`` go.
+
+    A profile already present keeps its place and the new one follows it, as
+    a stable sort of both tables would order them.
+    """
+    return np.searchsorted(_table_keys(profiles), _table_keys(other), side="right")
+
+
+def added_slots(profiles, merged):
+    """``insert_slots`` of the rows ``merged`` (key-sorted) has on top of ``profiles``.
+
+    Rows already in ``profiles`` come first among equal keys in ``merged``,
+    as ``insert_slots`` places them.
+    """
+    old, keys = _table_keys(profiles), _table_keys(merged)
+    rank = np.arange(len(old)) - np.searchsorted(old, old, side="left")  # position among equal keys
+    added = np.ones(len(keys), dtype=bool)
+    added[np.searchsorted(keys, old, side="left") + rank] = False
+    ids = np.flatnonzero(added)
+    return ids - np.arange(len(ids))
+
+
+def insert_rows(profiles, slots, other):
+    """Profile table with the rows of ``other`` inserted before rows ``slots`` of ``profiles``."""
+    return pd.DataFrame({col: np.insert(profiles[col].to_numpy(), slots, other[col].to_numpy()) for col in profiles.columns})
+
+
+def inserted_ids(slots):
+    """Profile ids, after an insert at ``slots``, of the inserted profiles."""
+    return np.asarray(slots, dtype=np.int64) + np.arange(len(slots))
+
+
+def chunk_ranges(offsets, chunk_levels=CHUNK_LEVELS, boundaries=None):
+    """``(first, stop)`` profile ranges of about ``chunk_levels`` levels each.
+
+    Ranges are cut only at ``boundaries`` (profile ids, e.g. the first profile
+    of every float), or between any two profiles by default.
+    """
+    count = len(offsets) - 1
+    cuts = np.arange(count + 1) if boundaries is None else np.unique(np.r_[0, np.asarray(boundaries, dtype=np.int64), count])
+    first = 0
+    while first < count:
+        i = int(np.searchsorted(offsets[cuts], offsets[first] + chunk_levels, side="right")) - 1
+        stop = int(cuts[i]) if cuts[i] > first else int(cuts[np.searchsorted(cuts, first, side="right")])
+        yield first, stop
+        first = stop
+
+
+def csr_positions(offsets, profile_ids):
+    """Concatenated level positions of ``profile_ids`` without a Python loop."""
+    profile_ids = np.asarray(profile_ids, dtype=np.int64)
+    starts = offsets[profile_ids]
+    lengths = offsets[profile_ids + 1] - starts
+    return np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+
+
+class ProfileData:
+    """Per-profile table plus contiguous per-level arrays (CSR/ragged layout)."""
+
+    def __init__(self, profiles, offsets, levels, time_offset):
+        self.profiles = profiles
+        self.offsets = offsets
+        self.levels = levels  # column name -> float32 array of all levels
+        self.time_offset = time_offset  # per-level seconds after the profile time
+        self._float_ranges = None
+
+    @classmethod
+    def from_frame(cls, df):
+        profiles, order, offsets = group_profiles(df)
+        levels = {col: np.asarray(df[col], dtype=np.float32)[order] for col in LEVEL_COLUMNS if col in df}
+        row_time = np.asarray(df["time"], dtype="datetime64[s]")[order]
+        profile_time = np.repeat(profiles["time"].to_numpy(), profiles["levels"].to_numpy())
+        time_offset = (row_time - profile_time).astype(np.int64).astype(np.int32)
+        return cls(profiles, offsets, levels, time_offset)
+
+    def append(self, other, slots=None):
+        """New ``ProfileData`` with the profiles of ``other`` (key-sorted) merged in.
+
+        Nothing is re-sorted: ``other``'s profiles and level segments are
+        inserted at their ``insert_slots`` (computed if not given), so existing
+        profiles keep their relative order and the levels are copied once.
+        """
+        slots = insert_slots(self.profiles, other.profiles) if slots is None else slots
+        profiles = insert_rows(self.profiles, slots, other.profiles)
+        offsets = np.zeros(len(profiles) + 1, dtype=np.int64)
+        np.cumsum(profiles["levels"].to_numpy(), out=offsets[1:])
+        level_slots = np.repeat(self.offsets[slots], other.profiles["levels"].to_numpy())
+        levels = {col: np.insert(values, level_slots, other.levels[col]) for col, values in self.levels.items()}
+        return ProfileData(profiles, offsets, levels, np.insert(self.time_offset, level_slots, other.time_offset))
+
+    @classmethod
+    def concat(cls, parts):
+        """One ``ProfileData`` holding the profiles of every part.
+
+        Nothing is regrouped: the profile tables and level arrays are
+        concatenated, and only if the parts' profiles do not already follow
+        each other in float order are the levels gathered into float order.
+        """
+        profiles = pd.concat([part.profiles for part in parts], ignore_index=True)
+        offsets = np.zeros(len(profiles) + 1, dtype=np.int64)
+        np.cumsum(profiles["levels"].to_numpy(), out=offsets[1:])
+        levels = {col: np.concatenate([part.levels[col] for part in parts]) for col in LEVEL_COLUMNS}
+        time_offset = np.concatenate([part.time_offset for part in parts])
+
+        keys = profile_keys(profiles["float_id"], profiles["profile_index"], profiles["descending"])
+        if len(keys) > 1 and (keys[1:] < keys[:-1]).any():
+            order = np.argsort(keys, kind="stable")
+            positions = csr_positions(offsets, order)
+            profiles = profiles.iloc[order].reset_index(drop=True)
+            levels = {col: values[positions] for col, values in levels.items()}
+            time_offset = time_offset[positions]
+            offsets = np.zeros(len(profiles) + 1, dtype=np.int64)
+            np.cumsum(profiles["levels"].to_numpy(), out=offsets[1:])
+        return cls(profiles, offsets, levels, time_offset)
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    @property
+    def float_ranges(self):
+        """float_id -> ``(first, stop)`` profile id range, built on first use (``take`` pieces rarely need it)."""
+        if self._float_ranges is None:
+            self._float_ranges = float_ranges(self.profiles)
+        return self._float_ranges
+
+    @property
+    def profile_count(self):
+        return len(self.profiles)
+
+    def __getitem__(self, column):
+        return self.levels[column]
+
+    def memory_usage(self):
+        """Bytes held by the profile table and level arrays."""
+        arrays = list(self.levels.values()) + [self.offsets, self.time_offset]
+        return int(self.profiles.memory_usage(deep=True).sum() + sum(a.nbytes for a in arrays))
+
+    # -----------------------------
+    # SLICES
+    # -----------------------------
+    def float_profiles(self, float_id):
+        """Range of profile ids belonging to ``float_id``."""
+        return self.float_ranges.get(int(float_id), (0, 0))
+
+    def profile(self, profile_id):
+        """Level arrays of one profile (views, no copy)."""
+        start, stop = self.offsets[profile_id], self.offsets[profile_id + 1]
+        return {col: values[start:stop] for col, values in self.levels.items()}
+
+    def take(self, profile_ids, columns=None):
+        """``ProfileData`` of the given profiles, in that order, with the level ``columns`` (default: all).
+
+        A contiguous id range is sliced (views); anything else is gathered.
+        """
+        profile_ids = np.asarray(profile_ids, dtype=np.int64)
+        columns = list(self.levels) if columns is None else columns
+        rows = profile_ids
+        if len(profile_ids) and (np.diff(profile_ids) == 1).all():
+            rows = slice(profile_ids[0], profile_ids[-1] + 1)
+            positions = slice(self.offsets[rows.start], self.offsets[rows.stop])
+        else:
+            positions = csr_positions(self.offsets, profile_ids)
+        profiles = self.profiles.iloc[rows].reset_index(drop=True)
+        offsets = np.zeros(len(profiles) + 1, dtype=np.int64)
+        np.cumsum(profiles["levels"].to_numpy(), out=offsets[1:])
+        levels = {col: self.levels[col][positions] for col in columns}
+        return ProfileData(profiles, offsets, levels, self.time_offset[positions])
+
+    def chunks(self, columns=None, float_id=None, chunk_levels=CHUNK_LEVELS):
+        """Yield ``take`` pieces of about ``chunk_levels`` levels covering every profile (or one float's)."""
+        first, stop = self.float_profiles(float_id) if float_id is not None else (0, self.profile_count)
+        for a, b in chunk_ranges(self.offsets[first:stop + 1] - self.offsets[first], chunk_levels):
+            yield self.take(np.arange(first + a, first + b), columns)
+
+    # -----------------------------
+    # DATAFRAME VIEWS
+    # -----------------------------
+    def _frame(self, profiles, repeats, positions):
+        meta = {col: np.repeat(profiles[col].to_numpy(), repeats) for col in ("float_id", "profile_index", "descending", "latitude", "longitude")}
+        time = np.repeat(profiles["time"].to_numpy(), repeats) + self.time_offset[positions].astype("timedelta64[s]")
+        return pd.DataFrame({
+            "float_id": pd.Categorical(meta["float_id"]),
+            "profile_index": meta["profile_index"],
+            "descending": meta["descending"],
+            "latitude": meta["latitude"],
+            "longitude": meta["longitude"],
+            "time": time,
+            **{col: values[positions] for col, values in self.levels.items()},
+        }, copy=False)
+
+    def frame(self, profile_ids=None):
+        """Row-per-level DataFrame for existing code, for all or the given profiles."""
+        if profile_ids is None:
+            return self._frame(self.profiles, self.profiles["levels"].to_numpy(), slice(None))
+        profile_ids = np.asarray(profile_ids, dtype=np.int64)
+        selected = self.profiles.iloc[profile_ids]
+        return self._frame(selected, selected["levels"].to_numpy(), csr_positions(self.offsets, profile_ids))
+
+    def slice_frame(self, first, stop):
+        """Row-per-level DataFrame for profiles ``first:stop``; the level columns are slices, not gathers."""
+        selected = self.profiles.iloc[first:stop]
+        return self._frame(selected, selected["levels"].to_numpy(), slice(self.offsets[first], self.offsets[stop]))
+
+    def float_frame(self, float_id):
+        """Row-per-level DataFrame for one float."""
+        return self.slice_frame(*self.float_profiles(float_id))
@@ -0,0 +1,166 @@
+"""Per-rerun timing and memory instrumentation.
+
+Enabled through environment variables, so production reruns pay nothing when
+it is off:
+
+* ``FLOATCHAT_PROFILE``: comma-separated options. Any value turns on stage
+  timings and the developer sidebar panel; ``cprofile`` also profiles each
+  rerun with cProfile and ``tracemalloc`` measures memory deltas with
+  tracemalloc instead of the process RSS.
+* ``FLOATCHAT_PROFILE_LOG``: path of a JSON-lines file that receives one
+  record per rerun (implies stage timings).
+
+A rerun is split into sequential stages with ``stage(name)``; ``span(name)``
+times a nested block and ``record(name, seconds)`` adds work timed elsewhere,
+such as a chatbot answer computed on a worker thread. Calls that end a rerun
+early are wrapped with ``finishing`` so those reruns are logged too.
+"""
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+_log_lock = threading.Lock()
+
+
+def _rss():
+    """Resident set size in bytes (Linux), else the peak RSS reported by ``resource``."""
+    try:
+        with open("/proc/self/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except (ImportError, OSError):
+        return 0
+
+
+class RerunProfiler:
+    """Collects the stage timings and memory deltas of one script rerun."""
+
+    def __init__(self, enabled=False, log_path=None, use_cprofile=False, use_tracemalloc=False, top=15):
+        self.enabled = enabled or bool(log_path)
+        self.log_path = log_path
+        self.top = top
+        self.spans = []
+        self.context = {}  # extra fields for the log record
+        self.result = None
+        self._stage = None
+        self._depth = 0
+        self._tracemalloc = use_tracemalloc and self.enabled
+        if self._tracemalloc and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self._cprofile = cProfile.Profile() if use_cprofile and self.enabled else None
+        self._started = time.perf_counter()
+        self._memory_start = self._memory() if self.enabled else 0
+        if self._cprofile is not None:
+            self._cprofile.enable()
+
+    @classmethod
+    def from_env(cls, environ=os.environ):
+        options = {opt.strip().lower() for opt in environ.get("FLOATCHAT_PROFILE", "").split(",") if opt.strip()}
+        return cls(
+            enabled=bool(options - {"0", "off", "false"}),
+            log_path=environ.get("FLOATCHAT_PROFILE_LOG") or None,
+            use_cprofile="cprofile" in options,
+            use_tracemalloc="tracemalloc" in options,
+        )
+
+    def _memory(self):
+        return tracemalloc.get_traced_memory()[0] if self._tracemalloc else _rss()
+
+    # -----------------------------
+    # SPANS
+    # -----------------------------
+    def _open(self, name):
+        return {"name": name, "depth": self._depth, "start": time.perf_counter(), "memory": self._memory()}
+
+    def _close(self, span):
+        span["ms"] = (time.perf_counter() - span.pop("start")) * 1000
+        span["memory_delta"] = self._memory() - span.pop("memory")
+        self.spans.append(span)
+
+    def stage(self, name):
+        """End the current top-level stage and start ``name``."""
+        if not self.enabled:
+            return
+        if self._stage is not None:
+            self._close(self._stage)
+        self._stage = self._open(name)
+
+    @contextmanager
+    def span(self, name):
+        """Time a nested block."""
+        if not self.enabled:
+            yield
+            return
+        self._depth += 1
+        span = self._open(name)
+        try:
+            yield
+        finally:
+            self._depth -= 1
+            self._close(span)
+
+    def record(self, name, seconds):
+        """Add a span measured elsewhere."""
+        if self.enabled:
+            self.spans.append({"name": name, "depth": self._depth + 1, "ms": seconds * 1000, "memory_delta": None})
+
+    # -----------------------------
+    # RESULTS
+    # -----------------------------
+    def annotate(self, **context):
+        """Add fields to the rerun's log record, e.g. the dataset version once it is known."""
+        self.context.update(context)
+
+    def finishing(self, func):
+        """Wrap a call that ends the rerun early (``st.rerun``, ``st.stop``) so the rerun is recorded first."""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            self.finish(ended=func.__name__)
+            return func(*args, **kwargs)
+        return wrapper
+
+    def finish(self, **context):
+        """Close the rerun, write its log record and return it (``None`` when disabled).
+
+        Safe to call more than once: only the first call records the rerun, so
+        reruns that end early through a ``finishing`` call are not logged twice.
+        """
+        if not self.enabled or self.result is not None:
+            return self.result
+        if self._stage is not None:
+            self._close(self._stage)
+            self._stage = None
+        result = {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+            "total_ms": (time.perf_counter() - self._started) * 1000,
+            "memory_delta": self._memory() - self._memory_start,
+            "rss": _rss(),
+            **self.context,
+            **context,
+            "spans": self.spans,
+        }
+        if self._tracemalloc:
+            result["traced_peak"] = tracemalloc.get_traced_memory()[1]
+        if self._cprofile is not None:
+            self._cprofile.disable()
+            out = io.StringIO()
+            pstats.Stats(self._cprofile, stream=out).sort_stats("cumulative").print_stats(self.top)
+            result["cprofile"] = out.getvalue()
+        if self.log_path:
+            line = json.dumps(result, default=str)
+            with _log_lock, open(self.log_path, "a", encoding="utf-8") as fh:
+                fh.write(line + "\n")
+        self.result = result
+        return result
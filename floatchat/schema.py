@@ -0,0 +1,180 @@
+"""Compact typed schema of the measurement table.
+
+Every measurement frame the package builds or ingests is passed through
+``conform``, which casts it to the compact dtypes below and applies the Argo
+real-time QC global range test:
+
+============== ======================== =====
+column         dtype                    bytes
+============== ======================== =====
+float_id       category (int64 values)  1-4
+profile_index  int16                    2
+descending     bool                     1
+latitude       float32                  4
+longitude      float32                  4
+time           datetime64[s]            8
+pressure       float32                  4
+temperature    float32                  4
+salinity       float32                  4
+============== ======================== =====
+
+which is 32 bytes per row (33 once a dataset has more than 127 floats and the
+category codes widen to int16) against 72 with default int64/float64 columns.
+Argo cycle numbers stay in the thousands, well inside int16. float32 keeps about 7 significant digits, well within the precision
+of the instruments (0.002 °C, 0.01 PSU, 2.4 dbar) and of a GPS fix (~1 m).
+Reductions never accumulate in float32: sums, means and moments are computed
+in float64 (see ``FloatSummary``, ``ClimatologyCube`` and ``TrendEngine``).
+
+``memory_footprint`` reports what a frame costs per column and per row.
+"""
+import numpy as np
+import pandas as pd
+
+SCHEMA = {
+    "float_id": "category",
+    "profile_index": np.int16,
+    "descending": np.bool_,
+    "latitude": np.float32,
+    "longitude": np.float32,
+    "time": "datetime64[s]",
+    "pressure": np.float32,
+    "temperature": np.float32,
+    "salinity": np.float32,
+}
+POSITION_COLUMNS = ("latitude", "longitude")
+# Columns that frames and store fragments written before they existed may lack
+DEFAULTS = {"descending": False}
+# Argo real-time QC global range test (test 6); values outside are bad data
+VALID_RANGES = {
+    "latitude": (-90.0, 90.0),
+    "longitude": (-180.0, 180.0),
+    "pressure": (-5.0, 12000.0),
+    "temperature": (-2.5, 40.0),
+    "salinity": (2.0, 41.0),
+}
+ON_INVALID = ("nan", "drop", "raise")
+
+
+class SchemaError(ValueError):
+    """A measurement frame that cannot be conformed to the schema."""
+
+
+def _float_ids(values):
+    if isinstance(values.dtype, pd.CategoricalDtype) and values.cat.categories.dtype == np.int64:
+        return values
+    try:
+        return pd.Categorical(np.asarray(values, dtype=np.int64))
+    except (TypeError, ValueError) as exc:
+        raise SchemaError(f"float_id must be integer: {exc}") from None
+
+
+def _profile_index(values):
+    values = np.asarray(values)
+    if values.dtype != np.int16:
+        if len(values) and (values.min() < np.iinfo(np.int16).min or values.max() > np.iinfo(np.int16).max):
+            raise SchemaError("profile_index does not fit in int16")
+        values = values.astype(np.int16)
+    return values
+
+
+def cast(df):
+    """Cast the schema columns present in ``df`` (any subset) to their compact dtypes."""
+    columns = {}
+    for col in df.columns:
+        values = df[col]
+        if col == "float_id":
+            values = _float_ids(values)
+        elif col == "profile_index":
+            values = _profile_index(values)
+        elif col in SCHEMA:
+            values = np.asarray(values, dtype=SCHEMA[col])
+        columns[col] = values
+    return pd.DataFrame(columns, columns=df.columns)
+
+
+def out_of_range(df):
+    """Boolean mask per range-checked column (NaN counts as missing, not invalid)."""
+    masks = {}
+    for col, (low, high) in VALID_RANGES.items():
+        values = np.asarray(df[col])
+        masks[col] = (values < low) | (values > high)
+    return masks
+
+
+def validate(df):
+    """Number of out-of-range values per column."""
+    return {col: int(mask.sum()) for col, mask in out_of_range(df).items()}
+
+
+def conform(df, on_invalid="nan"):
+    """Cast ``df`` to the compact schema and range-check it.
+
+    Out-of-range measurements become NaN (``on_invalid="nan"``), remove their
+    row (``"drop"``) or raise ``SchemaError`` (``"raise"``). Rows with an
+    out-of-range position are always dropped unless raising. Columns already
+    in the target dtype are not copied; extra columns are dropped.
+    """
+    if on_invalid not in ON_INVALID:
+        raise ValueError(f"on_invalid must be one of {ON_INVALID}, got {on_invalid!r}")
+    missing = [col for col in SCHEMA if col not in df and col not in DEFAULTS]
+    if missing:
+        raise SchemaError(f"Missing measurement columns: {', '.join(missing)}")
+    df = df.assign(**{col: value for col, value in DEFAULTS.items() if col not in df})
+
+    frame = cast(df[list(SCHEMA)])
+
+    masks = {col: mask for col, mask in out_of_range(frame).items() if mask.any()}
+    if not masks:
+        return frame
+    if on_invalid == "raise":
+        counts = ", ".join(f"{col}: {int(mask.sum())}" for col, mask in masks.items())
+        raise SchemaError(f"Values outside the valid range ({counts})")
+    drop = np.zeros(len(frame), dtype=bool)
+    for col, mask in masks.items():
+        if on_invalid == "drop" or col in POSITION_COLUMNS:
+            drop |= mask
+        else:
+            values = frame[col].to_numpy(copy=True)
+            values[mask] = np.nan
+            frame[col] = values
+    if drop.any():
+        frame = frame[~drop].reset_index(drop=True)
+    return frame
+
+
+def arrow_schema():
+    """The schema as pyarrow types, as written to and read from the store."""
+    import pyarrow as pa
+
+    return pa.schema([
+        ("float_id", pa.int64()),
+        ("profile_index", pa.int16()),
+        ("descending", pa.bool_()),
+        ("latitude", pa.float32()),
+        ("longitude", pa.float32()),
+        ("time", pa.timestamp("s")),
+        ("pressure", pa.float32()),
+        ("temperature", pa.float32()),
+        ("salinity", pa.float32()),
+    ])
+
+
+def memory_footprint(df):
+    """Bytes per column and per row, against the same columns as int64/float64/datetime64[ns].
+
+    Returns a frame indexed by column (plus a ``total`` row) with ``dtype``,
+    ``bytes``, ``bytes_per_row``, ``default_bytes`` and ``ratio``.
+    """
+    rows = max(len(df), 1)
+    usage = df.memory_usage(deep=True, index=False)
+    frame = pd.DataFrame({
+        "dtype": [str(df[col].dtype) for col in df.columns],
+        "bytes": usage.to_numpy(),
+        "default_bytes": [8 * len(df) for _ in df.columns],
+    }, index=df.columns)
+    frame.loc["total"] = ["", frame["bytes"].sum(), frame["default_bytes"].sum()]
+    frame["bytes"] = frame["bytes"].astype(np.int64)
+    frame["default_bytes"] = frame["default_bytes"].astype(np.int64)
+    frame["bytes_per_row"] = frame["bytes"] / rows
+    frame["ratio"] = frame["bytes"] / frame["default_bytes"].where(frame["default_bytes"] > 0)
+    return frame[["dtype", "bytes", "bytes_per_row", "default_bytes", "ratio"]]
@@ -0,0 +1,276 @@
+"""Shared, read-only dataset for every session of one server process.
+
+Streamlit reruns the whole script per session, so anything the script builds
+or copies costs memory per user. ``DataService`` builds the profile data,
+index, float summary, climatology cube and query engine once per dataset
+version and hands out ``Snapshot`` references to them; a session only holds
+the snapshot it took at the start of its rerun.
+
+Over a store, the measurements stay on disk. The service keeps the float
+summary, the climatology cube and the profile catalog (one row per profile),
+each saved next to the store, so startup loads them instead of reading the
+data; dataset-wide answers come from the summary and the cube, and queries
+that need levels read just their profiles' columns and partitions (see
+``StoreProfiles``). Whether the store has changed is one ``stat`` of its
+manifest per check. Without a store (the sample dataset), the compact
+``ProfileData`` is resident and its level arrays are marked read-only so a
+session cannot mutate what the others see.
+
+New data is folded in incrementally, whether it arrives through ``append``
+or as new fragments written to the store by another process: only the new
+fragments are read, and each is folded into whichever aggregates lack it.
+The new profiles are inserted at their place in the key-sorted profile table
+and level arrays, and the previous snapshot's index, derived variables,
+per-float trend series and map layers are carried over, extended with the new
+profiles only. Each update is recorded as a ``Change`` so dashboards can
+refresh only what it touched.
+"""
+import os
+import threading
+from collections import deque
+from dataclasses import dataclass
+
+import numpy as np
+
+from .catalog import ProfileCatalog
+from .chatbot import QueryEngine, trend_regions
+from .climatology import ClimatologyCube
+from .derived import DerivedVariables
+from .index import ProfileIndex
+from .maps import MapLayers
+from .profiles import ProfileData, added_slots, insert_slots, inserted_ids
+from .schema import conform
+from .summary import FloatSummary
+from .trends import TrendEngine
+
+SAMPLE_NOTE = "Data based on random sample simulations."
+FRAGMENT_GROUP = 256  # store fragments read per pass when folding them into the aggregates
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    """One consistent version of the shared dataset."""
+    version: str
+    data: ProfileData  # or StoreProfiles, over a store
+    index: ProfileIndex
+    float_summary: object  # pandas DataFrame
+    stats: object  # GlobalStats, None when empty
+    cube: ClimatologyCube
+    derived: DerivedVariables  # per-profile values from the catalog, or computed on first use
+    trends: TrendEngine  # built on first use
+    maps: MapLayers
+    engine: QueryEngine
+
+    @property
+    def empty(self):
+        return not len(self.data)
+
+
+@dataclass(frozen=True)
+class Change:
+    """What one update added to the dataset."""
+    version: str
+    previous: str
+    float_ids: tuple
+    profiles: int
+    rows: int
+    full: bool = False  # rebuilt from scratch rather than appended
+
+
+def _freeze(data):
+    for values in [*data.levels.values(), data.offsets, data.time_offset]:
+        values.flags.writeable = False
+    return data
+
+
+class DataService:
+    """Builds snapshots of a store (or of a loader function) and shares them."""
+
+    def __init__(self, loader=None, store=None, cube_path=None, summary_path=None, catalog_path=None, note=None):
+        self._loader = loader  # callable returning a measurement frame, used without a store
+        self._store = store
+        self._note = note
+        self._paths = {"summary": summary_path, "cube": cube_path, "catalog": catalog_path}
+        self._summary = FloatSummary.open(summary_path) if summary_path else FloatSummary()
+        self._cube = ClimatologyCube.open(cube_path) if cube_path else ClimatologyCube()
+        self._catalog = ProfileCatalog.open(catalog_path) if catalog_path else ProfileCatalog()
+        self._files = set()  # store fragments (relative paths) in the current snapshot
+        self._appends = 0
+        self._changes = deque(maxlen=256)
+        self._lock = threading.Lock()
+        self._snapshot = None
+
+    @classmethod
+    def from_store(cls, store, cube_path=None, summary_path=None, catalog_path=None, note=None):
+        """Service over a store; aggregates are loaded from and saved to the given paths (kept in memory only if None)."""
+        return cls(store=store, cube_path=cube_path, summary_path=summary_path, catalog_path=catalog_path, note=note)
+
+    def answer(self, question):
+        """Answer a chatbot question against the current snapshot."""
+        return self.snapshot().engine.answer(question)
+
+    def _version(self):
+        if self._store is not None:
+            return self._store.version()
+        current = self._snapshot
+        return current.version if current is not None else "sample"
+
+    def snapshot(self):
+        """The current snapshot, updated first if the store has changed."""
+        version = self._version()
+        current = self._snapshot
+        if current is not None and current.version == version:
+            return current
+        with self._lock:
+            current = self._snapshot
+            if current is None or current.version != version:
+                current = self._snapshot = self._update(version)
+        return current
+
+    def append(self, df):
+        """Add a batch of measurements (whole profiles); returns the snapshot that includes it."""
+        if self._store is not None:
+            self._store.append(df)
+            return self.snapshot()
+        df = conform(df)
+        self.snapshot()
+        with self._lock:
+            self._appends += 1
+            batch = ProfileData.from_frame(df)
+            self._summary.update(df)
+            self._cube.update(batch)
+            self._snapshot = self._extend(f"sample-{self._appends}", batch)
+            return self._snapshot
+
+    def changes_since(self, version):
+        """Changes applied after ``version``, oldest first; ``None`` if it is too old to tell."""
+        current = self._snapshot
+        if current is None or version == current.version:
+            return []
+        changes = list(self._changes)
+        for i, change in enumerate(changes):
+            if change.previous == version:
+                return changes[i:]
+        return None
+
+    # -----------------------------
+    # BUILDING
+    # -----------------------------
+    def _update(self, version):
+        if self._store is None:
+            df = self._loader()
+            self._summary.update(df)
+            data = ProfileData.from_frame(df)
+            del df
+            self._cube.update(data)
+            return self._rebuild(version, data)
+
+        files = self._store.files()
+        relpaths = [os.path.relpath(path, self._store.root) for path in files]
+        present = set(relpaths)
+        aggregates = self._aggregates()
+        if not all(aggregate.files <= present for aggregate in aggregates.values()):
+            # Fragments were removed: start over
+            self._summary, self._cube, self._catalog = FloatSummary(), ClimatologyCube(), ProfileCatalog()
+            aggregates = self._aggregates()
+        known, self._files = self._files, present
+        full = self._snapshot is not None and not known <= present
+        if full:
+            known = set()
+        added = self._fold(files, relpaths, known)
+
+        data = self._catalog.view(self._store.pin(files))
+        previous = self._snapshot
+        if previous is None:
+            return self._assemble(version, data, self._catalog.layers)
+        self._changes.append(Change(version, previous.version, tuple(sorted(added[0])), added[1], added[2], full=full))
+        slots = None if full else added_slots(previous.data.profiles, data.profiles)
+        return self._assemble(version, data, self._catalog.layers, slots)
+
+    def _aggregates(self):
+        return {"summary": self._summary, "cube": self._cube, "catalog": self._catalog}
+
+    def _fold(self, files, relpaths, known):
+        """Read the fragments some aggregate lacks and fold each into the aggregates lacking it.
+
+        Fragments are read ``FRAGMENT_GROUP`` at a time, so only one group's
+        measurements are in memory. Returns the float ids, profile count and
+        row count of the fragments that are not in ``known`` (the previous
+        snapshot's), for its ``Change``.
+        """
+        aggregates = self._aggregates()
+        groups = {}
+        for path, relpath in zip(files, relpaths):
+            lacking = tuple(name for name, aggregate in aggregates.items() if relpath not in aggregate.files)
+            if lacking:
+                groups.setdefault((lacking, relpath not in known), []).append((path, relpath))
+        float_ids, profiles, rows = set(), 0, 0
+        for (lacking, new), group in groups.items():
+            for start in range(0, len(group), FRAGMENT_GROUP):
+                paths, names = zip(*group[start:start + FRAGMENT_GROUP])
+                df = self._store.read_files(paths)
+                batch = ProfileData.from_frame(df)
+                for name in lacking:
+                    aggregates[name].update(df if name == "summary" else batch)
+                    aggregates[name].files.update(names)
+                del df
+                if new:
+                    float_ids.update(batch.float_ranges)
+                    profiles, rows = profiles + batch.profile_count, rows + len(batch)
+        for name in {name for lacking, _ in groups for name in lacking}:
+            if self._paths[name]:
+                aggregates[name].save(self._paths[name])
+        return float_ids, profiles, rows
+
+    def _rebuild(self, version, data):
+        data = _freeze(data)
+        previous = self._snapshot
+        if previous is not None:
+            self._changes.append(Change(version, previous.version, tuple(data.float_ranges), data.profile_count, len(data), full=True))
+        return self._assemble(version, data)
+
+    def _extend(self, version, new):
+        """Fold a batch (``ProfileData``) into the current snapshot's profile data."""
+        current = self._snapshot
+        slots = insert_slots(current.data.profiles, new.profiles)
+        data = _freeze(current.data.append(new, slots))
+        self._changes.append(Change(version, current.version, tuple(new.float_ranges), new.profile_count, len(new)))
+        return self._assemble(version, data, slots=slots)
+
+    def _assemble(self, version, data, profile_values=None, slots=None):
+        """Snapshot of ``data``.
+
+        With ``slots``, ``data`` is the current snapshot's plus profiles
+        inserted there (see ``insert_slots``): its index, derived variables,
+        trend series and map layers are carried over and extended with the
+        new profiles only.
+        """
+        current = self._snapshot
+        float_summary, stats = self._summary.frame(), self._summary.stats()
+        if current is None or slots is None:
+            index = ProfileIndex.from_profiles(data)
+            derived = DerivedVariables(data, profile_values)
+            trends = TrendEngine(data, trend_regions(), cube=self._cube)
+            maps = MapLayers(data.profiles)
+        else:
+            added = data.profiles.iloc[inserted_ids(slots)]
+            index = current.index.insert(data.profiles, data.offsets, slots)
+            derived = current.derived.insert(data, slots, profile_values)
+            trends = current.trends.extend(data, np.unique(added["float_id"].to_numpy()), self._cube)
+            maps = current.maps.extend(data.profiles, added)
+        engine = QueryEngine(data, float_summary, stats, index, version=version, note=self._note, cube=self._cube,
+                             derived=derived, trends=trends)
+        return Snapshot(version, data, index, float_summary, stats, self._cube, derived, trends, maps, engine)
+
+
+def open_service(store_path=None):
+    """Service over a store directory, or over the synthetic sample dataset when ``store_path`` is None."""
+    if store_path:
+        from .catalog import catalog_path
+        from .climatology import cube_path
+        from .store import ArgoStore
+        from .summary import summary_path
+        return DataService.from_store(ArgoStore(store_path), cube_path=cube_path(store_path),
+                                      summary_path=summary_path(store_path), catalog_path=catalog_path(store_path))
+    from .synthetic import generate_sample_data
+    return DataService(generate_sample_data, note=SAMPLE_NOTE)
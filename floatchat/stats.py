@@ -0,0 +1,58 @@
+"""Dataset-wide statistics shared by the chatbot, Quick Actions, Live Statistics and sidebar.
+
+``GlobalStats`` is reduced from the per-float accumulators of a ``FloatSummary``
+(so it costs O(floats), not O(measurements)) and built once per summary
+version. The rows holding each column's minimum and maximum are tracked by the
+summary as batches are folded in.
+"""
+import numpy as np
+import pandas as pd
+
+# Columns whose extreme records (argmin/argmax rows) are tracked
+EXTREME_COLUMNS = ["temperature", "salinity", "pressure"]
+
+
+def extreme_records(df):
+    """Return ``{(column, "min"|"max"): (value, record)}`` for a batch of measurements."""
+    records = {}
+    for col in EXTREME_COLUMNS:
+        values = np.asarray(df[col], dtype=np.float64)
+        if np.isnan(values).all():
+            continue
+        for kind, pick in (("min", np.nanargmin), ("max", np.nanargmax)):
+            pos = int(pick(values))
+            record = df.iloc[pos].to_dict()
+            record["time"] = pd.Timestamp(record["time"])
+            records[(col, kind)] = (float(values[pos]), record)
+    return records
+
+
+def merge_extremes(old, new):
+    """Keep the more extreme record per key; earlier records win ties like ``idxmax``."""
+    merged = dict(old)
+    for key, (value, record) in new.items():
+        current = merged.get(key)
+        if current is None or (value < current[0] if key[1] == "min" else value > current[0]):
+            merged[key] = (value, record)
+    return merged
+
+
+class GlobalStats:
+    """Precomputed global values and argmin/argmax records for one dataset version."""
+
+    def __init__(self, rows, count, total, sumsq, minimum, maximum, extremes, profiles,
+                 time_min, time_max, version=0):
+        n = count.sum()
+        self.version = version
+        self.measurements = int(rows)
+        self.floats = len(count)
+        self.profiles = int(profiles)  # distinct (float_id, profile_index, direction) profiles
+        self.time_min = pd.Timestamp(time_min) if pd.notna(time_min) else None
+        self.time_max = pd.Timestamp(time_max) if pd.notna(time_max) else None
+        total, sumsq = total.sum(), sumsq.sum()
+        self.mean = (total / n).to_dict()
+        self.std = np.sqrt(((sumsq - total * total / n) / (n - 1)).clip(lower=0)).to_dict()
+        self.min = minimum.min().to_dict()
+        self.max = maximum.max().to_dict()
+        self.argmin = {col: rec for (col, kind), (_, rec) in extremes.items() if kind == "min"}
+        self.argmax = {col: rec for (col, kind), (_, rec) in extremes.items() if kind == "max"}
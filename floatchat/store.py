@@ -0,0 +1,283 @@
+"""Partitioned columnar on-disk store for Argo profile measurements.
+
+Measurements are written once as a Hive-partitioned dataset
+(``float_id=<id>/year=<yyyy>/part-*.parquet``) and opened lazily: opening only
+lists the partition directories, and reads are memory-mapped and projected to
+the requested columns and partitions.
+
+Every ``append`` is committed by one line in ``_manifest.jsonl`` naming the
+files it wrote and, optionally, the source files the batch came from. The
+line is written after the data files, so a batch interrupted half-way is
+never seen: readers only open the files the manifest lists. The manifest only
+grows, so its committed length is the store's version, read with one ``stat``
+however large the store is. Stores written before the manifest existed are
+read by listing the directories, and their files are carried into the
+manifest by the first ``append``.
+
+A handle can be pinned to a list of files (``pin``), so that a snapshot of
+the data keeps reading the same files while batches are appended.
+"""
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+from .schema import SCHEMA, arrow_schema, cast, conform
+
+ARGO_COLUMNS = list(SCHEMA)
+MANIFEST_FILE = "_manifest.jsonl"  # leading underscore keeps it out of dataset discovery
+
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+        import pyarrow.fs as pafs
+    except ImportError as exc:
+        raise ImportError("The on-disk Argo store requires pyarrow (pip install pyarrow)") from exc
+    return pa, ds, pafs
+
+
+def _dataset_schema(pa):
+    """The measurement schema plus the ``year`` partition column."""
+    return arrow_schema().append(pa.field("year", pa.int32()))
+
+
+class ArgoStore:
+    """Lazy handle on a partitioned Argo measurement store."""
+
+    def __init__(self, root, file_format="parquet", files=None):
+        self.root = os.fspath(root)
+        self.file_format = file_format
+        self._pinned = None if files is None else list(files)  # read only these data files
+        self._dataset = None
+
+    def pin(self, files=None):
+        """Read-only handle that keeps seeing ``files`` (by default the currently committed ones)."""
+        return ArgoStore(self.root, self.file_format, self.files() if files is None else files)
+
+    # -----------------------------
+    # WRITING
+    # -----------------------------
+    def append(self, df, sources=()):
+        """Conform a batch of measurements to the schema and write it into the float_id/year partitions.
+
+        ``sources`` (e.g. the NetCDF files the batch was decoded from) are
+        recorded in the same manifest line that commits the batch, so they
+        are marked done if and only if the batch is in the store.
+        """
+        if self._pinned is not None:
+            raise ValueError("A pinned store handle is read-only")
+        pa, ds, _ = _pyarrow()
+        sources = list(sources)
+        if df.empty and not sources:
+            return 0
+        os.makedirs(self.root, exist_ok=True)
+        # Files of a store written before the manifest existed
+        legacy = [] if os.path.exists(self._manifest_path) else self._walk()
+        # Zero-padded ns timestamp keeps file names (and therefore scan order) in ingestion order
+        batch = f"{time.time_ns():020d}"
+        written = []
+        frame = conform(df)
+        if len(frame):
+            frame["float_id"] = np.asarray(frame["float_id"], dtype=np.int64)
+            frame["year"] = frame["time"].dt.year.astype(np.int32)
+            table = pa.Table.from_pandas(frame, schema=_dataset_schema(pa), preserve_index=False)
+            ds.write_dataset(
+                table,
+                self.root,
+                format=self.file_format,
+                partitioning=ds.partitioning(table.select(["float_id", "year"]).schema, flavor="hive"),
+                basename_template=f"part-{batch}-{{i}}.{self.file_format}",
+                existing_data_behavior="overwrite_or_ignore",
+                file_visitor=lambda written_file: written.append(written_file.path),
+            )
+        entries = []
+        if legacy:
+            entries.append({"batch": "legacy", "files": self._relative(legacy), "rows": None, "sources": []})
+        entries.append({"batch": batch, "files": sorted(self._relative(written)), "rows": len(frame), "sources": sources})
+        self._commit(entries)
+        self._dataset = None
+        return len(frame)
+
+    @property
+    def _manifest_path(self):
+        return os.path.join(self.root, MANIFEST_FILE)
+
+    def _relative(self, paths):
+        return [os.path.relpath(path, self.root).replace(os.sep, "/") for path in paths]
+
+    def _commit(self, entries):
+        """Append manifest lines; the batch is visible once its line is on disk."""
+        with open(self._manifest_path, "a+b") as fh:
+            if fh.seek(0, os.SEEK_END):
+                fh.seek(-1, os.SEEK_END)
+                if fh.read(1) != b"\n":
+                    fh.write(b"\n")  # a previous writer died mid-line; that line stays unparseable
+            fh.write("".join(json.dumps(entry) + "\n" for entry in entries).encode())
+            fh.flush()
+            os.fsync(fh.fileno())
+
+    def manifest(self):
+        """Committed batches, oldest first (an incomplete trailing line is skipped)."""
+        if not os.path.exists(self._manifest_path):
+            return []
+        entries = []
+        with open(self._manifest_path, encoding="utf-8") as fh:
+            for line in fh:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    continue
+        return entries
+
+    def sources(self):
+        """Source files recorded with committed batches."""
+        return {source for entry in self.manifest() for source in entry["sources"]}
+
+    @classmethod
+    def create(cls, root, df, file_format="parquet"):
+        """Create a store at ``root`` from a measurement DataFrame."""
+        store = cls(root, file_format=file_format)
+        store.append(df)
+        return store
+
+    # -----------------------------
+    # READING
+    # -----------------------------
+    def _open(self, source, **kwargs):
+        pa, ds, pafs = _pyarrow()
+        # An explicit schema casts fragments written with wider types (float64 positions in older
+        # stores) and lets an empty file list still be projected
+        schema = _dataset_schema(pa)
+        partitioning = ds.partitioning(pa.schema([schema.field("float_id"), schema.field("year")]), flavor="hive")
+        return ds.dataset(
+            source,
+            schema=schema,
+            format=self.file_format,
+            partitioning=partitioning,
+            filesystem=pafs.LocalFileSystem(use_mmap=True),
+            **kwargs,
+        )
+
+    @property
+    def dataset(self):
+        """The underlying pyarrow dataset, discovered on first use."""
+        if self._dataset is None:
+            if self._pinned is not None or os.path.exists(self._manifest_path):
+                self._dataset = self._open(self.files(), partition_base_dir=self.root)
+            else:
+                self._dataset = self._open(self.root)
+        return self._dataset
+
+    def files(self):
+        """Data files of committed batches (or the pinned files), in scan order."""
+        if self._pinned is not None:
+            return list(self._pinned)
+        if not os.path.exists(self._manifest_path):
+            return self._walk()
+        return [os.path.join(self.root, *path.split("/")) for entry in self.manifest() for path in entry["files"]]
+
+    def _walk(self):
+        suffix = f".{self.file_format}"
+        paths = []
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = sorted(d for d in dirnames if not d.startswith(("_", ".")))
+            paths.extend(os.path.join(dirpath, f) for f in sorted(filenames) if f.endswith(suffix))
+        return paths
+
+    def version(self):
+        """Content version, changed by every committed ``append``.
+
+        With a manifest this is the length of its committed lines: one
+        ``stat`` plus a read of the last line, whatever the size of the store.
+        Stores without a manifest fall back to hashing the file listing.
+        """
+        if self._pinned is not None:
+            return hashlib.sha1("\n".join(self._pinned).encode()).hexdigest()[:16]
+        try:
+            size = os.path.getsize(self._manifest_path)
+        except FileNotFoundError:
+            return hashlib.sha1("\n".join(self._walk()).encode()).hexdigest()[:16]
+        return f"m{self._committed_length(size)}"
+
+    def _committed_length(self, size, block=1 << 16):
+        """Offset just past the last newline of the manifest; a line still being written is not committed."""
+        with open(self._manifest_path, "rb") as fh:
+            end = size
+            while end > 0:
+                start = max(end - block, 0)
+                fh.seek(start)
+                chunk = fh.read(end - start)
+                newline = chunk.rfind(b"\n")
+                if newline >= 0:
+                    return start + newline + 1
+                end = start
+        return 0
+
+    def _partition_values(self, key):
+        prefix = f"{key}="
+        values = set()
+        for path in self.files():
+            for part in os.path.relpath(path, self.root).split(os.sep)[:-1]:
+                if part.startswith(prefix):
+                    values.add(int(part[len(prefix):]))
+        return sorted(values)
+
+    def float_ids(self):
+        """Float IDs present in the store, read from partition names only."""
+        return self._partition_values("float_id")
+
+    def years(self):
+        """Years present in the store, read from partition names only."""
+        return self._partition_values("year")
+
+    def count_rows(self):
+        """Number of measurements, answered from file footers without reading data."""
+        return self.dataset.count_rows()
+
+    def _filter(self, float_ids=None, years=None, expression=None):
+        _, ds, _ = _pyarrow()
+        conditions = []
+        if float_ids is not None:
+            conditions.append(ds.field("float_id").isin([int(f) for f in float_ids]))
+        if years is not None:
+            conditions.append(ds.field("year").isin([int(y) for y in years]))
+        if expression is not None:
+            conditions.append(expression)
+        result = None
+        for condition in conditions:
+            result = condition if result is None else result & condition
+        return result
+
+    def scan(self, columns=None, float_ids=None, years=None, expression=None, batch_size=1 << 17):
+        """Yield DataFrame chunks of the selected columns and partitions."""
+        scanner = self.dataset.scanner(
+            columns=list(columns or ARGO_COLUMNS),
+            filter=self._filter(float_ids, years, expression),
+            batch_size=batch_size,
+        )
+        for batch in scanner.to_batches():
+            if batch.num_rows:
+                yield _to_frame(batch)
+
+    def read(self, columns=None, float_ids=None, years=None, expression=None):
+        """Read the selected columns and partitions into one DataFrame."""
+        table = self.dataset.to_table(
+            columns=list(columns or ARGO_COLUMNS),
+            filter=self._filter(float_ids, years, expression),
+        )
+        return _to_frame(table)
+
+
+    def read_files(self, paths, columns=None):
+        """Read specific data files (e.g. the ones appended since a previous version)."""
+        table = self._open(list(paths), partition_base_dir=self.root).to_table(columns=list(columns or ARGO_COLUMNS))
+        return _to_frame(table)
+
+
+def _to_frame(table):
+    # The dataset schema already has the compact types; this makes float_id categorical
+    return cast(table.to_pandas(split_blocks=True, self_destruct=True, coerce_temporal_nanoseconds=False))
@@ -0,0 +1,248 @@
+"""Incrementally maintained per-float summary.
+
+``FloatSummary`` keeps mergeable accumulators per float (counts, sums, sums of
+squares, min/max, first/last time and the set of seen profiles), so appending a
+batch only aggregates that batch, and reading the summary between appends is a
+cached lookup rather than a groupby over the whole dataset. Like the
+climatology cube, the accumulators are saved next to a store as one ``.npz``
+file, so a restart loads them instead of reading the measurements again.
+"""
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from .profiles import profile_keys
+from .stats import GlobalStats, extreme_records, merge_extremes
+
+# Summary column prefix -> measurement column
+MOMENT_COLUMNS = {
+    "lat": "latitude",
+    "lon": "longitude",
+    "temp": "temperature",
+    "sal": "salinity",
+    "pressure": "pressure",
+}
+
+SUMMARY_FILE = os.path.join("_aggregates", "summary.npz")
+ACCUMULATORS = ("count", "sum", "sumsq", "min", "max")
+
+SUMMARY_COLUMNS = [
+    "float_id", "lat_mean", "lat_std", "lon_mean", "lon_std",
+    "temp_mean", "temp_min", "temp_max", "temp_std",
+    "sal_mean", "sal_min", "sal_max", "sal_std",
+    "pressure_max", "pressure_mean", "total_profiles",
+    "first_profile", "last_profile", "deployment_days",
+]
+
+
+def summary_path(root):
+    """Default summary location inside a store (skipped by the store's file scan)."""
+    return os.path.join(os.fspath(root), SUMMARY_FILE)
+
+
+def _plain_record(record):
+    """JSON-ready extreme record (timestamps as ISO strings, NumPy scalars as Python)."""
+    plain = {}
+    for key, value in record.items():
+        if value is pd.NaT:
+            value = None
+        elif isinstance(value, pd.Timestamp):
+            value = value.isoformat()
+        elif isinstance(value, np.generic):
+            value = value.item()
+        plain[key] = value
+    return plain
+
+
+def _combine(old, new, func):
+    if old is None:
+        return new
+    index = old.index.union(new.index)
+    a, b = old.reindex(index), new.reindex(index)
+    if func is None:
+        return a.fillna(0) + b.fillna(0)
+    if isinstance(a, pd.Series):
+        return pd.Series(func(a.to_numpy(), b.to_numpy()), index=index, name=a.name)
+    return pd.DataFrame(func(a.to_numpy(), b.to_numpy()), index=index, columns=a.columns)
+
+
+class FloatSummary:
+    """Per-float aggregates that can be updated with new measurement batches."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._count = self._sum = self._sumsq = self._min = self._max = None
+        self._first = self._last = None
+        self._profiles = None  # per-float profile counts
+        self._profile_keys = np.empty(0, dtype=np.int64)  # sorted profile_keys()
+        self._extremes = {}
+        self._frame = None
+        self._stats = None
+        self.rows = 0
+        self.files = set()  # store fragments already folded in
+        self.version = 0
+
+    @classmethod
+    def from_frame(cls, df):
+        summary = cls()
+        summary.update(df)
+        return summary
+
+    def update(self, df):
+        """Fold a batch of measurements into the aggregates."""
+        if df.empty:
+            return self
+        float_ids = np.asarray(df["float_id"], dtype=np.int64)
+        values = pd.DataFrame(
+            {col: np.asarray(df[col], dtype=np.float64) for col in MOMENT_COLUMNS.values()}
+        )
+        grouped = values.groupby(float_ids)
+        count, total, lo, hi = grouped.count(), grouped.sum(), grouped.min(), grouped.max()
+        sumsq = (values * values).groupby(float_ids).sum()
+        times = pd.Series(df["time"].to_numpy()).groupby(float_ids)
+        first, last = times.min(), times.max()
+
+        keys = np.unique(profile_keys(float_ids, df["profile_index"], df["descending"]))
+        extremes = extreme_records(df)
+
+        with self._lock:
+            # Merged into the sorted key set at their positions, not re-sorted with it
+            at = np.searchsorted(self._profile_keys, keys)
+            known = np.zeros(len(keys), dtype=bool)
+            if len(self._profile_keys):
+                known = self._profile_keys[np.minimum(at, len(self._profile_keys) - 1)] == keys
+            new_keys = keys[~known]
+            ids, counts = np.unique(new_keys >> 32, return_counts=True)
+            self._profile_keys = np.insert(self._profile_keys, at[~known], new_keys)
+            self._profiles = _combine(self._profiles, pd.Series(counts, index=ids), None)
+
+            self._count = _combine(self._count, count, None)
+            self._sum = _combine(self._sum, total, None)
+            self._sumsq = _combine(self._sumsq, sumsq, None)
+            self._min = _combine(self._min, lo, np.fmin)
+            self._max = _combine(self._max, hi, np.fmax)
+            self._first = _combine(self._first, first, np.fmin)
+            self._last = _combine(self._last, last, np.fmax)
+            self._extremes = merge_extremes(self._extremes, extremes)
+            self.rows += len(df)
+            self._frame = None
+            self._stats = None
+            self.version += 1
+        return self
+
+    def sync(self, store):
+        """Fold in any store fragments written since the last sync."""
+        with self._sync_lock:
+            # Relative paths, as in the climatology cube
+            new_files = [path for path in store.files() if os.path.relpath(path, store.root) not in self.files]
+            if new_files:
+                self.update(store.read_files(new_files))
+                self.files.update(os.path.relpath(path, store.root) for path in new_files)
+        return self
+
+    # -----------------------------
+    # PERSISTENCE
+    # -----------------------------
+    def save(self, path):
+        """Write the accumulators atomically to an ``.npz`` file."""
+        path = os.fspath(path)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        columns = list(MOMENT_COLUMNS.values())
+        with self._lock:
+            index = pd.Index([], dtype=np.int64) if self._count is None else self._count.index
+            arrays = {
+                name: np.empty((0, len(columns))) if self._count is None else getattr(self, f"_{name}")[columns].to_numpy()
+                for name in ACCUMULATORS
+            }
+            if self._count is None:
+                first = last = np.empty(0, dtype="datetime64[s]")
+                profiles = np.empty(0, dtype=np.int64)
+            else:
+                first = self._first.reindex(index).to_numpy().astype("datetime64[s]")
+                last = self._last.reindex(index).to_numpy().astype("datetime64[s]")
+                profiles = self._profiles.reindex(index).fillna(0).to_numpy().astype(np.int64)
+            extremes = [[col, kind, value, _plain_record(record)] for (col, kind), (value, record) in self._extremes.items()]
+            tmp = f"{path}.tmp"
+            with open(tmp, "wb") as fh:
+                np.savez(
+                    fh, float_ids=index.to_numpy(dtype=np.int64), columns=np.array(columns), **arrays,
+                    first=first, last=last, profiles=profiles, profile_keys=self._profile_keys,
+                    extremes=np.array(json.dumps(extremes)), rows=self.rows,
+                    files=np.array(sorted(self.files), dtype=str), version=self.version,
+                )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        """Load a saved summary; one saved with other columns starts empty."""
+        summary = cls()
+        with np.load(path) as saved:
+            columns = list(MOMENT_COLUMNS.values())
+            if list(saved["columns"]) != columns:
+                return summary
+            index = pd.Index(saved["float_ids"])
+            if len(index):
+                for name in ACCUMULATORS:
+                    setattr(summary, f"_{name}", pd.DataFrame(saved[name], index=index, columns=columns))
+                summary._first = pd.Series(saved["first"], index=index)
+                summary._last = pd.Series(saved["last"], index=index)
+                summary._profiles = pd.Series(saved["profiles"], index=index)
+            summary._profile_keys = saved["profile_keys"]
+            for col, kind, value, record in json.loads(str(saved["extremes"])):
+                summary._extremes[(col, kind)] = (value, {**record, "time": pd.Timestamp(record["time"])})
+            summary.rows = int(saved["rows"])
+            summary.files = set(saved["files"].tolist())
+            summary.version = int(saved["version"])
+        return summary
+
+    @classmethod
+    def open(cls, path):
+        """Load ``path`` if it exists, else return an empty summary."""
+        return cls.load(path) if os.path.exists(path) else cls()
+
+    def stats(self):
+        """Global statistics for the current version, reduced from the per-float accumulators."""
+        stats = self._stats
+        if stats is not None:
+            return stats
+        with self._lock:
+            if self._count is None:
+                return None
+            stats = GlobalStats(
+                self.rows, self._count, self._sum, self._sumsq, self._min, self._max,
+                self._extremes, len(self._profile_keys), self._first.min(), self._last.max(),
+                version=self.version,
+            )
+            self._stats = stats
+        return stats
+
+    def frame(self):
+        """The float_summary table, rebuilt only after an update."""
+        frame = self._frame
+        if frame is not None:
+            return frame
+        with self._lock:
+            if self._count is None:
+                return pd.DataFrame(columns=SUMMARY_COLUMNS)
+            n, total = self._count, self._sum
+            mean = total / n
+            var = (self._sumsq - total * mean) / (n - 1)
+            std = np.sqrt(var.clip(lower=0)).where(n > 1)
+
+            columns = {"float_id": n.index.to_numpy()}
+            for prefix, col in MOMENT_COLUMNS.items():
+                columns[f"{prefix}_mean"] = mean[col].to_numpy()
+                columns[f"{prefix}_std"] = std[col].to_numpy()
+                columns[f"{prefix}_min"] = self._min[col].to_numpy()
+                columns[f"{prefix}_max"] = self._max[col].to_numpy()
+            columns["total_profiles"] = self._profiles.reindex(n.index).fillna(0).astype(np.int64).to_numpy()
+            columns["first_profile"] = self._first.reindex(n.index).to_numpy()
+            columns["last_profile"] = self._last.reindex(n.index).to_numpy()
+            columns["deployment_days"] = (pd.Series(columns["last_profile"]) - pd.Series(columns["first_profile"])).dt.days.to_numpy()
+            frame = pd.DataFrame(columns, columns=SUMMARY_COLUMNS).sort_values("float_id", ignore_index=True)
+            self._frame = frame
+        return frame
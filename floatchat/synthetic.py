@@ -0,0 +1,60 @@
+"""Synthetic Argo-like measurements for the sample dashboard and the benchmarks."""
+import numpy as np
+import pandas as pd
+
+from .schema import conform
+
+
+def generate_synthetic_data(num_floats=5, profiles_per_float=(5, 20), levels_per_profile=(50, 150),
+                            seed=42, first_float_id=2902123, start_date="2012-01-01", span_days=365 * 3):
+    """Generate a synthetic Argo-like dataset with whole-array NumPy draws.
+
+    Profile counts per float and level counts per profile are drawn uniformly from the
+    half-open ``(low, high)`` ranges, matching the original per-row generator.
+    """
+    rng = np.random.default_rng(seed)
+    float_ids = np.arange(first_float_id, first_float_id + num_floats, dtype=np.int64)
+
+    # One draw per profile
+    profiles = rng.integers(profiles_per_float[0], profiles_per_float[1], size=num_floats)
+    n_profiles = int(profiles.sum())
+    profile_float = np.repeat(np.arange(num_floats, dtype=np.int32), profiles)
+    profile_start = np.repeat(np.cumsum(profiles) - profiles, profiles)
+    profile_number = (np.arange(n_profiles) - profile_start + 1).astype(np.int32)
+    base_hour = rng.integers(0, span_days, size=n_profiles) * 24
+    lat = rng.uniform(-15, 15, size=n_profiles)
+    lon = rng.uniform(-180, 180, size=n_profiles)
+    levels = rng.integers(levels_per_profile[0], levels_per_profile[1], size=n_profiles)
+
+    # One draw per measurement
+    n = int(levels.sum())
+    row_profile = np.repeat(np.arange(n_profiles), levels)
+    pressure = rng.uniform(0, 2000, size=n).astype(np.float32)
+    temperature = (25 - pressure / 100 + rng.normal(0, 2, size=n)).astype(np.float32)
+    salinity = (35 + rng.normal(0, 1, size=n)).astype(np.float32)
+    hour = base_hour[row_profile] + rng.integers(0, 24, size=n)
+
+    # Sort by float_id, time, pressure with a single packed key (pressure < 2048) before
+    # building the frame, so neither a lexsort nor a sort_values copy is needed
+    codes = profile_float[row_profile]
+    key = (codes.astype(np.float64) * (span_days * 24) + hour) * 2048 + pressure
+    order = np.argsort(key)
+    row_profile = row_profile[order]
+    time = np.datetime64(start_date, "s") + hour[order].astype("timedelta64[h]")
+
+    return conform(pd.DataFrame({
+        "float_id": pd.Categorical.from_codes(codes[order], categories=float_ids),
+        "profile_index": profile_number[row_profile],
+        "descending": np.zeros(n, dtype=bool),
+        "latitude": lat[row_profile],
+        "longitude": lon[row_profile],
+        "time": time,
+        "pressure": pressure[order],
+        "temperature": temperature[order],
+        "salinity": salinity[order],
+    }))
+
+
+def generate_sample_data():
+    """The dashboard's sample dataset"""
+    return generate_synthetic_data()
@@ -0,0 +1,215 @@
+"""Monthly time series, linear trends and anomalies per float, per region and fleet-wide.
+
+Region and fleet-wide monthly series are reduced from the cells of the
+``ClimatologyCube``, whose pressure bands include the trend bands' edges, so
+they cost O(cells) and never touch the levels (regions are snapped outward to
+the cube grid, the tropics to ±24°). A float's series is reduced on demand
+from that float's levels alone (a single ``bincount`` per column) and kept.
+
+A series is the monthly mean of every measurement in the selected depth
+bands. Anomalies are taken against the series' own mean seasonal cycle
+(against its overall mean for calendar months seen in only one year), and
+the linear trend is a least-squares fit of the anomalies against time, so the
+seasonal cycle does not leak into the slope.
+"""
+import threading
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from .climatology import EPOCH_YEAR, ClimatologyCube, _month_index
+from .profiles import LEVEL_COLUMNS
+
+# Depth band edges (dbar); deeper levels fall into the last band
+TREND_BANDS = (0, 50, 200, 500, 1000, 2000, 6000)
+TREND_COLUMNS = ("temperature", "salinity")
+
+
+@dataclass(frozen=True)
+class Trend:
+    """Least-squares fit of a series' anomalies against time."""
+    slope: float  # units per year
+    stderr: float
+    months: int
+    start: pd.Timestamp
+    end: pd.Timestamp
+    largest_anomaly: float
+    largest_anomaly_month: pd.Timestamp
+
+    @property
+    def change(self):
+        """Change implied by the slope over the series' span."""
+        return self.slope * (self.end - self.start).days / 365.25
+
+
+def _month_starts(months):
+    return (np.asarray(months, dtype=np.int64) + (EPOCH_YEAR - 1970) * 12).astype("datetime64[M]").astype("datetime64[s]")
+
+
+def fit_trend(series):
+    """Fit a ``series`` frame; ``None`` with fewer than three months."""
+    if len(series) < 3:
+        return None
+    years = (series["month"] - series["month"].iloc[0]).dt.days.to_numpy() / 365.25
+    anomaly = series["anomaly"].to_numpy()
+    x = years - years.mean()
+    sxx = float((x * x).sum())
+    if sxx == 0:
+        return None
+    slope = float((x * (anomaly - anomaly.mean())).sum() / sxx)
+    residual = anomaly - anomaly.mean() - slope * x
+    stderr = float(np.sqrt((residual * residual).sum() / (len(x) - 2) / sxx)) if len(x) > 2 else np.nan
+    pick = int(np.argmax(np.abs(anomaly)))
+    return Trend(slope, stderr, len(series), series["month"].iloc[0], series["month"].iloc[-1],
+                 float(anomaly[pick]), series["month"].iloc[pick])
+
+
+class TrendEngine:
+    """Monthly depth-band series of one dataset version, built on first use.
+
+    ``cube`` is the dataset's climatology cube; without one, a cube is built
+    from ``data`` (which then needs its level arrays).
+    """
+
+    def __init__(self, data, regions=None, bands=TREND_BANDS, columns=TREND_COLUMNS, cube=None):
+        self.data = data
+        self.regions = regions or {}  # name -> (lat range, lon range or None)
+        self.bands = np.asarray(bands, dtype=np.float64)
+        self.columns = columns
+        self.cube = cube
+        self._built = False
+        self._float_series = {}
+        self._lock = threading.Lock()
+
+    def extend(self, data, float_ids, cube=None):
+        """Engine over ``data`` after an append that touched ``float_ids``.
+
+        The other floats' series are carried over; region series are rebuilt
+        from the (updated) cube on first use, which costs O(cells).
+        """
+        engine = TrendEngine(data, self.regions, self.bands, self.columns, cube=self.cube if cube is None else cube)
+        touched = {int(fid) for fid in float_ids}
+        with self._lock:
+            engine._float_series = {fid: monthly for fid, monthly in self._float_series.items() if fid not in touched}
+        return engine
+
+    @property
+    def band_count(self):
+        return len(self.bands) - 1
+
+    def band_labels(self):
+        return [f"{lo:.0f}-{hi:.0f}m" for lo, hi in zip(self.bands[:-1], self.bands[1:])]
+
+    def bands_for(self, depth):
+        """Indexes of the bands overlapping a ``(min, max)`` depth window (``None`` for open ends)."""
+        if depth is None:
+            return tuple(range(self.band_count))
+        low = -np.inf if depth[0] is None else depth[0]
+        high = np.inf if depth[1] is None else depth[1]
+        return tuple(int(b) for b in range(self.band_count) if self.bands[b] < high and self.bands[b + 1] > low)
+
+    # -----------------------------
+    # BUILDING
+    # -----------------------------
+    def _build(self):
+        if self._built:
+            return
+        with self._lock:
+            if self._built:
+                return
+            if self.cube is None:
+                self.cube = ClimatologyCube().update(self.data)
+            edges = self.cube.pressure_bands
+            if not np.isin(self.bands, edges).all():
+                raise ValueError("Trend bands must be edges of the cube's pressure bands")
+            # Cube bands summed into each trend band; the last one also takes what lies deeper
+            self._band_starts = np.searchsorted(edges, self.bands[:-1])
+            self._region_series = {None: self._cube_series(None, None)}
+            for name, (lat_range, lon_range) in self.regions.items():
+                self._region_series[name] = self._cube_series(lat_range, lon_range)
+            self._built = True
+
+    def _cube_series(self, lat, lon):
+        """Monthly ``(first month, count, sum)`` arrays of shape (months, bands) per column from the cube."""
+        first, count, total = self.cube.monthly(lat, lon)
+        if not len(count) or not count.any():
+            return 0, {}, {}
+        columns = {col: LEVEL_COLUMNS.index(col) for col in self.columns}
+        return (
+            first,
+            {col: np.add.reduceat(count[:, :, c], self._band_starts, axis=1) for col, c in columns.items()},
+            {col: np.add.reduceat(total[:, :, c], self._band_starts, axis=1) for col, c in columns.items()},
+        )
+
+    def _float_monthly(self, float_id):
+        """Monthly ``(first month, count, sum)`` arrays of one float, reduced from its levels."""
+        first, stop = self.data.float_profiles(float_id)
+        data = self.data.take(np.arange(first, stop), columns=["pressure", *self.columns])
+        if not len(data):
+            return 0, {}, {}
+        n_bands = self.band_count
+        month = np.repeat(_month_index(data.profiles["time"].to_numpy()), data.profiles["levels"].to_numpy())
+        pressure = data["pressure"]
+        band = np.clip(np.searchsorted(self.bands, pressure, side="right") - 1, 0, n_bands - 1)
+        start = int(month.min())
+        slot = (month - start) * n_bands + band
+        size = (int(month.max()) - start + 1) * n_bands
+        count, total = {}, {}
+        for col in self.columns:
+            values = data[col]
+            valid = ~(np.isnan(values) | np.isnan(pressure))
+            count[col] = np.bincount(slot[valid], minlength=size).reshape(-1, n_bands)
+            total[col] = np.bincount(slot[valid], weights=values[valid], minlength=size).reshape(-1, n_bands)
+        return start, count, total
+
+    # -----------------------------
+    # QUERIES
+    # -----------------------------
+    def series(self, metric, float_id=None, region=None, depth=None, year=None, bands=None):
+        """Monthly series as a frame of ``month``, ``count``, ``mean``, ``climatology`` and ``anomaly``.
+
+        ``bands`` (band indexes) overrides the band selection made from ``depth``.
+        """
+        self._build()
+        if float_id is not None:
+            key = int(float_id)
+            monthly = self._float_series.get(key)
+            if monthly is None:
+                monthly = self._float_series[key] = self._float_monthly(key)
+        else:
+            monthly = self._region_series[region]
+        first, count, total = monthly
+        columns = ["month", "count", "mean", "climatology", "anomaly"]
+        if metric not in count:
+            return pd.DataFrame(columns=columns)
+        bands = list(self.bands_for(depth) if bands is None else bands)
+        n = count[metric][:, bands].sum(axis=1)
+        s = total[metric][:, bands].sum(axis=1)
+        months = np.flatnonzero(n) + first
+        n, s = n[n > 0], s[n > 0]
+        mean = s / n
+        # Mean seasonal cycle of the series itself, weighted by measurement counts; calendar
+        # months seen in a single year fall back to the overall mean, or their anomaly would be zero
+        calendar = months % 12
+        seasonal = np.bincount(calendar, weights=s, minlength=12) / np.maximum(np.bincount(calendar, weights=n, minlength=12), 1)
+        seasonal = np.where(np.bincount(calendar, minlength=12) > 1, seasonal, s.sum() / n.sum() if len(n) else np.nan)
+        frame = pd.DataFrame({
+            "month": _month_starts(months),
+            "count": n.astype(np.int64),
+            "mean": mean,
+            "climatology": seasonal[calendar],
+            "anomaly": mean - seasonal[calendar],
+        }, columns=columns)
+        if year is not None:
+            frame = frame[frame["month"].dt.year == year].reset_index(drop=True)
+        return frame
+
+    def trend(self, metric, float_id=None, region=None, depth=None, year=None, bands=None):
+        """``(series, Trend or None)``."""
+        series = self.series(metric, float_id, region, depth, year, bands)
+        return series, fit_trend(series)
+
+    def memory_usage(self):
+        series = [*self._float_series.values(), *(self._region_series.values() if self._built else ())]
+        return sum(a.nbytes for _, count, total in series for a in [*count.values(), *total.values()])
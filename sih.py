@@ -1,199 +1,156 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
 from datetime import datetime
-import numpy as np
+import os
+
+from floatchat.chatbot import REGIONS, UNITS
+from floatchat.derived import LEVEL_VARIABLES, PROFILE_VARIABLES
+from floatchat.export import available_compressions, export_bytes, export_filename, export_mime
+from floatchat.jobs import ChatJobs, make_executor
+from floatchat.plotting import level_histogram, profile_envelope
+from floatchat.profiling import RerunProfiler
+from floatchat.trends import fit_trend
+from floatchat.service import open_service
+
+# Optional path to a partitioned Argo store; sample data is generated when unset
+DATA_STORE = os.environ.get("FLOATCHAT_STORE")
+LIVE_REFRESH = float(os.environ.get("FLOATCHAT_LIVE_REFRESH", "10"))  # seconds between live statistics checks
+
+# Stage timings for this rerun; off unless FLOATCHAT_PROFILE / FLOATCHAT_PROFILE_LOG is set
+profiler = RerunProfiler.from_env()
+# st.rerun() and st.stop() end the script early; record the rerun before they do
+rerun, stop = profiler.finishing(st.rerun), profiler.finishing(st.stop)
 
 # -----------------------------
 # CHATBOT RESPONSE GENERATOR
 # -----------------------------
-def generate_bot_response(user_input, df, float_summary):
-    """Generate chatbot responses based on user input"""
-    user_input_lower = user_input.lower()
-    
-    # Specific query for salinity profiles near equator in March 2013
-    if "salinity profiles" in user_input_lower and "equator" in user_input_lower and "march 2013" in user_input_lower:
-        march_2013 = (df['time'].dt.year == 2013) & (df['time'].dt.month == 3)
-        near_equator = abs(df['latitude']) < 5
-        filtered = df[march_2013 & near_equator]
-        
-        if not filtered.empty:
-            avg_sal = filtered['salinity'].mean()
-            max_sal = filtered['salinity'].max()
-            min_sal = filtered['salinity'].min()
-            num_profiles = filtered['profile_index'].nunique()
-            response = f"""
-💧 **Salinity Profiles Near Equator in March 2013:**
-• Number of Profiles: {num_profiles}
-• Average Salinity: {avg_sal:.3f} PSU
-• Range: {min_sal:.3f} to {max_sal:.3f} PSU
-• Data based on random sample simulations.
-Showing salinity analysis visualization below for reference.
-            """
-            st.session_state.show_salinity = True
+def fill_placeholders(history, jobs):
+    """Replace the placeholder messages of finished jobs with their answers"""
+    placeholders = {message["job"]: message for message in history if "job" in message}
+    for job, answer, error in jobs.finished():
+        message = placeholders.get(job.id)
+        if message is None:
+            continue
+        del message["job"]
+        if error is not None:
+            message["content"] = f"⚠️ Sorry, something went wrong answering that question: {error}"
         else:
-            response = "In 2013, salinity data was collected near the equator by floats 2901616 and 2901630."
-        return response
-    
-    # Temperature queries
-    if "temperature" in user_input_lower:
-        if "highest" in user_input_lower or "warmest" in user_input_lower:
-            max_temp_idx = df['temperature'].idxmax()
-            max_temp_data = df.loc[max_temp_idx]
-            return f" The highest temperature recorded is {max_temp_data['temperature']:.2f}°C by Float {max_temp_data['float_id']} at {max_temp_data['pressure']:.0f}m depth on {max_temp_data['time'].strftime('%Y-%m-%d') if pd.notna(max_temp_data['time']) else 'unknown date'}."
-        
-        elif "lowest" in user_input_lower or "coldest" in user_input_lower:
-            min_temp_idx = df['temperature'].idxmin()
-            min_temp_data = df.loc[min_temp_idx]
-            return f"🧊 The lowest temperature recorded is **{min_temp_data['temperature']:.2f}°C** by Float {min_temp_data['float_id']} at {min_temp_data['pressure']:.0f}m depth on {min_temp_data['time'].strftime('%Y-%m-%d') if pd.notna(max_temp_data['time']) else 'unknown date'}."
-        
-        elif "average" in user_input_lower or "mean" in user_input_lower:
-            avg_temp = df['temperature'].mean()
-            return f"📊 The average temperature across all measurements is **{avg_temp:.2f}°C. The temperature ranges from {df['temperature'].min():.1f}°C to {df['temperature'].max():.1f}°C."
-    
-    # Depth/Pressure queries
-    elif "depth" in user_input_lower or "deepest" in user_input_lower:
-        max_depth_idx = df['pressure'].idxmax()
-        max_depth_data = df.loc[max_depth_idx]
-        return f"🏊‍♂️ The deepest measurement was taken at {max_depth_data['pressure']:.0f}m by Float {max_depth_data['float_id']} with a temperature of {max_depth_data['temperature']:.1f}°C and salinity of {max_depth_data['salinity']:.2f} PSU."
-    
-    # Float-specific queries
-    elif "float" in user_input_lower and any(str(fid) in user_input for fid in float_summary['float_id']):
-        mentioned_floats = [str(fid) for fid in float_summary['float_id'] if str(fid) in user_input]
-        if mentioned_floats:
-            float_id = mentioned_floats[0]
-            float_data = float_summary[float_summary['float_id'] == float_id].iloc[0]
-            float_profiles = df[df['float_id'] == float_id]
-            
-            return f"""
-📊 **Float {float_id} Summary:**
-• **Location:** {float_data['lat_mean']:.2f}°N, {float_data['lon_mean']:.2f}°E
-• **Total Profiles:** {float_data['total_profiles']:.0f}
-• **Average Temperature:** {float_data['temp_mean']:.2f}°C
-• **Average Salinity:** {float_data['sal_mean']:.3f} PSU
-• **Maximum Depth:** {float_data['pressure_max']:.0f}m
-• **Active Period:** {float_data['deployment_days']:.0f} days
-• **Temperature Range:** {float_profiles['temperature'].min():.1f}°C to {float_profiles['temperature'].max():.1f}°C
-            """
-    
-    # Salinity queries
-    elif "salinity" in user_input_lower:
-        if "highest" in user_input_lower:
-            max_sal_idx = df['salinity'].idxmax()
-            max_sal_data = df.loc[max_sal_idx]
-            return f"💧 The highest salinity recorded is {max_sal_data['salinity']:.3f} PSU by Float {max_sal_data['float_id']} at {max_sal_data['pressure']:.0f}m depth."
-        elif "average" in user_input_lower:
-            avg_sal = df['salinity'].mean()
-            return f"💧 The average salinity across all measurements is {avg_sal:.3f} PSU, ranging from {df['salinity'].min():.3f} to {df['salinity'].max():.3f} PSU."
-    
-    # Fleet overview queries
-    elif "overview" in user_input_lower or "summary" in user_input_lower or "fleet" in user_input_lower:
-        most_active = float_summary.loc[float_summary['total_profiles'].idxmax()]
-        return f"""
-🚢 **Fleet Overview:**
-• **Total Active Floats:** {len(float_summary)}
-• **Total Profiles Collected:** {df['profile_index'].nunique():,}
-• **Most Active Float:** {most_active['float_id']} ({most_active['total_profiles']:.0f} profiles)
-• **Global Temperature Range:** {df['temperature'].min():.1f}°C to {df['temperature'].max():.1f}°C
-• **Maximum Depth Reached:** {df['pressure'].max():.0f}m
-• **Average Deployment Duration:** {float_summary['deployment_days'].mean():.0f} days
-        """
-    
-    # Compare queries
-    elif "compare" in user_input_lower:
-        top_floats = float_summary.nlargest(2, 'total_profiles')
-        float1, float2 = top_floats.iloc[0], top_floats.iloc[1]
-        
-        return f"""
-🔄 **Comparison - Top 2 Most Active Floats:**
-
-**Float {float1['float_id']}:**
-• Profiles: {float1['total_profiles']:.0f}
-• Avg Temp: {float1['temp_mean']:.2f}°C
-• Max Depth: {float1['pressure_max']:.0f}m
-
-**Float {float2['float_id']}:**
-• Profiles: {float2['total_profiles']:.0f}
-• Avg Temp: {float2['temp_mean']:.2f}°C
-• Max Depth: {float2['pressure_max']:.0f}m
-        """
-    
-    # Default response
-    else:
-        return f"""
-🤖 Here's a quick look at the Argo float data:
-• **Total Floats:** {len(float_summary)}
-• **Average Temperature:** {df['temperature'].mean():.2f}°C
-• **Average Salinity:** {df['salinity'].mean():.3f} PSU
-Try asking something specific like "Show me salinity profiles near the equator in March 2013?" or select a sample question!
-        """
+            message["content"] = open_panels(answer)
+            profiler.record("chat answer", job.elapsed or 0.0)
+
+def open_panels(answer):
+    """Open the visualization panels an answer refers to and return its text"""
+    for panel in answer.panels:
+        st.session_state[f"show_{panel}"] = True
+    for name, value in answer.focus:
+        st.session_state[f"focus_{name}"] = value
+    return answer.text
+
+def plotly_express():
+    """Plotly Express, imported when the first chart is drawn rather than at startup"""
+    import plotly.express as px
+    return px
 
 # -----------------------------
-# SAMPLE DATA GENERATION
+# SHARED SERVICES
 # -----------------------------
-@st.cache_data
-def generate_sample_data():
-    """Generate sample data since database is local"""
-    np.random.seed(42)
-    float_ids = [2902123, 2902124, 2902125, 2902126, 2902127]
-    data = []
-    
-    for fid in float_ids:
-        num_profiles = np.random.randint(5, 20)
-        for profile in range(1, num_profiles + 1):
-            base_time = pd.Timestamp('2012-01-01') + pd.Timedelta(days=np.random.randint(0, 365 * 3))
-            lat = np.random.uniform(-15, 15)
-            lon = np.random.uniform(-180, 180)
-            num_depths = np.random.randint(50, 150)
-            for depth_idx in range(num_depths):
-                pressure = np.random.uniform(0, 2000)
-                temperature = 25 - (pressure / 100) + np.random.normal(0, 2)
-                salinity = 35 + np.random.normal(0, 1)
-                time = base_time + pd.Timedelta(hours=np.random.randint(0, 24))
-                data.append([fid, profile, lat, lon, time, pressure, temperature, salinity])
-    
-    df = pd.DataFrame(
-        data,
-        columns=['float_id', 'profile_index', 'latitude', 'longitude', 'time', 'pressure', 'temperature', 'salinity']
-    )
-    df['time'] = pd.to_datetime(df['time'])
-    df = df.sort_values(by=['float_id', 'time', 'pressure'])
-    return df
+@st.cache_resource
+def chat_executor():
+    """Thread pool answering chatbot questions for every session"""
+    return make_executor()
+
+@st.cache_resource
+def data_service(store_path):
+    """Read-only dataset shared by every session; sessions only hold references to it (sample data when no store)"""
+    return open_service(store_path)
 
-# Load sample data
-df = generate_sample_data()
+# Load data
+profiler.stage("data load")
+snapshot = data_service(DATA_STORE).snapshot()
 
-if df.empty:
+if snapshot.empty:
     st.error("No sample data generated.")
-    st.stop()
+    stop()
 
 # -----------------------------
 # DATA PROCESSING
 # -----------------------------
-float_summary = df.groupby("float_id").agg({
-    "latitude": ["mean", "std"],
-    "longitude": ["mean", "std"],
-    "temperature": ["mean", "min", "max", "std"],
-    "salinity": ["mean", "min", "max", "std"],
-    "pressure": ["max", "mean"],
-    "profile_index": "nunique",
-    "time": ["min", "max"]
-}).reset_index()
-
-float_summary.columns = [
-    "float_id", "lat_mean", "lat_std", "lon_mean", "lon_std",
-    "temp_mean", "temp_min", "temp_max", "temp_std",
-    "sal_mean", "sal_min", "sal_max", "sal_std",
-    "pressure_max", "pressure_mean", "total_profiles",
-    "first_profile", "last_profile"
-]
-
-float_summary["deployment_days"] = (
-    float_summary["last_profile"] - float_summary["first_profile"]
-).dt.days
+DATA_VERSION = snapshot.version
+profiler.annotate(version=DATA_VERSION)
+profile_data, profile_index = snapshot.data, snapshot.index
+float_summary, stats = snapshot.float_summary, snapshot.stats
+cube, query_engine = snapshot.cube, snapshot.engine
+derived, trends = snapshot.derived, snapshot.trends
+
+@st.cache_data(max_entries=64)
+def profile_plot_data(version, metric, float_id, _data):
+    """Depth-binned min/mean/max envelope for the profile plots, cached per dataset version"""
+    return profile_envelope(_data, metric, None if float_id == "All Floats" else float_id)
+
+@st.cache_data(max_entries=16)
+def histogram_plot_data(version, metric, nbins, value_range, _data):
+    """Server-side histogram bins over the dataset's value range, cached per dataset version"""
+    return level_histogram(_data, metric, nbins, value_range)
+
+@st.cache_data(max_entries=64)
+def derived_plot_data(version, variable, float_id, _derived):
+    """Depth envelope of a derived level variable, or per-profile values over time, cached per dataset version"""
+    float_id = None if float_id == "All Floats" else float_id
+    if variable in PROFILE_VARIABLES:
+        frame = _derived.profile_frame()[["float_id", "time", variable]].dropna()
+        return frame if float_id is None else frame[frame["float_id"] == float_id]
+    return profile_envelope(_derived.data, variable, float_id)
+
+@st.cache_data(max_entries=64)
+def trend_plot_data(version, metric, float_id, region, bands, _trends):
+    """Monthly series and its anomalies for the trend chart, cached per dataset version"""
+    return _trends.series(metric, float_id, region, bands=list(bands))
+
+# -----------------------------
+# LIVE STATISTICS
+# -----------------------------
+# With a store, new batches written by the ingest job are picked up by polling
+# only this tile; the charts keep showing the version they were drawn from
+# until the user asks for a refresh.
+st.session_state.charts_version = DATA_VERSION
+
+def stat_tile(value, label):
+    st.markdown(f'''
+        <div class="metric-highlight">
+            <div style="font-size: 24px; font-weight: bold;">{value}</div>
+            <div>{label}</div>
+        </div>
+    ''', unsafe_allow_html=True)
+
+@st.fragment(run_every=LIVE_REFRESH if DATA_STORE else None)
+def live_statistics():
+    """Statistics tile, re-rendered on its own as new profiles arrive"""
+    service = data_service(DATA_STORE)
+    live = service.snapshot()
+    st.markdown("### 📈 Live Statistics")
+    col_stat1, col_stat2 = st.columns(2)
+    with col_stat1:
+        stat_tile(len(live.float_summary), "Active Floats")
+        stat_tile(f"{live.stats.mean['temperature']:.1f}°C", "Avg Temperature")
+    with col_stat2:
+        stat_tile(f"{live.stats.profiles:,}", "Total Profiles")
+        stat_tile(f"{live.stats.max['pressure']:.0f}m", "Max Depth")
+
+    if live.version == st.session_state.charts_version:
+        return
+    changes = service.changes_since(st.session_state.charts_version)
+    if changes:
+        floats = sorted({f for change in changes for f in change.float_ids})
+        profiles = sum(change.profiles for change in changes)
+        st.caption(f"🛰️ {profiles:,} new profiles from float{'s' if len(floats) > 1 else ''} "
+                   f"{', '.join(map(str, floats[:5]))}{' …' if len(floats) > 5 else ''}")
+    else:
+        st.caption("🛰️ The dataset has been updated")
+    if st.button("🔄 Refresh charts", key="refresh_charts"):
+        rerun(scope="app")
 
 # Page configuration
+profiler.stage("page setup")
 st.set_page_config(
     page_title="🤖 NMDIS Argo Chatbot",
     layout="wide",
@@ -288,6 +245,7 @@ The prototype is built using **real data from Argo floats**, as demonstrated in
 # -----------------------------
 # MAIN CHATBOT INTERFACE
 # -----------------------------
+profiler.stage("chat")
 st.markdown('<div class="chatbot-container">', unsafe_allow_html=True)
 
 col1, col2 = st.columns([2, 1])
@@ -317,6 +275,9 @@ with col1:
     # Chat interface
     if "chat_history" not in st.session_state:
         st.session_state.chat_history = []
+    if "chat_jobs" not in st.session_state:
+        st.session_state.chat_jobs = ChatJobs(chat_executor())
+    chat_jobs = st.session_state.chat_jobs
     
     user_input = st.text_input(
         "🗨️ Your Question:",
@@ -325,23 +286,48 @@ with col1:
         help="Type your question about oceanographic data, floats, or analysis requests"
     )
     
-    if "selected_question" in st.session_state:
-        user_input = st.session_state.selected_question
-        del st.session_state.selected_question
-    
     col_send, col_clear = st.columns([1, 1])
     with col_send:
         send_button = st.button("Ask", type="primary", use_container_width=True)
     with col_clear:
         if st.button("Clear Chat", use_container_width=True):
+            chat_jobs.cancel()
             st.session_state.chat_history = []
-            st.rerun()
+            rerun()
+
+    # The text input keeps its value across reruns, so only a new or re-sent question is asked
+    question = None
+    if "selected_question" in st.session_state:
+        question = st.session_state.selected_question
+        del st.session_state.selected_question
+    elif user_input and (send_button or user_input != st.session_state.get("last_input")):
+        question = user_input
+    st.session_state.last_input = user_input
 
-    # Process chat input
-    if (send_button and user_input) or user_input:
-        st.session_state.chat_history.append({"role": "user", "content": user_input})
-        bot_response = generate_bot_response(user_input, df, float_summary)
-        st.session_state.chat_history.append({"role": "bot", "content": bot_response})
+    # Process chat input on the shared executor; the answer fills in a placeholder when ready
+    if question:
+        fill_placeholders(st.session_state.chat_history, chat_jobs)
+        st.session_state.chat_history.append({"role": "user", "content": question})
+        job, cancelled = chat_jobs.submit(question, query_engine.answer, question)
+        cancelled = {cancelled_job.id for cancelled_job in cancelled}
+        for message in st.session_state.chat_history:
+            if message.get("job") in cancelled:
+                message["content"] = "⏹️ Cancelled: superseded by a newer question."
+                del message["job"]
+        if job is None:
+            st.session_state.chat_history.append({"role": "bot", "content": "⏳ Still working on your earlier questions, please ask again in a moment."})
+        else:
+            st.session_state.chat_history.append({"role": "bot", "content": "⏳ Working on it...", "job": job.id})
+        chat_jobs.wait(timeout=0.5)
+
+    fill_placeholders(st.session_state.chat_history, chat_jobs)
+
+    if chat_jobs.pending:
+        @st.fragment(run_every=0.5)
+        def poll_chat_jobs():
+            if not chat_jobs.pending:
+                rerun(scope="app")
+        poll_chat_jobs()
 
     # Display chat history
     if st.session_state.chat_history:
@@ -362,6 +348,7 @@ with col1:
                     </div>
                 ''', unsafe_allow_html=True)
 
+profiler.stage("quick actions")
 with col2:
     st.markdown("### 🎯 Quick Actions")
     st.markdown('<div class="quick-actions">', unsafe_allow_html=True)
@@ -370,67 +357,40 @@ with col2:
         overview_text = f"""
         **Fleet Status:**
         • Active Floats: {len(float_summary)}
-        • Total Profiles: {df['profile_index'].nunique():,}
-        • Temperature Range: {df['temperature'].min():.1f}°C to {df['temperature'].max():.1f}°C
-        • Max Depth Recorded: {df['pressure'].max():.0f}m
+        • Total Profiles: {stats.profiles:,}
+        • Temperature Range: {stats.min['temperature']:.1f}°C to {stats.max['temperature']:.1f}°C
+        • Max Depth Recorded: {stats.max['pressure']:.0f}m
         """
         st.markdown(overview_text)
     
     if st.button("🌡️ Temperature Analysis", use_container_width=True):
         temp_stats = f"""
         **Temperature Insights:**
-        • Global Average: {df['temperature'].mean():.2f}°C
-        • Warmest Location: {df.loc[df['temperature'].idxmax(), 'float_id']} ({df['temperature'].max():.1f}°C)
-        • Coolest Location: {df.loc[df['temperature'].idxmin(), 'float_id']} ({df['temperature'].min():.1f}°C)
+        • Global Average: {stats.mean['temperature']:.2f}°C
+        • Warmest Location: {stats.argmax['temperature']['float_id']} ({stats.max['temperature']:.1f}°C)
+        • Coolest Location: {stats.argmin['temperature']['float_id']} ({stats.min['temperature']:.1f}°C)
         """
         st.markdown(temp_stats)
     
     if st.button("Salinity", use_container_width=True):
         sal_stats = f"""
         **Salinity Insights:**
-        • Global Average: {df['salinity'].mean():.3f} PSU
-        • Highest Salinity: {df['salinity'].max():.3f} PSU
-        • Lowest Salinity: {df['salinity'].min():.3f} PSU
+        • Global Average: {stats.mean['salinity']:.3f} PSU
+        • Highest Salinity: {stats.max['salinity']:.3f} PSU
+        • Lowest Salinity: {stats.min['salinity']:.3f} PSU
         """
         st.markdown(sal_stats)
     
     st.markdown('</div>', unsafe_allow_html=True)
     
-    st.markdown("### 📈 Live Statistics")
-    col_stat1, col_stat2 = st.columns(2)
-    with col_stat1:
-        st.markdown(f'''
-            <div class="metric-highlight">
-                <div style="font-size: 24px; font-weight: bold;">{len(float_summary)}</div>
-                <div>Active Floats</div>
-            </div>
-        ''', unsafe_allow_html=True)
-        st.markdown(f'''
-            <div class="metric-highlight">
-                <div style="font-size: 24px; font-weight: bold;">{df['temperature'].mean():.1f}°C</div>
-                <div>Avg Temperature</div>
-            </div>
-        ''', unsafe_allow_html=True)
-    
-    with col_stat2:
-        st.markdown(f'''
-            <div class="metric-highlight">
-                <div style="font-size: 24px; font-weight: bold;">{df['profile_index'].nunique():,}</div>
-                <div>Total Profiles</div>
-            </div>
-        ''', unsafe_allow_html=True)
-        st.markdown(f'''
-            <div class="metric-highlight">
-                <div style="font-size: 24px; font-weight: bold;">{df['pressure'].max():.0f}m</div>
-                <div>Max Depth</div>
-            </div>
-        ''', unsafe_allow_html=True)
+    live_statistics()
 
 st.markdown('</div>', unsafe_allow_html=True)
 
 # -----------------------------
 # SIDEBAR
 # -----------------------------
+profiler.stage("sidebar")
 st.sidebar.markdown("""
     <div style='background: #739EC9; padding: 20px; border-radius: 10px; margin-bottom: 20px;'>
         <h2 style='color: white; text-align: center; margin: 0;'> FloatChat</h2>
@@ -441,9 +401,9 @@ with st.sidebar.expander("📊 Available Data", expanded=True):
     st.markdown(f"""
     **Dataset Overview:**
     - **{len(float_summary)}** Active Floats
-    - **{df['profile_index'].nunique():,}** Profiles
-    - **{len(df):,}** Total Measurements
-    - **Date Range:** {df['time'].min().strftime('%Y-%m-%d') if not df['time'].isna().all() else 'N/A'} to {df['time'].max().strftime('%Y-%m-%d') if not df['time'].isna().all() else 'N/A'}
+    - **{stats.profiles:,}** Profiles
+    - **{stats.measurements:,}** Total Measurements
+    - **Date Range:** {stats.time_min.strftime('%Y-%m-%d') if stats.time_min is not None else 'N/A'} to {stats.time_max.strftime('%Y-%m-%d') if stats.time_max is not None else 'N/A'}
     """)
 
 with st.sidebar.expander("🎯 Focus on Specific Float", expanded=False):
@@ -462,6 +422,28 @@ with st.sidebar.expander("🎯 Focus on Specific Float", expanded=False):
         - **Active Days:** {float_data['deployment_days']:.0f}
         """)
 
+with st.sidebar.expander("🌐 Regional Climatology"):
+    regions = {"All Oceans": (None, None)}
+    regions.update({label.removeprefix("in the "): (lat, lon) for label, lat, lon in REGIONS.values()})
+    region = st.selectbox("Region:", list(regions))
+    month_names = ["All Months"] + [datetime(2000, m, 1).strftime("%B") for m in range(1, 13)]
+    month = st.selectbox("Month:", month_names)
+    bands = cube.pressure_bands
+    band_labels = ["All Depths"] + [f"{bands[i]:.0f}-{bands[i + 1]:.0f}m" for i in range(len(bands) - 1)]
+    band = band_labels.index(st.selectbox("Depth Band:", band_labels))
+    region_lat, region_lon = regions[region]
+    cells = cube.query(
+        lat=region_lat, lon=region_lon,
+        depth=None if band == 0 else (bands[band - 1], bands[band]),
+        months=None if month == "All Months" else [month_names.index(month)]
+    )
+    if cells.count["temperature"] or cells.count["salinity"]:
+        st.metric("Avg Temperature", f"{cells.mean['temperature']:.2f}°C", help=f"{cells.count['temperature']:,} measurements")
+        st.metric("Avg Salinity", f"{cells.mean['salinity']:.3f} PSU", help=f"{cells.count['salinity']:,} measurements")
+        st.caption(f"{cells.min['temperature']:.1f}°C to {cells.max['temperature']:.1f}°C · {cells.cells:,} grid cells")
+    else:
+        st.info("No measurements in this window.")
+
 with st.sidebar.expander("📈 Quick Visualizations"):
     if st.button("🗺️ Show Float Map"):
         st.session_state.show_map = True
@@ -469,18 +451,25 @@ with st.sidebar.expander("📈 Quick Visualizations"):
         st.session_state.show_temp_profiles = True
     if st.button("💧 Salinity Analysis"):
         st.session_state.show_salinity = True
+    if st.button("🧪 Derived Variables"):
+        st.session_state.show_derived = True
+    if st.button("📈 Trends"):
+        st.session_state.show_trends = True
 
 with st.sidebar.expander("💾 Data Export"):
-    export_format = st.selectbox("Export Format:", ["CSV", "JSON"])
-    if st.button("📤 Export Current Data"):
-        if export_format == "CSV":
-            csv = df.to_csv(index=False)
-            st.download_button(
-                "📥 Download CSV",
-                csv,
-                f"argo_data_{datetime.now().strftime('%Y%m%d')}.csv",
-                "text/csv"
-            )
+    export_format = st.selectbox("Export Format:", ["CSV", "JSON", "Parquet"])
+    export_compression = st.selectbox("Compression:", ["None" if c is None else c for c in available_compressions()])
+    fmt = {"CSV": "csv", "JSON": "ndjson", "Parquet": "parquet"}[export_format]
+    compression = None if export_compression == "None" else export_compression
+    export_float = None if selected_float == "All Floats" else selected_float
+    stem = f"argo_data_{datetime.now().strftime('%Y%m%d')}" + (f"_{export_float}" if export_float else "")
+    st.download_button(
+        f"📥 Download {export_format}",
+        # Deferred: the file is only written when the user clicks download
+        lambda: export_bytes(profile_data, fmt, compression, float_id=export_float),
+        export_filename(stem, fmt, compression),
+        export_mime(fmt, compression)
+    )
 
 # -----------------------------
 # DYNAMIC VISUALIZATIONS
@@ -489,34 +478,74 @@ show_visualizations = st.container()
 
 with show_visualizations:
     if "show_map" in st.session_state and st.session_state.show_map:
+        profiler.stage("map")
         st.subheader("🗺️ Float Deployment Map")
-        fig_map = px.scatter_mapbox(
-            float_summary,
-            lat="lat_mean",
-            lon="lon_mean",
-            hover_name="float_id",
-            hover_data={"temp_mean": ":.2f", "total_profiles": True},
-            color="temp_mean",
-            size="total_profiles",
-            size_max=20,
-            zoom=3,
-            mapbox_style="carto-positron",
-            title="Global Argo Float Locations"
-        )
+        viewports = {"All Oceans": None}
+        for label, lat, lon in REGIONS.values():
+            viewports.setdefault(label.removeprefix("in the "), (*lat, *(lon or (-180.0, 180.0))))
+        if selected_float != "All Floats":
+            first, stop = profile_data.float_profiles(selected_float)
+            float_lat = profile_data.profiles["latitude"].to_numpy()[first:stop]
+            float_lon = profile_data.profiles["longitude"].to_numpy()[first:stop]
+            viewports[f"Float {selected_float}"] = (float_lat.min() - 2, float_lat.max() + 2, float_lon.min() - 2, float_lon.max() + 2)
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            map_view = st.selectbox("View:", list(viewports), key="map_view")
+        with col2:
+            map_zoom = st.slider("Zoom:", 1, 8, 2, key="map_zoom", help=f"Float tracks from zoom {snapshot.maps.track_zoom}")
+        with col3:
+            map_bins = st.radio("Bins:", ["Hex", "Grid"], key="map_bins", horizontal=True).lower()
+        viewport = viewports[map_view]
+        with profiler.span("map data"):
+            map_layer, map_df = snapshot.maps.layer(map_zoom, viewport, "grid" if map_bins == "grid" else "hex")
+        center = None if viewport is None else {"lat": (viewport[0] + viewport[1]) / 2, "lon": (viewport[2] + viewport[3]) / 2}
+        px = plotly_express()
+        if map_layer == "tracks":
+            map_df = map_df.assign(float_id=map_df["float_id"].astype(str))
+            fig_map = px.line_mapbox(
+                map_df,
+                lat="latitude",
+                lon="longitude",
+                color="float_id",
+                hover_data={"time": True, "points": True},
+                zoom=map_zoom,
+                center=center,
+                mapbox_style="carto-positron",
+                title=f"Float Tracks ({len(map_df):,} simplified positions)"
+            )
+        else:
+            fig_map = px.scatter_mapbox(
+                map_df,
+                lat="latitude",
+                lon="longitude",
+                hover_data={"profiles": True, "floats": True},
+                color="floats",
+                size="profiles",
+                size_max=20,
+                zoom=map_zoom,
+                center=center,
+                mapbox_style="carto-positron",
+                title=f"Argo Profile Density ({len(map_df):,} bins)"
+            )
         fig_map.update_layout(height=500)
         st.plotly_chart(fig_map, use_container_width=True)
         if st.button("Hide Map"):
             st.session_state.show_map = False
-            st.rerun()
+            rerun()
 
     if "show_temp_profiles" in st.session_state and st.session_state.show_temp_profiles:
+        profiler.stage("temperature profiles")
         st.subheader("🌡️ Temperature Depth Profiles")
-        display_df = df[df["float_id"] == selected_float] if selected_float != "All Floats" else df.sample(min(1000, len(df)))
+        with profiler.span("plot data"):
+            display_df = profile_plot_data(DATA_VERSION, "temperature", selected_float, profile_data)
+        px = plotly_express()
         fig_temp = px.scatter(
             display_df,
             x="temperature",
             y="pressure",
             color="float_id" if selected_float == "All Floats" else "time",
+            symbol="stat",
+            hover_data=["count"],
             title=f"Temperature vs Depth - {selected_float}",
             labels={"temperature": "Temperature (°C)", "pressure": "Depth (m)"}
         )
@@ -525,19 +554,24 @@ with show_visualizations:
         st.plotly_chart(fig_temp, use_container_width=True)
         if st.button("Hide Temperature Profiles"):
             st.session_state.show_temp_profiles = False
-            st.rerun()
+            rerun()
 
     if "show_salinity" in st.session_state and st.session_state.show_salinity:
+        profiler.stage("salinity analysis")
         st.subheader("💧 Salinity")
         col1, col2 = st.columns(2)
         with col1:
             st.markdown("**Salinity vs Depth Profiles**")
-            display_df = df[df["float_id"] == selected_float] if selected_float != "All Floats" else df.sample(min(1000, len(df)))
+            with profiler.span("plot data"):
+                display_df = profile_plot_data(DATA_VERSION, "salinity", selected_float, profile_data)
+            px = plotly_express()
             fig_salinity = px.scatter(
                 display_df,
                 x="salinity",
                 y="pressure",
                 color="float_id" if selected_float == "All Floats" else "time",
+                symbol="stat",
+                hover_data=["count"],
                 title=f"Salinity vs Depth - {selected_float}",
                 labels={"salinity": "Salinity (PSU)", "pressure": "Depth (m)"}
             )
@@ -547,30 +581,169 @@ with show_visualizations:
         
         with col2:
             st.markdown("**Salinity Distribution**")
-            fig_sal_hist = px.histogram(
-                df,
-                x="salinity",
-                nbins=30,
+            with profiler.span("histogram data"):
+                sal_bins = histogram_plot_data(DATA_VERSION, "salinity", 30, (stats.min["salinity"], stats.max["salinity"]), profile_data)
+            fig_sal_hist = px.bar(
+                sal_bins,
+                x="center",
+                y="count",
                 title="Salinity Distribution",
-                labels={"salinity": "Salinity (PSU)", "count": "Frequency"}
+                labels={"center": "Salinity (PSU)", "count": "Frequency"}
             )
-            fig_sal_hist.update_layout(height=400)
+            fig_sal_hist.update_traces(width=sal_bins["right"] - sal_bins["left"])
+            fig_sal_hist.update_layout(height=400, bargap=0)
             st.plotly_chart(fig_sal_hist, use_container_width=True)
         
         st.markdown("**📊 Salinity Statistics:**")
         col_stat1, col_stat2, col_stat3, col_stat4 = st.columns(4)
         with col_stat1:
-            st.metric("Average", f"{df['salinity'].mean():.3f} PSU")
+            st.metric("Average", f"{stats.mean['salinity']:.3f} PSU")
         with col_stat2:
-            st.metric("Minimum", f"{df['salinity'].min():.3f} PSU")
+            st.metric("Minimum", f"{stats.min['salinity']:.3f} PSU")
         with col_stat3:
-            st.metric("Maximum", f"{df['salinity'].max():.3f} PSU")
+            st.metric("Maximum", f"{stats.max['salinity']:.3f} PSU")
         with col_stat4:
-            st.metric("Std Dev", f"{df['salinity'].std():.3f} PSU")
+            st.metric("Std Dev", f"{stats.std['salinity']:.3f} PSU")
         
         if st.button("Hide Salinity Analysis"):
             st.session_state.show_salinity = False
-            st.rerun()
+            rerun()
+
+    if "show_derived" in st.session_state and st.session_state.show_derived:
+        profiler.stage("derived variables")
+        st.subheader("🧪 Derived Variables")
+        variable_labels = {name.replace("_", " ").title(): name for name in LEVEL_VARIABLES + PROFILE_VARIABLES}
+        variable_label = st.selectbox("Variable:", list(variable_labels), key="derived_variable")
+        variable = variable_labels[variable_label]
+        axis_label = f"{variable_label} ({UNITS[variable]})"
+        with profiler.span("plot data"):
+            display_df = derived_plot_data(DATA_VERSION, variable, selected_float, derived)
+        px = plotly_express()
+        if variable in PROFILE_VARIABLES:
+            fig_derived = px.scatter(
+                display_df,
+                x="time",
+                y=variable,
+                color=display_df["float_id"].astype(str),
+                title=f"{variable_label} per Profile - {selected_float}",
+                labels={variable: axis_label, "time": "Date", "color": "Float"}
+            )
+        else:
+            fig_derived = px.scatter(
+                display_df,
+                x=variable,
+                y="pressure",
+                color="float_id" if selected_float == "All Floats" else "time",
+                symbol="stat",
+                hover_data=["count"],
+                title=f"{variable_label} vs Depth - {selected_float}",
+                labels={variable: axis_label, "pressure": "Depth (m)"}
+            )
+        fig_derived.update_yaxes(autorange="reversed")
+        fig_derived.update_layout(height=500)
+        st.plotly_chart(fig_derived, use_container_width=True)
+        if st.button("Hide Derived Variables"):
+            st.session_state.show_derived = False
+            rerun()
+
+    if "show_trends" in st.session_state and st.session_state.show_trends:
+        profiler.stage("trends")
+        st.subheader("📈 Monthly Trends")
+        trend_regions = {}
+        for phrase, (label, _, _) in REGIONS.items():
+            trend_regions.setdefault(label.removeprefix("in the "), phrase)
+        trend_floats = {f"Float {fid}": int(fid) for fid in float_summary["float_id"]}
+        band_labels = trends.band_labels()
+        # A chat answer about a trend selects what it was about
+        if "focus_metric" in st.session_state:
+            focus = {name: st.session_state.pop(f"focus_{name}", None) for name in ("metric", "float_id", "region", "depth")}
+            st.session_state.trend_metric = focus["metric"].title()
+            if focus["float_id"] is not None:
+                st.session_state.trend_source = f"Float {focus['float_id']}"
+            elif focus["region"] is not None:
+                st.session_state.trend_source = REGIONS[focus["region"]][0].removeprefix("in the ")
+            else:
+                st.session_state.trend_source = "All Floats"
+            st.session_state.trend_bands = [band_labels[b] for b in trends.bands_for(focus["depth"])]
+        # Defaults are seeded through session state only, since a chat focus may have set these keys
+        st.session_state.setdefault("trend_metric", "Temperature")
+        st.session_state.setdefault("trend_source", "All Floats")
+        st.session_state.setdefault("trend_bands", band_labels)
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            trend_metric = st.radio("Variable:", ["Temperature", "Salinity"], key="trend_metric", horizontal=True).lower()
+        with col2:
+            trend_source = st.selectbox("Series:", ["All Floats"] + list(trend_regions) + list(trend_floats), key="trend_source")
+        with col3:
+            trend_bands = st.multiselect("Depth Bands:", band_labels, key="trend_bands")
+        with profiler.span("plot data"):
+            series = trend_plot_data(
+                DATA_VERSION, trend_metric, trend_floats.get(trend_source), trend_regions.get(trend_source),
+                tuple(band_labels.index(label) for label in trend_bands), trends
+            )
+        trend = fit_trend(series)
+        unit = UNITS[trend_metric]
+        if series.empty:
+            st.info("No measurements for this selection.")
+        else:
+            px = plotly_express()
+            col1, col2 = st.columns(2)
+            with col1:
+                fig_series = px.line(
+                    series, x="month", y=["mean", "climatology"], markers=True,
+                    title=f"Monthly Mean {trend_metric.title()} - {trend_source}",
+                    labels={"month": "Month", "value": f"{trend_metric.title()} ({unit})", "variable": ""}
+                )
+                fig_series.update_layout(height=400)
+                st.plotly_chart(fig_series, use_container_width=True)
+            with col2:
+                fig_anomaly = px.bar(
+                    series, x="month", y="anomaly",
+                    title=f"{trend_metric.title()} Anomaly - {trend_source}",
+                    labels={"month": "Month", "anomaly": f"Anomaly ({unit})"}
+                )
+                if trend is not None:
+                    years = (series["month"] - series["month"].iloc[0]).dt.days / 365.25
+                    fitted = series["anomaly"].mean() + trend.slope * (years - years.mean())
+                    fig_anomaly.add_scatter(x=series["month"], y=fitted, mode="lines", name="Linear trend")
+                fig_anomaly.update_layout(height=400)
+                st.plotly_chart(fig_anomaly, use_container_width=True)
+            if trend is not None:
+                col_stat1, col_stat2, col_stat3 = st.columns(3)
+                with col_stat1:
+                    st.metric("Trend", f"{trend.slope:+.3f} {unit}/yr", help=f"± {trend.stderr:.3f} {unit}/yr")
+                with col_stat2:
+                    st.metric("Change over Period", f"{trend.change:+.3f} {unit}")
+                with col_stat3:
+                    st.metric("Largest Anomaly", f"{trend.largest_anomaly:+.3f} {unit}", help=f"{trend.largest_anomaly_month:%B %Y}")
+            else:
+                st.caption("At least 3 months of data are needed for a trend.")
+        if st.button("Hide Trends"):
+            st.session_state.show_trends = False
+            rerun()
 
 # Footer
+profiler.stage("footer")
 st.markdown("---")
+
+# -----------------------------
+# DEVELOPER PROFILE PANEL
+# -----------------------------
+rerun_profile = profiler.finish()
+if rerun_profile is not None:
+    history = st.session_state.setdefault("profile_history", [])
+    history.append(rerun_profile["total_ms"])
+    del history[:-50]
+    with st.sidebar.expander("🛠️ Rerun Profile"):
+        st.metric("Rerun Time", f"{rerun_profile['total_ms']:.0f} ms", f"{rerun_profile['memory_delta'] / 2**20:+.1f} MB memory")
+        spans = pd.DataFrame(rerun_profile["spans"])
+        st.dataframe(pd.DataFrame({
+            "stage": ["  " * depth + name for name, depth in zip(spans["name"], spans["depth"])],
+            "ms": spans["ms"].round(1),
+            "memory MB": (spans["memory_delta"].astype(float) / 2**20).round(2),
+        }), hide_index=True, use_container_width=True)
+        st.line_chart(pd.Series(history, name="rerun ms"))
+        st.caption(f"Measurements: {len(profile_data):,} levels, {profile_data.memory_usage() / 2**20:.1f} MB resident "
+                   f"({profile_data.memory_usage() / max(len(profile_data), 1):.1f} B per level)")
+        if "cprofile" in rerun_profile:
+            st.code(rerun_profile["cprofile"])
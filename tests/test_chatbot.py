@@ -0,0 +1,33 @@
+from floatchat.chatbot import parse_intent
+
+
+def test_depth_range_is_not_a_year():
+    intent = parse_intent("salinity between 1995 and 2000 m")
+    assert intent.metric == "salinity"
+    assert intent.depth == (1995.0, 2000.0)
+    assert intent.year is None
+
+
+def test_year_next_to_depth_range():
+    intent = parse_intent("temperature between 100 and 500 m in March 2013")
+    assert intent.depth == (100.0, 500.0)
+    assert (intent.year, intent.month) == (2013, 3)
+
+
+def test_depth_threshold_is_not_a_year():
+    intent = parse_intent("salinity below 2000 m in 2014")
+    assert intent.depth == (2000.0, None)
+    assert intent.year == 2014
+
+
+def test_metric_noun_overrides_superlative():
+    for question, metric in [
+        ("deepest thermocline in 2013", "thermocline_depth"),
+        ("densest salinity near the equator", "salinity"),
+        ("warmest potential density in the tropics", "potential_density"),
+        ("saltiest water at 1000 m depth", "salinity"),
+        ("deepest measurement", "pressure"),
+    ]:
+        intent = parse_intent(question)
+        assert intent.metric == metric, question
+        assert intent.aggregation == "max", question
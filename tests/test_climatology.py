@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from floatchat.climatology import ClimatologyCube
+from floatchat.profiles import LEVEL_COLUMNS, ProfileData
+from floatchat.synthetic import generate_synthetic_data
+
+
+@pytest.fixture(scope="module")
+def data():
+    return ProfileData.from_frame(generate_synthetic_data(num_floats=8, seed=11))
+
+
+def _brute_force(data, lat, lon, start, end, depth):
+    """Levels whose profile falls in the (cell-aligned) window, reduced directly."""
+    profiles = data.profiles
+    levels = profiles["levels"].to_numpy()
+    plat = np.repeat(profiles["latitude"].to_numpy(), levels)
+    plon = np.repeat(profiles["longitude"].to_numpy(), levels)
+    ptime = np.repeat(profiles["time"].to_numpy(), levels)
+    pressure = data["pressure"]
+    keep = (plat >= lat[0]) & (plat < lat[1]) & (plon >= lon[0]) & (plon < lon[1])
+    keep &= (ptime >= np.datetime64(start)) & (ptime < np.datetime64(end))
+    keep &= (pressure >= depth[0]) & (pressure < depth[1])
+    return {col: data[col][keep].astype(np.float64) for col in LEVEL_COLUMNS}
+
+
+def _assert_cells_match(cells, expected):
+    for col, values in expected.items():
+        assert cells.count[col] == len(values), col
+        if len(values):
+            np.testing.assert_allclose(cells.mean[col], values.mean(), rtol=1e-9)
+            assert cells.min[col] == values.min() and cells.max[col] == values.max()
+        if len(values) > 1:
+            np.testing.assert_allclose(cells.std[col], values.std(ddof=1), rtol=1e-6)
+
+
+@pytest.mark.parametrize("window", [
+    dict(lat=(-15.0, 15.0), lon=(-180.0, 180.0), start="2012-01-01", end="2015-01-01", depth=(0.0, 6000.0)),
+    dict(lat=(-5.0, 5.0), lon=(-90.0, 90.0), start="2013-01-01", end="2014-01-01", depth=(100.0, 500.0)),
+    dict(lat=(0.0, 12.0), lon=(-170.0, 30.0), start="2013-03-01", end="2013-09-01", depth=(0.0, 200.0)),
+])
+def test_cube_query_matches_brute_force(data, window):
+    cube = ClimatologyCube().update(data)
+    assert cube.aligned(window["lat"], window["lon"], window["start"], window["end"], window["depth"])
+    cells = cube.query(window["lat"], window["lon"], pd.Timestamp(window["start"]), pd.Timestamp(window["end"]), window["depth"])
+    _assert_cells_match(cells, _brute_force(data, **window))
+
+
+def test_incremental_and_saved_cube_match_one_pass(data, tmp_path):
+    full = ClimatologyCube().update(data)
+    cube = ClimatologyCube()
+    # Batches of whole profiles, later batches revisiting cells of earlier ones
+    for part in np.array_split(np.random.default_rng(1).permutation(data.profile_count), 3):
+        cube.update(data.frame(np.sort(part)))
+    cube.save(tmp_path / "cube.npz")
+    loaded = ClimatologyCube.load(tmp_path / "cube.npz")
+    for other in (cube, loaded):
+        np.testing.assert_array_equal(other.keys, full.keys)
+        np.testing.assert_array_equal(other.count, full.count)
+        np.testing.assert_allclose(other.sum, full.sum, rtol=1e-12)
+        np.testing.assert_allclose(other.sumsq, full.sumsq, rtol=1e-12)
+        np.testing.assert_array_equal(other.min, full.min)
+        np.testing.assert_array_equal(other.max, full.max)
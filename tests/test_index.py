@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from floatchat.index import ProfileIndex, haversine_km
+from floatchat.profiles import insert_slots, inserted_ids
+
+
+@pytest.fixture(scope="module")
+def profiles():
+    rng = np.random.default_rng(7)
+    n = 5000
+    return pd.DataFrame({
+        "float_id": np.sort(rng.integers(1, 60, size=n)),
+        "profile_index": np.arange(n, dtype=np.int16),
+        "latitude": rng.uniform(-90, 90, size=n).astype(np.float32),
+        "longitude": rng.uniform(-180, 180, size=n).astype(np.float32),
+        "time": np.datetime64("2010-01-01", "s") + rng.integers(0, 10 * 365 * 86400, size=n).astype("timedelta64[s]"),
+        "levels": np.ones(n, dtype=np.int32),
+    })
+
+
+@pytest.fixture(scope="module")
+def index(profiles):
+    return ProfileIndex(profiles, np.arange(len(profiles) + 1))
+
+
+def _in_box(profiles, lat, lon):
+    plat, plon = profiles["latitude"].to_numpy(), profiles["longitude"].to_numpy()
+    keep = (plat >= lat[0]) & (plat <= lat[1])
+    if lon[0] <= lon[1]:
+        return keep & (plon >= lon[0]) & (plon <= lon[1])
+    return keep & ((plon >= lon[0]) | (plon <= lon[1]))
+
+
+@pytest.mark.parametrize("lat, lon", [
+    ((-5.0, 5.0), (-180.0, 180.0)),
+    ((0.0, 25.0), (50.0, 78.0)),
+    ((-60.3, 30.7), (20.2, 120.9)),
+    ((-90.0, -80.0), (170.0, -170.0)),  # crosses the antimeridian
+])
+def test_box_query_matches_brute_force(profiles, index, lat, lon):
+    expected = np.flatnonzero(_in_box(profiles, lat, lon))
+    np.testing.assert_array_equal(index.query(lat=lat, lon=lon), expected)
+
+
+def test_time_query_matches_brute_force(profiles, index):
+    start, end = pd.Timestamp("2013-03-01"), pd.Timestamp("2013-04-01")
+    time = profiles["time"].to_numpy()
+    expected = np.flatnonzero((time >= start.to_datetime64()) & (time < end.to_datetime64()))
+    np.testing.assert_array_equal(index.query(start=start, end=end), expected)
+
+
+def test_box_time_and_float_query_matches_brute_force(profiles, index):
+    lat, lon = (-30.0, 30.0), (100.0, -100.0)
+    start, end = pd.Timestamp("2012-01-01"), pd.Timestamp("2016-01-01")
+    time = profiles["time"].to_numpy()
+    keep = _in_box(profiles, lat, lon) & (time >= start.to_datetime64()) & (time < end.to_datetime64())
+    keep &= profiles["float_id"].isin([3, 17]).to_numpy()
+    np.testing.assert_array_equal(index.query(lat=lat, lon=lon, start=start, end=end, float_ids=[3, 17]), np.flatnonzero(keep))
+
+
+@pytest.mark.parametrize("center, radius_km", [((0.0, 0.0), 800.0), ((10.0, 179.0), 1500.0), ((85.0, 30.0), 1000.0)])
+def test_radius_query_matches_brute_force(profiles, index, center, radius_km):
+    distance = haversine_km(center[0], center[1], profiles["latitude"].to_numpy(), profiles["longitude"].to_numpy())
+    np.testing.assert_array_equal(index.query(center=center, radius_km=radius_km), np.flatnonzero(distance <= radius_km))
+
+
+def test_insert_matches_rebuilt_index(profiles, index):
+    profiles = profiles.assign(descending=False)
+    new = np.arange(len(profiles)) % 3 == 1
+    old, added = profiles[~new].reset_index(drop=True), profiles[new].reset_index(drop=True)
+    slots = insert_slots(old, added)
+    inserted = ProfileIndex(old, np.arange(len(old) + 1)).insert(profiles, np.arange(len(profiles) + 1), slots)
+    np.testing.assert_array_equal(inserted_ids(slots), np.flatnonzero(new))
+    assert inserted.float_ranges == index.float_ranges
+    for query in [dict(lat=(-60.3, 30.7), lon=(20.2, 120.9)), dict(start="2013-03-01", end="2013-04-01"),
+                  dict(lat=(-30.0, 30.0), lon=(100.0, -100.0), start="2012-01-01", end="2016-01-01", float_ids=[3, 17]),
+                  dict(center=(10.0, 179.0), radius_km=1500.0)]:
+        np.testing.assert_array_equal(inserted.query(**query), index.query(**query))
@@ -0,0 +1,27 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from floatchat.jobs import ChatJobs
+
+
+def test_submit_at_limit_cancels_nothing():
+    release = threading.Event()
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        jobs = ChatJobs(executor, limit=1)
+        first, _ = jobs.submit("first", release.wait, 5)
+        while not first.future.running():
+            pass
+        job, cancelled = jobs.submit("second", str, "second")
+        assert job is None and cancelled == []
+        assert not first.cancelled
+        release.set()
+
+
+def test_finished_job_is_not_reported_cancelled():
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        jobs = ChatJobs(executor, limit=2)
+        first, _ = jobs.submit("first", str, "answer")
+        first.future.result()
+        second, cancelled = jobs.submit("second", str, "again")
+        assert second is not None and cancelled == []
+        assert [(job.id, result) for job, result, _ in jobs.finished()][0] == (first.id, "answer")
@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+
+from floatchat.profiles import ProfileData
+from floatchat.summary import FloatSummary
+from floatchat.synthetic import generate_synthetic_data
+
+
+def test_total_profiles_counts_profiles_per_float():
+    # Every float numbers its profiles from 1, so profile_index alone repeats across floats
+    df = generate_synthetic_data(num_floats=3, profiles_per_float=(4, 5), levels_per_profile=(5, 6))
+    stats = FloatSummary.from_frame(df).stats()
+    assert df["profile_index"].nunique() == 4
+    assert stats.profiles == 12
+
+
+def test_total_profiles_after_append_does_not_double_count():
+    df = generate_synthetic_data(num_floats=3, profiles_per_float=(4, 5), levels_per_profile=(5, 6))
+    profile = np.asarray(df["profile_index"])
+    summary = FloatSummary.from_frame(df[profile <= 2])
+    summary.update(df[profile >= 2])  # profile 2 of every float arrives twice
+    assert summary.stats().profiles == 12
+
+
+def test_descending_profile_of_a_cycle_is_a_separate_profile():
+    df = generate_synthetic_data(num_floats=3, profiles_per_float=(4, 5), levels_per_profile=(5, 6))
+    descent = df[np.asarray(df["profile_index"]) == 1].assign(descending=True)
+    both = pd.concat([df, descent], ignore_index=True)
+    assert FloatSummary.from_frame(both).stats().profiles == 15
+    data = ProfileData.from_frame(both)
+    assert data.profile_count == 15
+    assert data.profiles["descending"].sum() == 3
+
+
+def _groupby_summary(df):
+    values = pd.DataFrame({
+        "float_id": np.asarray(df["float_id"], dtype=np.int64),
+        "profile": np.asarray(df["profile_index"], dtype=np.int64) * 2 + np.asarray(df["descending"]),
+        "time": df["time"].to_numpy(),
+        **{col: np.asarray(df[col], dtype=np.float64) for col in ("latitude", "longitude", "temperature", "salinity", "pressure")},
+    })
+    grouped = values.groupby("float_id")
+    return pd.DataFrame({
+        "lat_mean": grouped["latitude"].mean(), "lat_std": grouped["latitude"].std(),
+        "lon_mean": grouped["longitude"].mean(), "lon_std": grouped["longitude"].std(),
+        "temp_mean": grouped["temperature"].mean(), "temp_min": grouped["temperature"].min(),
+        "temp_max": grouped["temperature"].max(), "temp_std": grouped["temperature"].std(),
+        "sal_mean": grouped["salinity"].mean(), "sal_min": grouped["salinity"].min(),
+        "sal_max": grouped["salinity"].max(), "sal_std": grouped["salinity"].std(),
+        "pressure_max": grouped["pressure"].max(), "pressure_mean": grouped["pressure"].mean(),
+        "total_profiles": grouped["profile"].nunique(),
+        "first_profile": grouped["time"].min(), "last_profile": grouped["time"].max(),
+    }).reset_index()
+
+
+def _assert_summary_matches(summary, df):
+    frame = summary.frame().reset_index(drop=True)
+    expected = _groupby_summary(df)
+    assert frame["float_id"].tolist() == expected["float_id"].tolist()
+    for col in expected.columns.drop(["float_id", "first_profile", "last_profile", "total_profiles"]):
+        np.testing.assert_allclose(frame[col].to_numpy(dtype=np.float64), expected[col].to_numpy(), rtol=1e-6, err_msg=col)
+    assert frame["total_profiles"].tolist() == expected["total_profiles"].tolist()
+    assert (frame["first_profile"] == expected["first_profile"]).all()
+    assert (frame["last_profile"] == expected["last_profile"]).all()
+    assert frame["deployment_days"].tolist() == (expected["last_profile"] - expected["first_profile"]).dt.days.tolist()
+
+    stats = summary.stats()
+    assert stats.measurements == len(df)
+    assert stats.floats == len(expected)
+    assert stats.profiles == expected["total_profiles"].sum()
+    assert stats.time_min == df["time"].min() and stats.time_max == df["time"].max()
+    for col in ("temperature", "salinity", "pressure"):
+        values = np.asarray(df[col], dtype=np.float64)
+        np.testing.assert_allclose(stats.mean[col], np.nanmean(values), rtol=1e-9)
+        np.testing.assert_allclose(stats.std[col], np.nanstd(values, ddof=1), rtol=1e-6)
+        assert stats.min[col] == np.nanmin(values) and stats.max[col] == np.nanmax(values)
+        assert stats.argmax[col][col] == np.nanmax(values) and stats.argmin[col][col] == np.nanmin(values)
+        assert stats.argmax[col]["float_id"] == np.asarray(df["float_id"], dtype=np.int64)[np.nanargmax(values)]
+
+
+def test_float_summary_matches_groupby():
+    df = generate_synthetic_data(num_floats=6, seed=3)
+    _assert_summary_matches(FloatSummary.from_frame(df), df)
+
+
+def test_float_summary_matches_groupby_after_updates():
+    df = generate_synthetic_data(num_floats=6, seed=4)
+    rng = np.random.default_rng(0)
+    # Batches of whole profiles in random order, including floats already seen
+    profile = np.asarray(df["float_id"], dtype=np.int64) * 1000 + np.asarray(df["profile_index"])
+    batch_of = dict(zip(np.unique(profile), rng.integers(0, 3, size=len(np.unique(profile)))))
+    batch = np.array([batch_of[p] for p in profile])
+    summary = FloatSummary()
+    for b in range(3):
+        summary.update(df[batch == b])
+    _assert_summary_matches(summary, df)
@@ -0,0 +1,122 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from floatchat.schema import SCHEMA  # noqa: E402
+from floatchat.service import DataService, open_service  # noqa: E402
+from floatchat.store import ArgoStore  # noqa: E402
+from floatchat.synthetic import generate_synthetic_data  # noqa: E402
+
+KEY = ["float_id", "profile_index", "descending", "time", "pressure"]
+
+
+def _sorted(df):
+    df = df.assign(float_id=np.asarray(df["float_id"], dtype=np.int64))
+    return df[list(SCHEMA)].sort_values(KEY, ignore_index=True)
+
+
+def test_store_round_trips_appended_batches(tmp_path):
+    df = generate_synthetic_data(num_floats=4, seed=5)
+    first = np.asarray(df["float_id"]) < 2902125
+    store = ArgoStore(tmp_path / "store")
+    assert store.append(df[first], sources=["a.nc"]) == first.sum()
+    assert store.append(df[~first], sources=["b.nc"]) == (~first).sum()
+
+    result = ArgoStore(tmp_path / "store").read()
+    for col, dtype in SCHEMA.items():
+        assert str(result[col].dtype) == "category" if col == "float_id" else result[col].dtype == np.dtype(dtype), col
+    pd.testing.assert_frame_equal(_sorted(result), _sorted(df))
+    assert store.sources() == {"a.nc", "b.nc"}
+    assert store.float_ids() == sorted(np.unique(np.asarray(df["float_id"], dtype=np.int64)).tolist())
+    # Projection and partition pruning
+    one = store.read(columns=["float_id", "pressure"], float_ids=[2902123])
+    assert list(one.columns) == ["float_id", "pressure"] and len(one) == (np.asarray(df["float_id"]) == 2902123).sum()
+
+
+def test_changes_since_reports_appended_batches(tmp_path):
+    df = generate_synthetic_data(num_floats=3, seed=6)
+    newcomer = generate_synthetic_data(num_floats=1, seed=7, first_float_id=3900001)
+    store = ArgoStore.create(tmp_path / "store", df)
+    service = DataService.from_store(store)
+    before = service.snapshot()
+    assert service.changes_since(before.version) == []
+
+    after = service.append(newcomer)
+    changes = service.changes_since(before.version)
+    assert after.version != before.version
+    assert [c.float_ids for c in changes] == [(3900001,)]
+    assert changes[0].rows == len(newcomer) and changes[0].previous == before.version and not changes[0].full
+    assert changes[0].profiles == len(newcomer.groupby(["profile_index", "descending"]))
+    assert service.changes_since(after.version) == []
+    assert service.changes_since("unknown") is None
+    assert after.stats.measurements == len(df) + len(newcomer)
+
+
+QUESTIONS = [
+    "What's the average salinity?",
+    "Highest salinity in the Arabian Sea in 2013",
+    "Average temperature between 100m and 500m in 2013",
+    "Deepest mixed layer depth in 2013",
+    "Show me the temperature trend in the tropics",
+]
+
+
+def test_store_snapshot_reads_levels_on_demand(tmp_path, monkeypatch):
+    df = generate_synthetic_data(num_floats=6, seed=8)
+    root = tmp_path / "store"
+    store = ArgoStore.create(root, df)
+    resident = DataService(lambda: df).snapshot()
+    first = open_service(root).snapshot()
+    assert first.data.levels == {} and first.version == store.version()
+
+    # Reopening loads the saved aggregates without reading a fragment in full
+    def fail(*args, **kwargs):
+        raise AssertionError("aggregates were rebuilt from the data files")
+
+    monkeypatch.setattr(ArgoStore, "read_files", fail)
+    reopened = open_service(root).snapshot()
+    assert reopened.version == first.version
+    for question in QUESTIONS:
+        assert reopened.engine.answer(question).text == resident.engine.answer(question).text, question
+    one = reopened.data.take(np.arange(3), ["temperature"])
+    np.testing.assert_array_equal(one["temperature"], resident.data.take(np.arange(3), ["temperature"])["temperature"])
+
+
+def test_version_follows_the_manifest(tmp_path):
+    df = generate_synthetic_data(num_floats=3, seed=9)
+    store = ArgoStore.create(tmp_path / "store", df[np.asarray(df["float_id"]) < 2902124])
+    before = store.version()
+    assert ArgoStore(tmp_path / "store").version() == before
+    store.append(df[np.asarray(df["float_id"]) >= 2902124])
+    assert store.version() != before
+    pinned = store.pin()
+    assert pinned.files() == store.files()
+    with pytest.raises(ValueError):
+        pinned.append(df)
+
+
+def test_append_carries_caches_over():
+    df = generate_synthetic_data(num_floats=8, seed=10)
+    late = np.asarray(df["profile_index"]) % 3 == 2  # new cycles of every float, inserted mid-table
+    newcomer = generate_synthetic_data(num_floats=1, seed=11, first_float_id=2902100)
+    batch = pd.concat([df[late], newcomer], ignore_index=True)
+    service = DataService(lambda: df[~late])
+    before = service.snapshot()
+    before.derived.profile_values("mixed_layer_depth")
+    before.derived.take(np.arange(2), ["density"])
+    before.maps.layer(5, (60.0, 70.0, 0.0, 10.0))
+
+    after = service.append(batch)
+    rebuilt = DataService(lambda: pd.concat([df[~late], batch], ignore_index=True)).snapshot()
+    pd.testing.assert_frame_equal(after.data.profiles, rebuilt.data.profiles)
+    for col in after.data.levels:
+        np.testing.assert_array_equal(after.data[col], rebuilt.data[col])
+    np.testing.assert_array_equal(after.data.time_offset, rebuilt.data.time_offset)
+    assert after.maps._cache  # the viewport got no new profiles
+    np.testing.assert_array_equal(after.derived.profile_values("mixed_layer_depth"), rebuilt.derived.profile_values("mixed_layer_depth"))
+    ids = np.arange(after.data.profile_count)
+    np.testing.assert_allclose(after.derived.take(ids, ["density"])["density"], rebuilt.derived.take(ids, ["density"])["density"])
+    for question in QUESTIONS:
+        assert after.engine.answer(question).text == rebuilt.engine.answer(question).text, question